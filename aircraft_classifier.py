@@ -0,0 +1,159 @@
+"""
+Aircraft type classification (emergency / military / private / commercial).
+
+The rules are unchanged from the original inline code in get_flight_data, but
+are compiled once: callsign prefixes are one anchored regex, military type
+codes one substring regex, private types a frozenset, and the per-type answers
+are memoized (a snapshot holds a few hundred distinct type codes for ~10k
+aircraft). AircraftClassifier adds a per-hex cache so an aircraft whose
+callsign, type and squawk did not change since the last poll is not
+re-classified at all.
+
+    python aircraft_classifier.py bench
+"""
+import re
+import sys
+import time
+import random
+import argparse
+from functools import lru_cache
+
+MIL_PREFIXES = ('RCH', 'SPAR', 'SAM', 'AF1', 'MAGMA', 'ASCOT', 'BAF', 'GAF',
+                'PLF', 'DUKE', 'NAVY', 'COBRA', 'VIPER', 'REACH', 'EVAC')
+MIL_TYPES = ('C17', 'C130', 'C5', 'KC135', 'KC10', 'F15', 'F16', 'F18',
+             'F22', 'F35', 'B52', 'B1', 'B2', 'E3', 'E6', 'P8', 'V22')
+PRIV_TYPES = frozenset(('C172', 'C182', 'C208', 'PA28', 'SR22', 'TBM9', 'PC12', 'CL60', 'C152', 'PA32'))
+PRIV_PREFIXES = ('G-', 'VH-')
+
+_MIL_CALLSIGN = re.compile('|'.join(map(re.escape, MIL_PREFIXES)))
+_MIL_TYPE = re.compile('|'.join(map(re.escape, MIL_TYPES)))
+
+
+@lru_cache(maxsize=4096)
+def _type_flags(aircraft_type):
+    """(is military type, is private type) of an ICAO type designator."""
+    upper = aircraft_type.upper()
+    return _MIL_TYPE.search(upper) is not None, upper in PRIV_TYPES
+
+
+def classify(callsign, aircraft_type, emergency='none', squawk=None):
+    """Type classification with color coding; default to commercial (blue)."""
+    if emergency != 'none' or squawk == '7700':
+        return "emergency"
+    mil_type, priv_type = _type_flags(aircraft_type)
+    if mil_type or _MIL_CALLSIGN.match(callsign.upper()):
+        return "military"
+    if priv_type or (callsign.startswith('N') and len(callsign) <= 6) or callsign.startswith(PRIV_PREFIXES):
+        return "private"
+    return "commercial"
+
+
+class AircraftClassifier:
+    """Batch classifier with a per-hex cache keyed on the inputs that decide the class."""
+
+    def __init__(self):
+        self._cache = {}
+
+    def classify_batch(self, records):
+        """
+        Classify (hex, callsign, aircraft_type, emergency, squawk) tuples in one
+        pass. The cache is replaced by this batch's entries, so aircraft that
+        left the snapshot do not accumulate.
+        """
+        previous = self._cache
+        cache = {}
+        result = []
+        for hex_code, callsign, aircraft_type, emergency, squawk in records:
+            signature = (callsign, aircraft_type, emergency, squawk)
+            hit = previous.get(hex_code)
+            if hit is not None and hit[0] == signature:
+                f_type = hit[1]
+            else:
+                f_type = classify(callsign, aircraft_type, emergency, squawk)
+            cache[hex_code] = (signature, f_type)
+            result.append(f_type)
+        self._cache = cache
+        return result
+
+
+# -----------------------------------------------------------------
+# Benchmark against the original inline logic
+# -----------------------------------------------------------------
+def _classify_inline(ac, callsign, aircraft_type):
+    """Verbatim copy of the per-aircraft code this module replaced."""
+    mil_prefixes = ['RCH', 'SPAR', 'SAM', 'AF1', 'MAGMA', 'ASCOT', 'BAF', 'GAF',
+                    'PLF', 'DUKE', 'NAVY', 'COBRA', 'VIPER', 'REACH', 'EVAC']
+    mil_types = ['C17', 'C130', 'C5', 'KC135', 'KC10', 'F15', 'F16', 'F18',
+                 'F22', 'F35', 'B52', 'B1', 'B2', 'E3', 'E6', 'P8', 'V22']
+    is_mil = any(callsign.upper().startswith(p) for p in mil_prefixes) or \
+        any(t in aircraft_type.upper() for t in mil_types)
+    priv_types = ['C172', 'C182', 'C208', 'PA28', 'SR22', 'TBM9', 'PC12', 'CL60', 'C152', 'PA32']
+    is_priv = (callsign.startswith('N') and len(callsign) <= 6) or \
+        callsign.startswith('G-') or callsign.startswith('VH-') or \
+        aircraft_type.upper() in priv_types
+    is_emergency = ac.get('emergency', 'none') != 'none' or ac.get('squawk') == '7700'
+    f_type = "commercial"
+    if is_emergency: f_type = "emergency"
+    elif is_mil: f_type = "military"
+    elif is_priv: f_type = "private"
+    return f_type
+
+
+def _synthetic_aircraft(n, seed=1):
+    rng = random.Random(seed)
+    types = ['A320', 'B738', 'B77W', 'A21N', 'E190', 'CRJ9', 'B190', 'C172', 'PA28', 'C17',
+             'K35R', 'F16', 'PC12', 'A359', 'B789', 'DH8D', 'AT76', 'C130', 'SR22', '']
+    prefixes = ['DAL', 'UAL', 'AAL', 'BAW', 'DLH', 'RCH', 'N', 'G-', 'VH-', 'SWA', 'RYR', 'NAVY', 'AFR']
+    aircraft = []
+    for i in range(n):
+        ac = {"hex": f"{i:06x}", "t": rng.choice(types),
+              "flight": rng.choice(prefixes) + str(rng.randint(1, 9999)),
+              "squawk": rng.choice(['1000', '2000', '7700', '4521', '7000'])}
+        if rng.random() < 0.001:
+            ac["emergency"] = "general"
+        aircraft.append(ac)
+    return aircraft
+
+
+def benchmark(n=10000, rounds=20):
+    """Time the inline logic, the compiled rules and the cached batch over n aircraft."""
+    aircraft = _synthetic_aircraft(n)
+    records = [(ac["hex"], ac["flight"], ac["t"], ac.get("emergency", "none"), ac.get("squawk")) for ac in aircraft]
+
+    expected = [_classify_inline(ac, ac["flight"], ac["t"]) for ac in aircraft]
+    assert [classify(*r[1:]) for r in records] == expected, "compiled rules disagree with the inline logic"
+
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        return (time.perf_counter() - start) / rounds * 1000
+
+    classifier = AircraftClassifier()
+    inline_ms = timed(lambda: [_classify_inline(ac, ac["flight"], ac["t"]) for ac in aircraft])
+    compiled_ms = timed(lambda: [classify(*r[1:]) for r in records])
+    classifier.classify_batch(records)
+    batch_ms = timed(lambda: classifier.classify_batch(records))
+    assert classifier.classify_batch(records) == expected
+
+    print(f"{n} aircraft, mean of {rounds} rounds")
+    print(f"  inline lists      {inline_ms:8.2f} ms")
+    print(f"  compiled rules    {compiled_ms:8.2f} ms  ({inline_ms / compiled_ms:.1f}x)")
+    print(f"  cached batch      {batch_ms:8.2f} ms  ({inline_ms / batch_ms:.1f}x)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aircraft classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="benchmark against the original inline classification")
+    bench.add_argument("--aircraft", type=int, default=10000)
+    bench.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        benchmark(args.aircraft, args.rounds)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
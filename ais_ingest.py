@@ -0,0 +1,360 @@
+"""
+AISstream.io ingest pipeline.
+
+The websocket loop used to rebuild the ~280-entry MID table and the ship type
+range table for every ShipStaticData message, resolve the type with a linear
+scan over range objects, decode every frame with the stdlib json module and
+take the cache lock once per message. Here:
+
+    - MID -> country and type code -> category are flat lists built once at
+      import and indexed by integer;
+    - frames are decoded with orjson when installed (stdlib json otherwise);
+    - decoded updates are queued and applied to the vessel cache in
+      micro-batches (BATCH_SIZE messages or BATCH_INTERVAL seconds, whichever
+      comes first) under a single lock acquisition;
+    - AISIngest.stats() reports messages/sec, parse errors, batch sizes and the
+      lag between AIS timestamps and ingest time.
+
+Position reports are also appended to an optional vessel_tracks.TrackStore
+and moved in an optional vessel_index.VesselIndex with each flush.
+"""
+import json
+import time
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    orjson = None
+    loads = json.loads
+
+BATCH_SIZE = 500
+BATCH_INTERVAL = 0.25   # seconds
+RATE_WINDOW = 10        # seconds of flush history behind messages/sec
+
+# Get country from UserID (first 3 digits of MMSI = Maritime Identification Digits)
+COUNTRY_BY_MID = {
+    '202': 'GB', '203': 'ES', '204': 'PT', '205': 'BE', '206': 'FR',
+    '207': 'FR', '208': 'FR', '209': 'CY', '210': 'CY', '211': 'DE',
+    '212': 'CY', '213': 'GE', '214': 'MD', '215': 'MT', '216': 'AM',
+    '218': 'DE', '219': 'DK', '220': 'DK', '224': 'ES', '225': 'ES',
+    '226': 'FR', '227': 'FR', '228': 'FR', '229': 'MT', '230': 'FI',
+    '231': 'FO', '232': 'GB', '233': 'GB', '234': 'GB', '235': 'GB',
+    '236': 'GI', '237': 'GR', '238': 'HR', '239': 'GR', '240': 'GR',
+    '241': 'GR', '242': 'MA', '243': 'HU', '244': 'NL', '245': 'NL',
+    '246': 'NL', '247': 'IT', '248': 'MT', '249': 'MT', '250': 'IE',
+    '251': 'IS', '252': 'LI', '253': 'LU', '254': 'MC', '255': 'PT',
+    '256': 'MT', '257': 'NO', '258': 'NO', '259': 'NO', '261': 'PL',
+    '262': 'ME', '263': 'PT', '264': 'RO', '265': 'SE', '266': 'SE',
+    '267': 'SK', '268': 'SM', '269': 'CH', '270': 'CZ', '271': 'TR',
+    '272': 'UA', '273': 'RU', '274': 'MK', '275': 'LV', '276': 'EE',
+    '277': 'LT', '278': 'SI', '279': 'RS', '301': 'AI', '303': 'US',
+    '304': 'AG', '305': 'AG', '306': 'CW', '307': 'AW', '308': 'BS',
+    '309': 'BS', '310': 'BM', '311': 'BS', '312': 'BZ', '314': 'BB',
+    '316': 'CA', '319': 'KY', '321': 'CR', '323': 'CU', '325': 'DM',
+    '327': 'DO', '329': 'GP', '330': 'GD', '331': 'GL', '332': 'GT',
+    '334': 'HN', '336': 'HT', '338': 'US', '339': 'JM', '341': 'KN',
+    '343': 'LC', '345': 'MX', '347': 'MQ', '348': 'MS', '350': 'NI',
+    '351': 'PA', '352': 'PA', '353': 'PA', '354': 'PA', '355': 'PA',
+    '356': 'PA', '357': 'PA', '358': 'PR', '359': 'SV', '361': 'PM',
+    '362': 'TT', '364': 'TC', '366': 'US', '367': 'US', '368': 'US',
+    '369': 'US', '370': 'PA', '371': 'PA', '372': 'PA', '373': 'PA',
+    '374': 'PA', '375': 'VC', '376': 'VC', '377': 'VC', '378': 'VG',
+    '401': 'AF', '403': 'SA', '405': 'BD', '408': 'BH', '410': 'BT',
+    '412': 'CN', '413': 'CN', '414': 'CN', '416': 'TW', '417': 'LK',
+    '419': 'IN', '422': 'IR', '423': 'AZ', '425': 'IQ', '428': 'IL',
+    '431': 'JP', '432': 'JP', '434': 'TM', '436': 'KZ', '437': 'UZ',
+    '438': 'JO', '440': 'KR', '441': 'KR', '443': 'PS', '445': 'KP',
+    '447': 'KW', '450': 'LB', '451': 'KG', '453': 'MO', '455': 'MV',
+    '457': 'MN', '459': 'NP', '461': 'OM', '463': 'PK', '466': 'QA',
+    '468': 'SY', '470': 'AE', '471': 'AE', '472': 'TJ', '473': 'YE',
+    '475': 'YE', '477': 'HK', '478': 'BA', '501': 'AQ', '503': 'AU',
+    '506': 'MM', '508': 'BN', '510': 'FM', '511': 'PW', '512': 'NZ',
+    '514': 'KH', '515': 'KH', '516': 'CX', '518': 'CK', '520': 'FJ',
+    '523': 'CC', '525': 'ID', '529': 'KI', '531': 'LA', '533': 'MY',
+    '536': 'MP', '538': 'MH', '540': 'NC', '542': 'NU', '544': 'NR',
+    '546': 'PF', '548': 'PH', '553': 'PG', '555': 'PN', '557': 'SB',
+    '559': 'AS', '561': 'WS', '563': 'SG', '564': 'SG', '565': 'SG',
+    '566': 'SG', '567': 'TH', '570': 'TO', '572': 'TV', '574': 'VN',
+    '576': 'VU', '577': 'VU', '578': 'WF', '601': 'ZA', '603': 'AO',
+    '605': 'DZ', '607': 'TF', '608': 'AS', '609': 'BI', '610': 'BJ',
+    '611': 'BW', '612': 'CF', '613': 'CM', '615': 'CG', '616': 'KM',
+    '617': 'CV', '618': 'AQ', '619': 'CI', '620': 'KM', '621': 'DJ',
+    '622': 'EG', '624': 'ET', '625': 'ER', '626': 'GA', '627': 'GH',
+    '629': 'GM', '630': 'GW', '631': 'GQ', '632': 'GN', '633': 'BF',
+    '634': 'KE', '635': 'AQ', '636': 'LR', '637': 'LR', '638': 'SS',
+    '642': 'LY', '644': 'LS', '645': 'MU', '647': 'MG', '649': 'ML',
+    '650': 'MZ', '654': 'MR', '655': 'MW', '656': 'NE', '657': 'NG',
+    '659': 'NA', '660': 'RE', '661': 'RW', '662': 'SD', '663': 'SN',
+    '664': 'SC', '665': 'SH', '666': 'SO', '667': 'SL', '668': 'ST',
+    '669': 'SZ', '670': 'TD', '671': 'TG', '672': 'TN', '674': 'TZ',
+    '675': 'UG', '676': 'CD', '677': 'TZ', '678': 'ZM', '679': 'ZW'
+}
+
+# Map AIS ship type codes to readable types (35 and 51 refine their decade)
+SHIP_TYPE_RANGES = [
+    (range(30, 40), "fishing"),
+    (range(40, 50), "tug"),
+    (range(50, 60), "pilot"),
+    (range(60, 70), "passenger"),
+    (range(70, 80), "cargo"),
+    (range(80, 90), "tanker"),
+    (range(35, 36), "military"),
+    (range(51, 52), "special"),
+]
+DEFAULT_SHIP_TYPE = "cargo"
+
+
+def _build_mid_table():
+    table = ["--"] * 1000
+    for mid, country in COUNTRY_BY_MID.items():
+        table[int(mid)] = country
+    return table
+
+
+def _build_type_table():
+    table = [DEFAULT_SHIP_TYPE] * 256
+    for code_range, type_name in SHIP_TYPE_RANGES:
+        for code in code_range:
+            table[code] = type_name
+    return table
+
+
+MID_COUNTRY = _build_mid_table()
+SHIP_TYPE_CATEGORY = _build_type_table()
+
+
+def country_for(mmsi):
+    """ISO country of an MMSI string from its first three digits ("--" when unknown)."""
+    mid = mmsi[:3]
+    return MID_COUNTRY[int(mid)] if len(mid) == 3 and mid.isdigit() else "--"
+
+
+def ship_type_for(code):
+    """Category of an AIS ship type code."""
+    return SHIP_TYPE_CATEGORY[code] if isinstance(code, int) and 0 <= code < 256 else DEFAULT_SHIP_TYPE
+
+
+def parse_time_utc(value):
+    """Epoch seconds of an aisstream MetaData.time_utc ("2024-01-01 12:00:00.123456 +0000 UTC")."""
+    try:
+        return datetime.strptime(value[:19], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+# -----------------------------------------------------------------
+# Decoding
+# -----------------------------------------------------------------
+POSITION = 0
+STATIC = 1
+
+
+def decode(frame):
+    """
+    Decode one websocket frame into (kind, mmsi, fields, time_utc), or None for
+    message types the map does not use.
+    """
+    message = loads(frame)
+    body = message.get("Message")
+    if not body:
+        return None
+    meta = message.get("MetaData", {})
+    mmsi = str(meta.get("MMSI", "000000000"))
+
+    # Handle Position Reports
+    pos = body.get("PositionReport")
+    if pos is not None:
+        ship_name = meta.get("ShipName", "UNKNOWN").strip()
+        return POSITION, mmsi, {
+            "mmsi": mmsi,
+            "name": ship_name if ship_name else "UNKNOWN",
+            "lat": pos.get("Latitude", 0),
+            "lon": pos.get("Longitude", 0),
+            "heading": int(pos.get("TrueHeading", 0) or pos.get("Cog", 0) or 0),
+            "speed": float(pos.get("Sog", 0) or 0),
+            "imo": meta.get("IMO", "---"),
+            "status": pos.get("NavigationalStatus", "Underway"),
+            "draft": 0,
+            "arrival": meta.get("Destination", "Unknown"),
+            "callsign": meta.get("CallSign", "---"),
+            "source": "AISstream_LIVE",
+            "atd": "---",
+            "departure": "---",
+        }, meta.get("time_utc")
+
+    # Handle Ship Static Data (has ship type and country)
+    static = body.get("ShipStaticData")
+    if static is not None:
+        ship_type = ship_type_for(static.get("Type", 0))
+        return STATIC, mmsi, {
+            "mmsi": mmsi,
+            "name": meta.get("ShipName", "UNKNOWN").strip(),
+            "type": ship_type,
+            "country": country_for(mmsi),
+            "imo": meta.get("IMO", "---"),
+            "draft": static.get("Draught", 0) / 10,  # AIS reports in decimeters
+            "arrival": static.get("Destination", "Unknown"),
+            "callsign": static.get("CallSign", "---"),
+            "category": ship_type,
+        }, meta.get("time_utc")
+    return None
+
+
+# -----------------------------------------------------------------
+# Micro-batching ingest
+# -----------------------------------------------------------------
+class AISIngest:
+    """
+    Decodes frames as they arrive and applies them to `cache` (a
+    vessel_cache.VesselCache) in batches under `lock`.
+    """
+
+    def __init__(self, cache, lock, tracks=None, index=None, batch_size=BATCH_SIZE, batch_interval=BATCH_INTERVAL):
+        self.cache = cache
+        self.lock = lock
+        self.tracks = tracks
+        self.index = index
+        self._dirty = set()       # MMSIs changed since the last take_dirty()
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._last_time_utc = None
+        self._history = deque()   # (monotonic time, messages so far) per flush
+        self._stats_lock = threading.Lock()
+        self.messages = 0
+        self.applied = 0
+        self.parse_errors = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.lag = None
+
+    def feed(self, frame):
+        """Decode one frame; flush when the batch is full or old enough."""
+        self.messages += 1
+        try:
+            update = decode(frame)
+        except Exception as e:
+            self.parse_errors += 1
+            print(f"AIS Parse Error: {e}")
+            update = None
+        if update is not None:
+            self._pending.append(update)
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.batch_interval:
+            self.flush()
+
+    def flush(self):
+        """Apply every pending update with one lock acquisition."""
+        now = time.monotonic()
+        pending, self._pending = self._pending, []
+        cache, index = self.cache, self.index
+        # an idle feed only takes the lock when an earlier batch is still waiting to be published
+        if pending or (index is not None and index.publish_due()):
+            stamp = time.time()
+            with self.lock:
+                for kind, mmsi, fields, _ in pending:
+                    if kind == POSITION:
+                        vessel = cache.apply_position(mmsi, fields, stamp)
+                        if index is not None:
+                            index.update(mmsi, vessel)
+                    else:
+                        cache.apply_static(mmsi, fields, stamp)
+                        if index is not None and mmsi in cache:
+                            # type / country changed in place: republish the vessel's cell
+                            index.update(mmsi, cache[mmsi])
+                    self._dirty.add(mmsi)
+                if index is not None:
+                    index.publish()
+        if pending:
+            if self.tracks is not None:
+                stamp = int(time.time())
+                self.tracks.add_many([(mmsi, fields["lat"], fields["lon"], stamp)
+                                      for kind, mmsi, fields, _ in pending
+                                      if kind == POSITION and (fields["lat"] or fields["lon"])
+                                      and abs(fields["lat"]) <= 90 and abs(fields["lon"]) <= 180])
+            self._last_time_utc = pending[-1][3] or self._last_time_utc
+        with self._stats_lock:
+            self._history.append((now, self.messages))
+            while self._history and now - self._history[0][0] > RATE_WINDOW:
+                self._history.popleft()
+        self.applied += len(pending)
+        self.batches += 1 if pending else 0
+        self.last_batch_size = len(pending)
+        self._last_flush = now
+        if self._last_time_utc:
+            stamp = parse_time_utc(self._last_time_utc)
+            self.lag = round(time.time() - stamp, 3) if stamp else None
+
+    @property
+    def pending(self):
+        """Decoded updates waiting for the next flush."""
+        return len(self._pending)
+
+    def take_dirty(self):
+        """MMSIs updated since the previous call (call with the cache lock held)."""
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def stats(self):
+        """Ingest counters for the metrics endpoint."""
+        with self._stats_lock:
+            history = list(self._history)
+        window = history[-1][0] - history[0][0] if len(history) > 1 else 0
+        rate = (history[-1][1] - history[0][1]) / window if window > 0 else 0.0
+        return {
+            "messages": self.messages,
+            "applied": self.applied,
+            "parse_errors": self.parse_errors,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "pending": self.pending,
+            "messages_per_sec": round(rate, 1),
+            "lag_seconds": self.lag,
+            "decoder": "orjson" if orjson is not None else "json",
+        }
+
+
+# -----------------------------------------------------------------
+# Websocket loop
+# -----------------------------------------------------------------
+AIS_STREAM_URL = "wss://stream.aisstream.io/v0/stream"
+RECONNECT_DELAY = 5
+
+
+def run_stream(ingest, api_key, url=AIS_STREAM_URL):
+    """Feed the global AISstream.io subscription into `ingest` forever, reconnecting on errors."""
+    import asyncio
+    import websockets
+
+    async def ais_stream():
+        async with websockets.connect(url) as websocket:
+            # Subscribe to global ship positions
+            subscribe_message = {
+                "APIKey": api_key,
+                "BoundingBoxes": [[[-90, -180], [90, 180]]]  # Global coverage
+            }
+
+            await websocket.send(json.dumps(subscribe_message))
+            print("AISstream.io connected - receiving real ship data...")
+
+            while True:
+                try:
+                    message_json = await asyncio.wait_for(websocket.recv(), ingest.batch_interval)
+                except asyncio.TimeoutError:
+                    # quiet stream: apply whatever is pending instead of waiting for the next frame
+                    ingest.flush()
+                    continue
+                ingest.feed(message_json)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    while True:
+        try:
+            loop.run_until_complete(ais_stream())
+        except Exception as e:
+            print(f"AIS WebSocket Error: {e}, reconnecting in {RECONNECT_DELAY}s...")
+            time.sleep(RECONNECT_DELAY)
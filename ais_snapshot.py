@@ -0,0 +1,235 @@
+"""
+SQLite snapshots of the live AIS vessel cache for warm starts.
+
+Without them the vessel layer is empty for minutes after every restart while
+positions and static data (type, country, callsign) trickle back in. A
+background thread writes the vessels touched since its last run to a local
+SQLite file (WAL journal, one transaction of batched upserts per run), and the
+cache is refilled from it at startup before the websocket connects. Vessels
+older than the cache TTL are neither reloaded nor kept in the file.
+
+Static-only records (ShipStaticData seen before any position report) are kept
+in the same table as rows with a NULL lat / lon, and go back into the cache's
+static-only table on warm start.
+
+The ingest is never blocked by the writer: it only takes the cache lock to swap
+out the set of dirty MMSIs and grab references to their dicts; serialization
+and disk I/O happen outside the lock.
+
+    python ais_snapshot.py bench --vessels 100000
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    orjson = None
+    _dumps = json.dumps
+    _loads = json.loads
+
+SNAPSHOT_INTERVAL = 30          # seconds between writer runs
+BATCH_ROWS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vessels (
+    mmsi TEXT PRIMARY KEY,
+    lat REAL,
+    lon REAL,
+    seen REAL NOT NULL,
+    data BLOB NOT NULL
+)
+"""
+UPSERT = """
+INSERT INTO vessels (mmsi, lat, lon, seen, data) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(mmsi) DO UPDATE SET lat = excluded.lat, lon = excluded.lon,
+    seen = excluded.seen, data = excluded.data
+"""
+
+
+def connect(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(SCHEMA)
+    conn.execute("CREATE INDEX IF NOT EXISTS vessels_seen ON vessels (seen)")
+    return conn
+
+
+def write_rows(conn, rows):
+    """Upsert (mmsi, vessel dict, seen) rows in one transaction (static-only dicts have no lat / lon)."""
+    with conn:
+        batch = []
+        for mmsi, vessel, seen in rows:
+            batch.append((mmsi, vessel.get('lat'), vessel.get('lon'), seen, _dumps(vessel)))
+            if len(batch) >= BATCH_ROWS:
+                conn.executemany(UPSERT, batch)
+                batch = []
+        if batch:
+            conn.executemany(UPSERT, batch)
+
+
+def load_rows(conn, max_age):
+    """
+    (mmsi, lat, lon, seen, data) rows of the vessels seen within max_age
+    seconds, oldest first (data still encoded).
+    """
+    return conn.execute("SELECT mmsi, lat, lon, seen, data FROM vessels WHERE seen >= ? ORDER BY seen",
+                        (time.time() - max_age,)).fetchall()
+
+
+def prune(conn, max_age):
+    with conn:
+        return conn.execute("DELETE FROM vessels WHERE seen < ?", (time.time() - max_age,)).rowcount
+
+
+def warm_start(path, cache, lock, index=None, max_age=None):
+    """
+    Fill the vessel_cache.VesselCache (and grid index) from the snapshot file;
+    returns the vessel count (static-only records not included). max_age
+    defaults to the cache TTL.
+    """
+    if not os.path.exists(path):
+        return 0
+    started = time.perf_counter()
+    conn = connect(path)
+    try:
+        rows = load_rows(conn, max_age or cache.ttl)
+    finally:
+        conn.close()
+    if not rows:
+        return 0
+    static = [(mmsi, _loads(data), seen) for mmsi, lat, lon, seen, data in rows if lat is None]
+    rows = [row for row in rows if row[1] is not None]
+    if rows:
+        mmsis, lats, lons, seen, blobs = zip(*rows)
+        vessels = list(zip(mmsis, map(_loads, blobs), seen))
+    with lock:
+        if rows:
+            cache.load(vessels)
+        cache.load_static(static)
+        if index is not None and rows:
+            index.add_many(mmsis, [lat or 0 for lat in lats], [lon or 0 for lon in lons])
+            index.publish(force=True)
+    print(f"AIS warm start: {len(rows)} vessels and {len(static)} static-only records from {path} "
+          f"in {time.perf_counter() - started:.2f}s")
+    return len(rows)
+
+
+class SnapshotWriter:
+    """Daemon thread periodically persisting the vessels the ingest marked dirty."""
+
+    def __init__(self, path, ingest, interval=SNAPSHOT_INTERVAL, max_age=None):
+        self.path = path
+        self.ingest = ingest
+        self.interval = interval
+        self.max_age = max_age or ingest.cache.ttl   # older rows are pruned
+        self.runs = 0
+        self.rows_written = 0
+        self.last_duration = None
+        self._thread = None
+
+    def write_once(self, conn):
+        ingest = self.ingest
+        with ingest.lock:
+            dirty = ingest.take_dirty()
+            cache = ingest.cache
+            rows = []
+            for mmsi in dirty:
+                if mmsi in cache:
+                    rows.append((mmsi, cache[mmsi], cache.seen.get(mmsi, 0)))
+                else:
+                    record = cache.static_record(mmsi)
+                    if record is not None:
+                        rows.append((mmsi, record, record.pop("seen")))
+        started = time.perf_counter()
+        write_rows(conn, rows)
+        prune(conn, self.max_age)
+        self.runs += 1
+        self.rows_written += len(rows)
+        self.last_duration = round(time.perf_counter() - started, 3)
+        return len(rows)
+
+    def _run(self):
+        conn = connect(self.path)
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.write_once(conn)
+            except Exception as e:
+                print(f"AIS snapshot error: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ais-snapshot", daemon=True)
+            self._thread.start()
+        return self
+
+    def stats(self):
+        return {"path": self.path, "runs": self.runs, "rows_written": self.rows_written,
+                "last_duration_seconds": self.last_duration}
+
+
+# -----------------------------------------------------------------
+# Benchmark
+# -----------------------------------------------------------------
+def _synthetic_vessel(i):
+    mmsi = f"{419000000 + i}"
+    return mmsi, {
+        "mmsi": mmsi, "name": f"VESSEL {i}", "lat": (i % 1200) / 10 - 60, "lon": (i % 3600) / 10 - 180,
+        "heading": i % 360, "speed": 12.5, "type": "cargo", "imo": 9000000 + i, "status": 0,
+        "country": "IN", "draft": 8.5, "arrival": "MUMBAI", "callsign": f"AB{i % 10000}",
+        "source": "AISstream_LIVE", "atd": "---", "departure": "---", "category": "cargo",
+    }
+
+
+def benchmark(vessels=100000):
+    """Write `vessels` synthetic vessels to a temporary snapshot and time the warm start."""
+    import vessel_cache
+    import vessel_index
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ais_snapshot.db")
+        conn = connect(path)
+        started = time.perf_counter()
+        now = time.time()
+        write_rows(conn, ((mmsi, vessel, now) for mmsi, vessel in map(_synthetic_vessel, range(vessels))))
+        write_s = time.perf_counter() - started
+        conn.close()
+
+        cache = vessel_cache.VesselCache()
+        lock = threading.Lock()
+        index = vessel_index.VesselIndex(cache)
+        cache.index = index
+        started = time.perf_counter()
+        loaded = warm_start(path, cache, lock, index)
+        load_s = time.perf_counter() - started
+
+    print(f"decoder: {'orjson' if orjson is not None else 'json'}")
+    print(f"write {vessels} vessels   {write_s:6.2f} s")
+    print(f"warm start {loaded} vessels {load_s:6.2f} s (cache + grid index)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AIS cache snapshots")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="time a warm start from a synthetic snapshot")
+    bench.add_argument("--vessels", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        benchmark(args.vessels)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
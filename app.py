@@ -9,14 +9,13 @@ import random
 import logging
 import base64
 import requests
-import feedparser
 import threading
 import sqlite3
 import numpy as np
 import cv2  # opencv-python-headless or opencv-python
 from datetime import datetime, timedelta, timezone
 from functools import wraps
-from flask import Flask, render_template, jsonify, request, redirect, url_for, make_response, send_from_directory, g
+from flask import Flask, render_template, jsonify, request, redirect, url_for, make_response, send_from_directory, g, Response
 from werkzeug.security import generate_password_hash, check_password_hash
 from PIL import Image, ExifTags
 import tempfile
@@ -33,6 +32,30 @@ try:
 except ImportError:
     NEWS_SOURCES = {}
 
+import geo_tiles
+import geo_mvt
+import tile_store
+import tile_pack
+import camera_store
+import camera_index
+import geojson_stream
+import flight_poller
+import flight_stream
+import ais_ingest
+import vessel_tracks
+import vessel_index
+import ais_snapshot
+import vessel_cache
+import shared_snapshot
+import flight_history
+import flight_routes
+import geo_alerts
+import news_fetcher
+import news_index
+import geo_cache
+import reverse_geocoder
+import time_utils
+
 
 # -----------------------------------------------------------------
 # Configuration & Keys
@@ -69,8 +92,18 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 # -----------------------------------------------------------------
 # Caches & Globals
 # -----------------------------------------------------------------
-news_cache = {}
 NEWS_CACHE_LIMIT = 15 # minutes
+NEWS_CACHE_ENTRIES = int(os.getenv("NEWS_CACHE_ENTRIES", geo_cache.DEFAULT_MAX_ENTRIES))
+GEO_NEWS_PRECISION = int(os.getenv("GEO_NEWS_PRECISION", geo_cache.GEO_PRECISION))
+news_cache = geo_cache.TTLCache(NEWS_CACHE_ENTRIES, NEWS_CACHE_LIMIT * 60)
+geo_news_cache = geo_cache.TTLCache(NEWS_CACHE_ENTRIES, NEWS_CACHE_LIMIT * 60)
+REVERSE_GEOCODE_MAX_BATCH = 10000
+_news_fetcher = news_fetcher.FeedFetcher()
+# Every RSS feed of NEWS_SOURCES ingested in the background into a local FTS5 index
+# (by ingest_worker.py when INGEST_SHARED_DIR is set)
+NEWS_INDEX_PATH = os.getenv("NEWS_INDEX_PATH", os.path.join(BASE_DIR, 'geodata', 'news_index.db'))
+_news_index = news_index.NewsIndex(NEWS_INDEX_PATH)
+_news_ingestor = news_index.NewsIngestor(_news_index, _news_fetcher, NEWS_SOURCES)
 
 
 #
@@ -98,7 +131,13 @@ def earth():
 @app.route('/api/geojson/<filename>')
 
 def get_geojson_data(filename):
-    """Return a summary of the GeoJSON file (properties and first few coords to keep it snappy)."""
+    """
+    Stream a page of a GeoJSON layer without loading the whole file.
+    Query: offset, limit (default 500), bbox=w,s,e,n and format=json (legacy summary
+    shape), geojson (FeatureCollection) or ndjson (one feature per line). JSON pages
+    end with next_offset (null on the last page); with a bbox the whole-file count
+    is sent as file_total_features rather than total_features.
+    """
     # Security check: prevent directory traversal
     if '..' in filename or filename.startswith('/'):
         return jsonify({"error": "Invalid filename"}), 400
@@ -108,32 +147,88 @@ def get_geojson_data(filename):
         return jsonify({"error": "File not found"}), 404
 
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-        # Return a larger sample for map visualization
-        features = data.get('features', [])
-        summary_features = []
-        
-        for feat in features[:500]: # Increased to 500 for map display
-            summary_features.append({
-                "type": feat.get("type"),
-                "properties": feat.get("properties"),
-                "geometry": feat.get("geometry") # Include full geometry for Leaflet
-            })
+        offset = max(0, request.args.get('offset', 0, type=int))
+        limit = request.args.get('limit', geojson_stream.DEFAULT_LIMIT, type=int)
+        limit = max(1, min(limit, geojson_stream.MAX_LIMIT))
+        bbox_arg = request.args.get('bbox', '').strip()
+        bbox = camera_index.parse_bbox(bbox_arg) if bbox_arg else None
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
+    out_format = request.args.get('format', 'json')
 
-        return jsonify({
-            "filename": filename,
-            "total_features": len(features),
-            "summary": summary_features
-        })
+    try:
+        # Total count comes from the cached sidecar index, built by one streaming scan
+        index = geojson_stream.load_index(filepath)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    # With a bbox the number of matches is unknown until the scan ends: the whole-file
+    # count goes out as file_total_features and paging follows next_offset instead
+    total = index["total"]
+    total_key = "file_total_features" if bbox else "total_features"
+    # one feature past the page tells whether there is a next one
+    features = geojson_stream.iter_page(filepath, index, offset, limit + 1, bbox)
+
+    if out_format == 'ndjson':
+        def generate():
+            for i, feat in enumerate(features):
+                if i == limit:
+                    break
+                yield json.dumps(geojson_stream.summarize(feat)) + "\n"
+        response = Response(generate(), mimetype='application/x-ndjson')
+        response.headers['X-File-Total-Features' if bbox else 'X-Total-Features'] = str(total)
+        return response
+
+    if out_format == 'geojson':
+        head = '{"type": "FeatureCollection", "%s": %d, "offset": %d, "features": [' % (total_key, total, offset)
+    else:
+        head = '{"filename": %s, "%s": %d, "offset": %d, "summary": [' % (json.dumps(filename), total_key, total, offset)
+
+    def generate():
+        yield head
+        next_offset = None
+        for i, feat in enumerate(features):
+            if i == limit:
+                next_offset = offset + limit
+                break
+            yield ("," if i else "") + json.dumps(geojson_stream.summarize(feat))
+        yield '], "next_offset": %s}' % json.dumps(next_offset)
+    return Response(generate(), mimetype='application/json')
+
+# Surveillance grid: raw zoom-6 tiles, the multi-zoom pyramid (packed or as a directory)
+# and their precompressed stores
+GEO_TILE_DIR = os.path.join(app.root_path, 'geodata', 'geo')
+GEO_PYRAMID_DIR = os.path.join(app.root_path, 'geodata', 'pyramid')
+GEO_PYRAMID_PACK = os.path.join(app.root_path, 'geodata', 'pyramid.gspk')
+geo_tile_store = tile_store.TileStore(GEO_TILE_DIR)
+geo_pyramid_store = tile_store.TileStore(GEO_PYRAMID_DIR)
+
+CAMERA_STORE_CACHE = os.path.join(app.root_path, 'geodata', 'cameras.npz')
+
+def _pyramid_source():
+    """The packed pyramid archive when deployed, otherwise the pyramid directory."""
+    pack = tile_pack.open_pack(GEO_PYRAMID_PACK)
+    return pack if pack is not None else geo_pyramid_store
+
+def _camera_store():
+    """The columnar camera store (None when the raw grid is missing)."""
+    return camera_store.get_store(GEO_TILE_DIR, CAMERA_STORE_CACHE)
+
+# Load the camera store in the background so the first grid request does not pay for it
+threading.Thread(target=_camera_store, daemon=True).start()
 
 @app.route('/api/geo/index')
 def get_geo_index():
-    """Return the surveillance grid index."""
-    filepath = os.path.join(app.root_path, 'geodata', 'geo', 'index.json')
+    """Return the surveillance grid index (the multi-zoom pyramid index when built)."""
+    for source in (_pyramid_source(), geo_tile_store):
+        response = source.response('index.json', request)
+        if response is not None:
+            return response
+
+    pyramid_index = geo_tiles.load_pyramid_index(_pyramid_source())
+    if pyramid_index is not None:
+        return jsonify(pyramid_index)
+
+    filepath = os.path.join(GEO_TILE_DIR, 'index.json')
     if not os.path.exists(filepath):
         return jsonify({"error": "Index not found"}), 404
     
@@ -144,9 +239,26 @@ def get_geo_index():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _load_geo_tile(z, x, y):
+    """Return the FeatureCollection for tile z/x/y, or None when it does not exist."""
+    source = _pyramid_source()
+    store = _camera_store()
+    pyramid_index = geo_tiles.load_pyramid_index(source)
+    if pyramid_index is not None:
+        key, clip = geo_tiles.resolve_tile(pyramid_index, z, x, y)
+        # below a leaf every camera is kept raw, so the tile is a plain slice of the store
+        if clip and store is not None:
+            return store.tile(z, x, y)
+        return geo_tiles.read_tile(source, z, x, y)
+
+    # Pyramid not built yet: raw cameras straight from the store, zoom 6 and deeper
+    if store is None or z < geo_tiles.SOURCE_ZOOM:
+        return None
+    return store.tile(z, x, y)
+
 @app.route('/api/geo/tile/<z>/<x>/<y>')
 def get_geo_tile(z, x, y):
-    """Return a specific surveillance grid tile."""
+    """Return a surveillance grid tile at any zoom of the pyramid (raw zoom-6 grid as fallback)."""
     # Security check: ensure z, x, y are integers to prevent path traversal
     try:
         z = int(z)
@@ -155,14 +267,53 @@ def get_geo_tile(z, x, y):
     except ValueError:
         return jsonify({"error": "Invalid tile coordinates"}), 400
 
-    filepath = os.path.join(app.root_path, 'geodata', 'geo', str(z), str(x), f"{y}.json")
-    if not os.path.exists(filepath):
-        return jsonify({"error": "Tile not found"}), 404
+    if not geo_tiles.valid_tile(z, x, y):
+        return jsonify({"error": "Invalid tile coordinates"}), 400
+
+    # Stored tiles go out as precompressed bytes; overzoomed tiles are clipped from their leaf
+    source = _pyramid_source()
+    pyramid_index = geo_tiles.load_pyramid_index(source)
+    if pyramid_index is not None:
+        key, clip = geo_tiles.resolve_tile(pyramid_index, z, x, y)
+        store = source
+    else:
+        key, clip = f"{z}/{x}/{y}", False
+        store = geo_tile_store
+
+    etag = None
+    if key is not None and not clip:
+        response = store.response(f"{key}.json", request)
+        if response is not None:
+            return response
+    elif key is not None:
+        entry = store.entry(f"{key}.json")
+        if entry is not None:
+            etag = tile_store.derived_etag(entry["etag"], f"{z}/{x}/{y}")
+            if request.if_none_match.contains(etag):
+                return tile_store.not_modified(etag)
 
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return jsonify(data)
+        data = _load_geo_tile(z, x, y)
+        if data is None:
+            return jsonify({"error": "Tile not found"}), 404
+        response = jsonify(data)
+        return tile_store.cache_headers(response, etag) if etag else response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/geo/tile/<int:z>/<int:x>/<int:y>.mvt')
+def get_geo_tile_mvt(z, x, y):
+    """Return a surveillance grid tile as a Mapbox Vector Tile (layer "surveillance")."""
+    if not geo_tiles.valid_tile(z, x, y):
+        return jsonify({"error": "Invalid tile coordinates"}), 400
+
+    try:
+        data = _load_geo_tile(z, x, y)
+        if data is None:
+            return jsonify({"error": "Tile not found"}), 404
+        response = make_response(geo_mvt.encode_feature_collection(data, z, x, y))
+        response.headers['Content-Type'] = geo_mvt.MVT_MIMETYPE
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -173,95 +324,153 @@ def get_geo_tile(z, x, y):
 
     
 
+@app.route('/api/geo/cameras')
+def get_cameras():
+    """Return the surveillance cameras inside a viewport, e.g. ?bbox=w,s,e,n&limit=500&type=ALPR."""
+    try:
+        bbox_arg = request.args.get('bbox', '').strip()
+        bbox = camera_index.parse_bbox(bbox_arg) if bbox_arg else None
+        limit = request.args.get('limit', camera_index.DEFAULT_LIMIT, type=int)
+        limit = max(1, min(limit, camera_index.MAX_LIMIT))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
+
+    # Attribute filters accept comma-separated values: ?type=ALPR,camera&operator=...&camera_type=dome
+    filters = {}
+    for arg, field in camera_index.FILTER_FIELDS.items():
+        value = request.args.get(arg) or request.args.get(field)
+        if value:
+            filters[field] = value.split(',')
+
+    try:
+        store = _camera_store()
+        if store is None:
+            return jsonify({"error": "Surveillance grid not found"}), 404
+        features, total = camera_index.query(store, bbox, filters, limit)
+        return jsonify({
+            "type": "FeatureCollection",
+            "features": features,
+            "total": total,
+            "returned": len(features)
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Seconds a request waits for the poller's first snapshot after startup
+FLIGHT_FIRST_SNAPSHOT_WAIT = 25
+# With INGEST_SHARED_DIR set, flights / vessels / tracks come from ingest_worker.py
+# through shared snapshot files instead of feeds running inside this process
+INGEST_SHARED_DIR = os.getenv("INGEST_SHARED_DIR", "").strip()
+_shared_ingest = shared_snapshot.SharedIngest(INGEST_SHARED_DIR) if INGEST_SHARED_DIR else None
+# Position history for playback, appended after every poll (by the ingest worker when shared)
+FLIGHT_HISTORY_DIR = os.getenv("FLIGHT_HISTORY_DIR", os.path.join(app.root_path, 'geodata', 'flight_history'))
+_flight_history = flight_history.FlightHistory(
+    FLIGHT_HISTORY_DIR, int(os.getenv("FLIGHT_HISTORY_HOURS", flight_history.DEFAULT_RETENTION_HOURS)))
+# Proximity / anomaly alerts evaluated on every poll (vessel index and cameras are defined below)
+_alert_engine = geo_alerts.AlertEngine(lambda: _vessel_index.snapshot, lambda: _camera_store())
+_flight_listeners_attached = False
+
+def _flight_source():
+    global _flight_listeners_attached
+    if _shared_ingest is not None:
+        return _shared_ingest.flights.start()
+    poller = flight_poller.get_poller()
+    if not _flight_listeners_attached:
+        _flight_listeners_attached = True
+        poller.add_listener(_flight_history.append)
+        poller.add_listener(_alert_engine.process)
+    return poller
+
 @app.route('/api/geo/flights')
 def get_flight_data():
-    """Fetch live flight data from adsb.one API (comprehensive global coverage)."""
-    search_q = request.args.get('q', '').strip().upper()
-    
-    # adsb.one provides excellent global coverage - query multiple regions
-    # Format: /v2/point/{lat}/{lon}/{radius_nm}
-    regions = [
-        ("https://api.adsb.one/v2/point/40/-100/4000", "Americas"),   # North America
-        ("https://api.adsb.one/v2/point/50/10/3000", "Europe"),       # Europe
-        ("https://api.adsb.one/v2/point/25/80/3000", "Asia"),         # South Asia
-        ("https://api.adsb.one/v2/point/35/135/2500", "EastAsia"),    # East Asia
-        ("https://api.adsb.one/v2/point/-25/135/2000", "Oceania"),    # Australia
-        ("https://api.adsb.one/v2/point/60/90/4000", "Russia"),       # Russia/Eurasia
-        ("https://api.adsb.one/v2/point/35/105/2500", "China"),       # China/Central Asia
-        ("https://api.adsb.one/v2/point/-15/-60/3000", "SouthAmerica"), # South America
-        ("https://api.adsb.one/v2/point/5/20/3500", "Africa"),          # Africa
-    ]
-    
-    all_flights = {}  # Use dict to dedupe by hex
-    
-    for url, region_name in regions:
-        try:
-            response = requests.get(url, timeout=20)
-            if response.status_code == 200:
-                data = response.json()
-                aircraft_list = data.get('ac', [])
-                
-                for ac in aircraft_list:
-                    # Skip if no position data
-                    if ac.get('lat') is None or ac.get('lon') is None:
-                        continue
-                    
-                    hex_code = ac.get('hex', '').upper()
-                    if hex_code in all_flights:
-                        continue  # Already have this aircraft
-                    
-                    callsign = (ac.get('flight', '') or '').strip() or ac.get('r', '') or hex_code
-                    registration = ac.get('r', '')
-                    aircraft_type = ac.get('t', '')
-                    
-                    # Apply search filter if provided
-                    if search_q:
-                        if search_q not in hex_code and search_q not in callsign.upper() and search_q not in registration.upper():
-                            continue
-                    
-                    # Type classification with color coding
-                    # Military detection
-                    mil_prefixes = ['RCH', 'SPAR', 'SAM', 'AF1', 'MAGMA', 'ASCOT', 'BAF', 'GAF', 
-                                   'PLF', 'DUKE', 'NAVY', 'COBRA', 'VIPER', 'REACH', 'EVAC']
-                    mil_types = ['C17', 'C130', 'C5', 'KC135', 'KC10', 'F15', 'F16', 'F18', 
-                                'F22', 'F35', 'B52', 'B1', 'B2', 'E3', 'E6', 'P8', 'V22']
-                    
-                    is_mil = any(callsign.upper().startswith(p) for p in mil_prefixes) or \
-                             any(t in aircraft_type.upper() for t in mil_types)
-                    
-                    # Private aircraft detection  
-                    priv_types = ['C172', 'C182', 'C208', 'PA28', 'SR22', 'TBM9', 'PC12', 'CL60', 'C152', 'PA32']
-                    is_priv = (callsign.startswith('N') and len(callsign) <= 6) or \
-                              callsign.startswith('G-') or callsign.startswith('VH-') or \
-                              aircraft_type.upper() in priv_types
-                    
-                    # Emergency detection
-                    is_emergency = ac.get('emergency', 'none') != 'none' or ac.get('squawk') == '7700'
-                    
-                    # Default to commercial (blue) - all flights visible!
-                    f_type = "commercial"
-                    if is_emergency: f_type = "emergency"
-                    elif is_mil: f_type = "military"
-                    elif is_priv: f_type = "private"
-                    
-                    all_flights[hex_code] = {
-                        "icao24": hex_code.lower(),
-                        "callsign": callsign,
-                        "registration": registration or "---",
-                        "aircraft_type": aircraft_type or "---",
-                        "long": ac.get('lon'),
-                        "lat": ac.get('lat'),
-                        "alt": ac.get('alt_baro') or ac.get('alt_geom') or 0,
-                        "velocity": ac.get('gs', 0),
-                        "heading": ac.get('track', 0),
-                        "squawk": ac.get('squawk', '----'),
-                        "type": f_type
-                    }
-        except Exception as e:
-            print(f"Error fetching {region_name}: {e}")
-            continue
-    
-    return jsonify(list(all_flights.values()))
+    """Live flights from the background adsb.one poller (comprehensive global coverage)."""
+    poller = _flight_source()
+    # first request after startup waits for the first poll instead of returning nothing
+    poller.first_snapshot.wait(FLIGHT_FIRST_SNAPSHOT_WAIT)
+    snapshot = poller.snapshot
+
+    search_q = request.args.get('q', '').strip()
+    icao = request.args.get('icao', '').strip()
+    bbox_arg = request.args.get('bbox', '').strip()
+    if not (search_q or icao or bbox_arg):
+        # unfiltered: the snapshot's JSON body is serialized once per poll
+        return Response(snapshot.body(), mimetype='application/json')
+
+    try:
+        bbox = camera_index.parse_bbox(bbox_arg) if bbox_arg else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(snapshot.filter(search_q, icao, bbox))
+
+@app.route('/api/geo/flights/history')
+def get_flight_history():
+    """
+    Playback frames of recorded flights: ?bbox=w,s,e,n, ?from= / ?to= (epoch
+    seconds or ISO 8601, default the last hour) and ?step=<seconds> between
+    frames (default 0: every poll).
+    """
+    _flight_source()  # recording starts with the poller
+    try:
+        bbox_arg = request.args.get('bbox', '').strip()
+        bbox = camera_index.parse_bbox(bbox_arg) if bbox_arg else None
+        t_from = request.args.get('from', '').strip()
+        t_to = request.args.get('to', '').strip()
+        t_from = time_utils.parse_time(t_from) if t_from else None
+        t_to = time_utils.parse_time(t_to) if t_to else None
+        step = max(0.0, request.args.get('step', 0.0, type=float))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if t_from is not None and t_to is not None and t_from > t_to:
+        return jsonify({"error": "from must not be after to"}), 400
+    try:
+        return jsonify(_flight_history.query(bbox, t_from, t_to, step))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/geo/alerts')
+def get_geo_alerts():
+    """
+    Latest proximity / anomaly alerts: ?type=vessel_proximity,camera_proximity,
+    squawk_change,loitering  ?severity=low|medium|high (minimum)  ?bbox=w,s,e,n  ?limit=
+    """
+    _flight_source()  # the engine runs on the poller's snapshots
+    try:
+        bbox_arg = request.args.get('bbox', '').strip()
+        bbox = camera_index.parse_bbox(bbox_arg) if bbox_arg else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    types = {t.strip() for t in request.args.get('type', '').split(',') if t.strip()}
+    severity = request.args.get('severity', '').strip().lower() or None
+    if severity is not None and severity not in geo_alerts.SEVERITY_RANK:
+        return jsonify({"error": "severity must be low, medium or high"}), 400
+    limit = max(1, min(request.args.get('limit', 500, type=int), geo_alerts.MAX_ALERTS))
+
+    try:
+        if _shared_ingest is not None:
+            result = _shared_ingest.alerts.value
+            stats = result.get("stats")
+        else:
+            result, stats = _alert_engine.result, _alert_engine.stats()
+        alerts = geo_alerts.filter_alerts(result["alerts"], types, bbox, severity)
+        return jsonify({"generated": result.get("generated"), "counts": result.get("counts", {}),
+                        "total": len(alerts), "alerts": alerts[:limit], "stats": stats})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/geo/flights/stream')
+def stream_flights():
+    """Server-Sent Events: a keyframe of the flights in ?bbox=w,s,e,n, then per-poll deltas."""
+    bbox_arg = request.args.get('bbox', '').strip()
+    try:
+        bbox = camera_index.parse_bbox(bbox_arg) if bbox_arg else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    hub = flight_stream.get_hub(_flight_source())
+    response = Response(hub.stream(bbox), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # keep reverse proxies from buffering the stream
+    return response
 
 
 
@@ -383,203 +592,41 @@ def get_celltower_click():
         return jsonify({"error": str(e)}), 500
 
 # --- VESSEL HARBOR UPLINK ---
+# AIS_STREAM_URL points the ingest at another server (e.g. feed_replay.py serve)
+AIS_STREAM_URL = os.getenv("AIS_STREAM_URL", ais_ingest.AIS_STREAM_URL)
 # Global cache for AIS data
-_ais_vessels_cache = {}
+# (TTL / LRU bounded, see vessel_cache; budgets overridable from the environment)
+_ais_vessels_cache = vessel_cache.VesselCache.from_env()
 _ais_cache_lock = None
 _ais_websocket_task = None
+_ais_ingest = None
+# Recent positions per MMSI (fixed memory: depth x 12 bytes per vessel, up to the byte cap)
+_vessel_tracks = vessel_tracks.TrackStore.from_env()
+VESSEL_PATH_MAX_POINTS = 500
+# Grid index of vessels with a valid position, republished after ingest batches
+_vessel_index = vessel_index.VesselIndex(_ais_vessels_cache)
+_ais_vessels_cache.index = _vessel_index  # evicted vessels leave the grid too
+# Periodic SQLite snapshot of the cache, reloaded before the websocket connects
+AIS_SNAPSHOT_PATH = os.path.join(app.root_path, 'geodata', 'ais_snapshot.db')
+_ais_snapshot_writer = None
 
 def start_ais_websocket():
     """Start background WebSocket connection to AISstream.io"""
-    import asyncio
-    import websockets
-    import json
-    import threading
     from threading import Lock
     
-    global _ais_cache_lock, _ais_websocket_task
+    global _ais_cache_lock, _ais_websocket_task, _ais_ingest, _ais_snapshot_writer
     _ais_cache_lock = Lock()
+    _ais_ingest = ais_ingest.AISIngest(_ais_vessels_cache, _ais_cache_lock, _vessel_tracks, _vessel_index)
+
+    # Warm start from the last snapshot, then keep snapshotting in the background
+    try:
+        ais_snapshot.warm_start(AIS_SNAPSHOT_PATH, _ais_vessels_cache, _ais_cache_lock, _vessel_index)
+    except Exception as e:
+        print(f"AIS warm start failed: {e}")
+    _ais_snapshot_writer = ais_snapshot.SnapshotWriter(AIS_SNAPSHOT_PATH, _ais_ingest).start()
+    vessel_cache.Sweeper(_ais_vessels_cache, _ais_cache_lock).start()
     
-    async def ais_stream():
-        global _ais_vessels_cache
-        
-        
-        async with websockets.connect("wss://stream.aisstream.io/v0/stream") as websocket:
-            # Subscribe to global ship positions
-            subscribe_message = {
-                "APIKey": api_key,
-                "BoundingBoxes": [[[-90, -180], [90, 180]]]  # Global coverage
-            }
-            
-            await websocket.send(json.dumps(subscribe_message))
-            print("AISstream.io connected - receiving real ship data...")
-            
-            async for message_json in websocket:
-                try:
-                    message = json.loads(message_json)
-                    
-                    # Handle Position Reports
-                    if "Message" in message and "PositionReport" in message["Message"]:
-                        pos = message["Message"]["PositionReport"]
-                        meta = message.get("MetaData", {})
-                        
-                        mmsi = str(meta.get("MMSI", "000000000"))
-                        ship_name = meta.get("ShipName", "UNKNOWN").strip()
-                        
-                        vessel_data = {
-                            "mmsi": mmsi,
-                            "name": ship_name if ship_name else "UNKNOWN",
-                            "lat": pos.get("Latitude", 0),
-                            "lon": pos.get("Longitude", 0),
-                            "heading": int(pos.get("TrueHeading", 0) or pos.get("Cog", 0) or 0),
-                            "speed": float(pos.get("Sog", 0) or 0),
-                            "type": _ais_vessels_cache.get(mmsi, {}).get("type", "cargo"),  # Keep existing type
-                            "imo": meta.get("IMO", "---"),
-                            "status": pos.get("NavigationalStatus", "Underway"),
-                            "country": _ais_vessels_cache.get(mmsi, {}).get("country", "--"),  # Keep existing country
-                            "draft": 0,
-                            "arrival": meta.get("Destination", "Unknown"),
-                            "callsign": meta.get("CallSign", "---"),
-                            "source": "AISstream_LIVE",
-                            "atd": "---",
-                            "departure": "---",
-                            "category": _ais_vessels_cache.get(mmsi, {}).get("type", "cargo")
-                        }
-                        
-                        with _ais_cache_lock:
-                            _ais_vessels_cache[mmsi] = vessel_data
-                    
-                    # Handle Ship Static Data (has ship type and country)
-                    elif "Message" in message and "ShipStaticData" in message["Message"]:
-                        static = message["Message"]["ShipStaticData"]
-                        meta = message.get("MetaData", {})
-                        
-                        mmsi = str(meta.get("MMSI", "000000000"))
-                        ship_type_code = static.get("Type", 0)
-                        
-                        # Map AIS ship type codes to readable types
-                        type_map = {
-                            range(30, 40): "fishing",
-                            range(40, 50): "tug",
-                            range(50, 60): "pilot",
-                            range(60, 70): "passenger",
-                            range(70, 80): "cargo",
-                            range(80, 90): "tanker",
-                            range(35, 36): "military",
-                            range(51, 52): "special"
-                        }
-                        
-                        ship_type = "cargo"  # default
-                        for code_range, type_name in type_map.items():
-                            if ship_type_code in code_range:
-                                ship_type = type_name
-                                break
-                        
-                        # Get country from UserID (first 3 digits of MMSI = Maritime Identification Digits)
-                        mid = mmsi[:3]
-                        country_map = {
-                            '202': 'GB', '203': 'ES', '204': 'PT', '205': 'BE', '206': 'FR',
-                            '207': 'FR', '208': 'FR', '209': 'CY', '210': 'CY', '211': 'DE',
-                            '212': 'CY', '213': 'GE', '214': 'MD', '215': 'MT', '216': 'AM',
-                            '218': 'DE', '219': 'DK', '220': 'DK', '224': 'ES', '225': 'ES',
-                            '226': 'FR', '227': 'FR', '228': 'FR', '229': 'MT', '230': 'FI',
-                            '231': 'FO', '232': 'GB', '233': 'GB', '234': 'GB', '235': 'GB',
-                            '236': 'GI', '237': 'GR', '238': 'HR', '239': 'GR', '240': 'GR',
-                            '241': 'GR', '242': 'MA', '243': 'HU', '244': 'NL', '245': 'NL',
-                            '246': 'NL', '247': 'IT', '248': 'MT', '249': 'MT', '250': 'IE',
-                            '251': 'IS', '252': 'LI', '253': 'LU', '254': 'MC', '255': 'PT',
-                            '256': 'MT', '257': 'NO', '258': 'NO', '259': 'NO', '261': 'PL',
-                            '262': 'ME', '263': 'PT', '264': 'RO', '265': 'SE', '266': 'SE',
-                            '267': 'SK', '268': 'SM', '269': 'CH', '270': 'CZ', '271': 'TR',
-                            '272': 'UA', '273': 'RU', '274': 'MK', '275': 'LV', '276': 'EE',
-                            '277': 'LT', '278': 'SI', '279': 'RS', '301': 'AI', '303': 'US',
-                            '304': 'AG', '305': 'AG', '306': 'CW', '307': 'AW', '308': 'BS',
-                            '309': 'BS', '310': 'BM', '311': 'BS', '312': 'BZ', '314': 'BB',
-                            '316': 'CA', '319': 'KY', '321': 'CR', '323': 'CU', '325': 'DM',
-                            '327': 'DO', '329': 'GP', '330': 'GD', '331': 'GL', '332': 'GT',
-                            '334': 'HN', '336': 'HT', '338': 'US', '339': 'JM', '341': 'KN',
-                            '343': 'LC', '345': 'MX', '347': 'MQ', '348': 'MS', '350': 'NI',
-                            '351': 'PA', '352': 'PA', '353': 'PA', '354': 'PA', '355': 'PA',
-                            '356': 'PA', '357': 'PA', '358': 'PR', '359': 'SV', '361': 'PM',
-                            '362': 'TT', '364': 'TC', '366': 'US', '367': 'US', '368': 'US',
-                            '369': 'US', '370': 'PA', '371': 'PA', '372': 'PA', '373': 'PA',
-                            '374': 'PA', '375': 'VC', '376': 'VC', '377': 'VC', '378': 'VG',
-                            '401': 'AF', '403': 'SA', '405': 'BD', '408': 'BH', '410': 'BT',
-                            '412': 'CN', '413': 'CN', '414': 'CN', '416': 'TW', '417': 'LK',
-                            '419': 'IN', '422': 'IR', '423': 'AZ', '425': 'IQ', '428': 'IL',
-                            '431': 'JP', '432': 'JP', '434': 'TM', '436': 'KZ', '437': 'UZ',
-                            '438': 'JO', '440': 'KR', '441': 'KR', '443': 'PS', '445': 'KP',
-                            '447': 'KW', '450': 'LB', '451': 'KG', '453': 'MO', '455': 'MV',
-                            '457': 'MN', '459': 'NP', '461': 'OM', '463': 'PK', '466': 'QA',
-                            '468': 'SY', '470': 'AE', '471': 'AE', '472': 'TJ', '473': 'YE',
-                            '475': 'YE', '477': 'HK', '478': 'BA', '501': 'AQ', '503': 'AU',
-                            '506': 'MM', '508': 'BN', '510': 'FM', '511': 'PW', '512': 'NZ',
-                            '514': 'KH', '515': 'KH', '516': 'CX', '518': 'CK', '520': 'FJ',
-                            '523': 'CC', '525': 'ID', '529': 'KI', '531': 'LA', '533': 'MY',
-                            '536': 'MP', '538': 'MH', '540': 'NC', '542': 'NU', '544': 'NR',
-                            '546': 'PF', '548': 'PH', '553': 'PG', '555': 'PN', '557': 'SB',
-                            '559': 'AS', '561': 'WS', '563': 'SG', '564': 'SG', '565': 'SG',
-                            '566': 'SG', '567': 'TH', '570': 'TO', '572': 'TV', '574': 'VN',
-                            '576': 'VU', '577': 'VU', '578': 'WF', '601': 'ZA', '603': 'AO',
-                            '605': 'DZ', '607': 'TF', '608': 'AS', '609': 'BI', '610': 'BJ',
-                            '611': 'BW', '612': 'CF', '613': 'CM', '615': 'CG', '616': 'KM',
-                            '617': 'CV', '618': 'AQ', '619': 'CI', '620': 'KM', '621': 'DJ',
-                            '622': 'EG', '624': 'ET', '625': 'ER', '626': 'GA', '627': 'GH',
-                            '629': 'GM', '630': 'GW', '631': 'GQ', '632': 'GN', '633': 'BF',
-                            '634': 'KE', '635': 'AQ', '636': 'LR', '637': 'LR', '638': 'SS',
-                            '642': 'LY', '644': 'LS', '645': 'MU', '647': 'MG', '649': 'ML',
-                            '650': 'MZ', '654': 'MR', '655': 'MW', '656': 'NE', '657': 'NG',
-                            '659': 'NA', '660': 'RE', '661': 'RW', '662': 'SD', '663': 'SN',
-                            '664': 'SC', '665': 'SH', '666': 'SO', '667': 'SL', '668': 'ST',
-                            '669': 'SZ', '670': 'TD', '671': 'TG', '672': 'TN', '674': 'TZ',
-                            '675': 'UG', '676': 'CD', '677': 'TZ', '678': 'ZM', '679': 'ZW'
-                        }
-                        country = country_map.get(mid, "--")
-                        
-                        # Update or create vessel data with static info
-                        with _ais_cache_lock:
-                            if mmsi in _ais_vessels_cache:
-                                _ais_vessels_cache[mmsi]["type"] = ship_type
-                                _ais_vessels_cache[mmsi]["country"] = country
-                                _ais_vessels_cache[mmsi]["category"] = ship_type
-                            else:
-                                # Create minimal entry until we get position report
-                                _ais_vessels_cache[mmsi] = {
-                                    "mmsi": mmsi,
-                                    "name": meta.get("ShipName", "UNKNOWN").strip(),
-                                    "type": ship_type,
-                                    "country": country,
-                                    "lat": 0,
-                                    "lon": 0,
-                                    "heading": 0,
-                                    "speed": 0,
-                                    "imo": meta.get("IMO", "---"),
-                                    "status": "Unknown",
-                                    "draft": static.get("Draught", 0) / 10,  # AIS reports in decimeters
-                                    "arrival": static.get("Destination", "Unknown"),
-                                    "callsign": static.get("CallSign", "---"),
-                                    "source": "AISstream_LIVE",
-                                    "atd": "---",
-                                    "departure": "---",
-                                    "category": ship_type
-                                }
-                            
-                except Exception as e:
-                    print(f"AIS Parse Error: {e}")
-                    continue
-    
-   
-    def run_async():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        while True:
-            try:
-                loop.run_until_complete(ais_stream())
-            except Exception as e:
-                print(f"AIS WebSocket Error: {e}, reconnecting in 5s...")
-                import time
-                time.sleep(5)
-    
-    thread = threading.Thread(target=run_async, daemon=True)
+    thread = threading.Thread(target=ais_ingest.run_stream, args=(_ais_ingest, api_key, AIS_STREAM_URL), daemon=True)
     thread.start()
     print("AIS WebSocket thread started")
 
@@ -588,57 +635,124 @@ def get_vessel_data():
     """Fetch REAL live vessel data from AISstream.io"""
     global _ais_vessels_cache, _ais_websocket_task
     
-    # Start WebSocket if not already started
-    if _ais_websocket_task is None:
+    # Start WebSocket if not already started (and not run by the ingest worker)
+    if _ais_websocket_task is None and _shared_ingest is None:
         try:
             start_ais_websocket()
             _ais_websocket_task = True
         except Exception as e:
             print(f"Failed to start AIS WebSocket: {e}")
     
-    # Return cached vessels (optimized for performance)
-    with _ais_cache_lock if _ais_cache_lock else nullcontext():
-        all_vessels = list(_ais_vessels_cache.values())
-        
-        # Filter out vessels with invalid positions
-        valid_vessels = [v for v in all_vessels if v.get('lat') != 0 and v.get('lon') != 0]
-        
-        # Prioritize India (419), China (412, 413, 414), Russia (273)
-        priority_prefixes = ('419', '412', '413', '414', '273')
-        
-        priority_ships = [v for v in valid_vessels if v.get('mmsi', '').startswith(priority_prefixes)]
-        other_ships = [v for v in valid_vessels if not v.get('mmsi', '').startswith(priority_prefixes)]
-        
-        # Combine: Priority ships first, then others, limit to 1500 total for better coverage
-        vessels = (priority_ships + other_ships)[:1500]
-    
-    return jsonify(vessels)
-
-from contextlib import nullcontext
+    try:
+        bounds_arg = request.args.get('bounds', '').strip()
+        bounds = vessel_index.parse_bounds(bounds_arg) if bounds_arg else None
+    except ValueError:
+        return jsonify({"error": "bounds must be south,east,north,west"}), 400
+    limit = request.args.get('limit', vessel_index.DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, vessel_index.MAX_LIMIT))
+    types = {t.strip().lower() for t in request.args.get('type', '').split(',') if t.strip()}
+
+    if _shared_ingest is not None:
+        return Response(_shared_ingest.vessels.query(bounds, types, limit), mimetype='application/json')
+    # Only the snapshot reference is taken under a lock; the query reads immutable cells
+    snapshot = _vessel_index.snapshot
+    return jsonify(snapshot.query(bounds, types, limit))
+
+@app.route('/api/geo/ais/stats')
+def get_ais_stats():
+    """AIS ingest counters (messages/sec, lag, batching), cache size and eviction stats."""
+    if _shared_ingest is not None:
+        return jsonify(_shared_ingest.vessels.stats())
+    if _ais_ingest is None:
+        return jsonify({"running": False, "vessels": 0})
+    with _ais_cache_lock:
+        cache = _ais_vessels_cache.stats()
+    return jsonify({"running": True, "vessels": cache["vessels"], "cache": cache, "ingest": _ais_ingest.stats(),
+                    "tracks": _vessel_tracks.stats(), "snapshot": _ais_snapshot_writer.stats()})
 
 @app.route('/api/geo/vessel/path/<mmsi>')
 def get_vessel_path(mmsi):
-    """Generate a realistic historical path for a vessel."""
-    import random
-    # Mock more historical points for a longer path
-    res = []
-    # Start with a random seed based on MMSI
-    random.seed(mmsi)
-    lat = random.uniform(-60, 70)
-    lon = random.uniform(-180, 180)
-    
-    for _ in range(25):
-        lat += random.uniform(-1.0, 1.0)
-        lon += random.uniform(-1.0, 1.0)
-        res.append([lat, lon])
-    
-    return jsonify(res)
+    """
+    Recorded track of a vessel as [[lat, lon], ...], oldest first.
+    ?since=<epoch seconds> drops older points, ?max_points= (default 100) and
+    ?tolerance=<degrees> simplify the line with Douglas-Peucker.
+    """
+    try:
+        since = request.args.get('since', type=int)
+        max_points = request.args.get('max_points', 100, type=int)
+        max_points = max(2, min(max_points, VESSEL_PATH_MAX_POINTS))
+        tolerance = max(0.0, request.args.get('tolerance', 0.0, type=float))
+
+        tracks = _shared_ingest.tracks if _shared_ingest is not None else _vessel_tracks
+        lat, lon, ts = tracks.track(str(mmsi), since)
+        keep = vessel_tracks.simplify(lat, lon, tolerance, max_points)
+        return jsonify([[round(float(lat[i]), 5), round(float(lon[i]), 5)] for i in keep])
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 
 
 from ultralytics import YOLO
 
 
+def reverse_geocode(lat, lon, timeout=2):
+    """
+    {"country", "country_code", "admin1", "city", "region"} of a point, from the
+    offline boundary index when its dataset is installed (see reverse_geocoder),
+    otherwise from one Nominatim request. None when the place is unknown (sea).
+    """
+    geocoder = reverse_geocoder.get_geocoder()
+    if geocoder is not None:
+        place = geocoder.lookup(lat, lon)
+        return dict(place, city=None) if place is not None else None
+    try:
+        geo_res = requests.get("https://nominatim.openstreetmap.org/reverse",
+                               params={"lat": lat, "lon": lon, "format": "json"},
+                               timeout=timeout, headers={'User-Agent': 'HayOS/1.0'})
+        if geo_res.status_code == 200:
+            address = geo_res.json().get('address', {})
+            if address:
+                code = (address.get('country_code') or '').upper() or None
+                return {
+                    "country": address.get('country'),
+                    "country_code": code,
+                    "admin1": address.get('state'),
+                    "city": address.get('city') or address.get('town') or address.get('village'),
+                    "region": reverse_geocoder.region_for(code, address.get('country'))
+                }
+    except Exception as geo_err:
+        print(f"Geocoding error: {geo_err}")
+    return None
+
+@app.route('/api/geo/reverse', methods=['GET', 'POST'])
+def get_reverse_geocode():
+    """
+    Offline reverse geocoding: GET ?lat=&lon= for one point, POST
+    {"points": [[lat, lon], ...]} (up to REVERSE_GEOCODE_MAX_BATCH) for many.
+    Each result is {"country", "country_code", "admin1", "region"} or null.
+    """
+    geocoder = reverse_geocoder.get_geocoder()
+    if geocoder is None:
+        return jsonify({"error": "No boundary dataset installed (python reverse_geocoder.py download)"}), 503
+    try:
+        if request.method == 'POST':
+            points = (request.get_json(silent=True) or {}).get('points')
+            if not isinstance(points, list):
+                return jsonify({"error": "Expected {\"points\": [[lat, lon], ...]}"}), 400
+            if len(points) > REVERSE_GEOCODE_MAX_BATCH:
+                return jsonify({"error": f"At most {REVERSE_GEOCODE_MAX_BATCH} points per request"}), 400
+            coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+            return jsonify({"results": geocoder.lookup_many(coords[:, 0], coords[:, 1])})
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        if lat is None or lon is None:
+            return jsonify({"error": "Missing coordinates"}), 400
+        return jsonify({"lat": lat, "lon": lon, "place": geocoder.lookup(lat, lon)})
+    except ValueError as e:
+        return jsonify({"error": f"Invalid points: {e}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/geo/news')
 def get_geo_news():
     """
@@ -652,49 +766,25 @@ def get_geo_news():
         return jsonify({"error": "Missing coordinates"}), 400
 
     # --- Check Cache ---
-    cache_key = f"geo_{lat}_{lon}"
-    now_ts = datetime.now(timezone.utc).timestamp()
-    if cache_key in news_cache:
-        cached_time, cached_data = news_cache[cache_key]
-        if (now_ts - cached_time) < (NEWS_CACHE_LIMIT * 60):
-            print(f"Serving cached geo news for: {cache_key}")
-            return jsonify(cached_data)
+    # one entry per geohash cell; concurrent misses of a cell run the pipeline once
+    cache_key = geo_cache.geo_key("geo", lat, lon, GEO_NEWS_PRECISION)
+    try:
+        result_data = geo_news_cache.get_or_compute(cache_key, lambda: build_geo_news(lat, lon))
+    except Exception as e:
+        print(f"Geo news error: {e}")
+        return jsonify({"error": str(e)}), 500
+    return jsonify(dict(result_data, lat=lat, lon=lon))
 
+def build_geo_news(lat, lon):
+    """Geocode, tweets, regional RSS, NewsAPI and the AI summary for one location."""
     real_tweets = []
     real_news = []
     
     # --- 1. Location Detection (Geocoding) ---
-    location_query = ""
-    detected_region = ""
-    try:
-        geo_url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lon}&format=json"
-        geo_res = requests.get(geo_url, timeout=2, headers={'User-Agent': 'HayOS/1.0'})
-        if geo_res.status_code == 200:
-            geo_data = geo_res.json()
-            address = geo_data.get('address', {})
-            location_query = address.get('country', '') or address.get('city', '') or address.get('state', '')
-            print(f"Reverse geocode: {location_query}")
-            
-            # Regional Mapping
-            country_mapping = {
-                "United States": "USA", "India": "INDIA", "China": "CHINA",
-                "Russia": "RUSSIA", "Japan": "JAPAN", "Australia": "AUSTRALIA",
-                "Taiwan": "TAIWAN", "South Korea": "SOUTH_KOREA", "Israel": "ISRAEL",
-                "United Arab Emirates": "UAE", "Iran": "IRAN"
-            }
-            
-            for c_name, reg_key in country_mapping.items():
-                if location_query and c_name in location_query:
-                    detected_region = reg_key
-                    break
-            
-            if not detected_region and location_query:
-                if any(x in location_query for x in ["Europe", "France", "Germany", "Spain", "Italy", "UK", "London"]):
-                    detected_region = "EUROPE"
-                elif any(x in location_query for x in ["Africa", "Kenya", "Nigeria", "Egypt", "South Africa"]):
-                    detected_region = "AFRICA"
-    except Exception as geo_err:
-        print(f"Geocoding error: {geo_err}")
+    place = reverse_geocode(lat, lon) or {}
+    location_query = place.get('country') or place.get('city') or place.get('admin1') or ""
+    detected_region = place.get('region') if place.get('region') in NEWS_SOURCES else ""
+    print(f"Reverse geocode: {location_query} ({detected_region or 'no region'})")
 
     # --- 2. Try Real Twitter API v2 (Search) ---
     if TWITTER_BEARER_TOKEN and TWITTER_BEARER_TOKEN != 'YOUR_BEARER_TOKEN_HERE':
@@ -722,7 +812,7 @@ def get_geo_news():
     # --- 3. Try Regional RSS (Authentic Feeds) ---
     if detected_region:
         print(f"Uplinking regional RSS: {detected_region}")
-        rss_geo = fetch_rss_news(detected_region)
+        rss_geo = news_from_index(detected_region, limit=15)
         real_news.extend(rss_geo[:15])
 
     # --- 4. Try NewsAPI (If available) ---
@@ -752,7 +842,7 @@ def get_geo_news():
     # --- 5. International Fallback (If no regional news found) ---
     if not real_news:
         print("Fallback to International RSS Intelligence...")
-        intl_news = fetch_rss_news("INTERNATIONAL")
+        intl_news = news_from_index("INTERNATIONAL", limit=15)
         real_news.extend(intl_news[:15])
 
     # --- 6. Final Mock Fallback (If all else fails) ---
@@ -805,10 +895,7 @@ def get_geo_news():
         "intel_summary": ai_summary
     }
 
-    # Store in cache
-    news_cache[cache_key] = (now_ts, result_data)
-
-    return jsonify(result_data)
+    return result_data
 
 def analyze_with_ai(context):
     """
@@ -916,34 +1003,88 @@ def newsnetworks_page():
 
 def fetch_rss_news(region):
     """
-    Fetch and parse all RSS feeds for a given region defined in news_config.py.
+    Fetch and parse all RSS feeds for a given region defined in news_config.py
+    (concurrently, with conditional GETs, see news_fetcher).
     """
     articles = []
     if region not in NEWS_SOURCES:
         return articles
     
     rss_urls = NEWS_SOURCES[region].get('rss', [])
-    for url in rss_urls:
-        try:
-            # We use a timeout to avoid hanging on slow feeds
-            feed = feedparser.parse(url)
-            source_name = feed.feed.get('title', url.split('/')[2])
-            for entry in feed.entries[:10]: 
-                # Basic formatting for consistency
-                articles.append({
-                    "source": source_name,
-                    "title": entry.get('title'),
-                    "url": entry.get('link'),
-                    "published": entry.get('published') or entry.get('updated') or datetime.now(timezone.utc).isoformat(),
-                    "description": entry.get('summary', '')[:200] + "..." if entry.get('summary') else "",
-                    "image": None,
-                    "type": f"RSS_{region}"
-                })
-        except Exception as e:
-            print(f"Error parsing RSS {url}: {e}")
+    for feed in _news_fetcher.fetch_many(rss_urls):
+        for entry in feed.entries[:10]:
+            # Basic formatting for consistency
+            articles.append({
+                "source": feed.title,
+                "title": entry['title'],
+                "url": entry['url'],
+                "published": entry['published'] or datetime.now(timezone.utc).isoformat(),
+                "description": entry['summary'][:200] + "..." if entry['summary'] else "",
+                "image": None,
+                "type": f"RSS_{region}"
+            })
             
     return articles
 
+def news_from_index(region=None, q='', since=None, until=None, limit=news_index.DEFAULT_LIMIT, sort=None):
+    """
+    RSS articles from the local news index: a region's feeds (all feeds without
+    one), matching `q`, published in [since, until). A plain region listing the
+    index cannot answer yet (cold start) is fetched live.
+    """
+    if _shared_ingest is None:
+        _news_ingestor.start()
+    try:
+        articles = _news_index.search(q, [region] if region else None, since, until, limit, sort=sort)
+    except Exception as e:
+        print(f"News index error: {e}")
+        articles = []
+    if not articles and region and not q and since is None and until is None:
+        articles = fetch_rss_news(region)
+    return articles
+
+@app.route('/api/news/index')
+def get_news_index_stats():
+    """Article counts of the local news index and the state of the ingestor."""
+    try:
+        stats = _news_index.stats()
+        if _shared_ingest is None:
+            stats["ingest"] = _news_ingestor.stats()
+        return jsonify(stats)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/news/cache')
+def get_news_cache_stats():
+    """Size and hit / miss / eviction counters of the news response caches."""
+    return jsonify({"geo_news": geo_news_cache.stats(), "advanced": news_cache.stats()})
+
+@app.route('/api/news/feeds')
+def get_news_feed_health():
+    """
+    Per-feed health of the RSS ingestor: latency, last success, error rate,
+    items/day, poll interval and circuit state. ?region=IRAN, ?circuit=open.
+    """
+    try:
+        if _shared_ingest is not None:
+            report = _shared_ingest.news_health.value
+        else:
+            _news_ingestor.start()
+            report = _news_ingestor.report()
+        feeds = report["feeds"]
+        region = request.args.get('region', '').strip().upper()
+        if region:
+            feeds = [f for f in feeds if region in f.get("regions", [])]
+        circuit = request.args.get('circuit', '').strip().lower()
+        if circuit:
+            feeds = [f for f in feeds if f["circuit"] == circuit]
+        # worst first: open circuits, then by error rate
+        feeds = sorted(feeds, key=lambda f: (f["circuit"] == "closed", -(f["error_rate"] or 0), f["url"]))
+        return jsonify({"generated": report["generated"], "summary": report["summary"],
+                        "count": len(feeds), "feeds": feeds})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/news/advanced')
 
 def get_advanced_news():
@@ -952,11 +1093,19 @@ def get_advanced_news():
     query = request.args.get('q', '')
     news_type = request.args.get('type', 'all') 
     region = request.args.get('region', '').upper()
+    limit = request.args.get('limit', news_index.DEFAULT_LIMIT, type=int)
+    # relevance order for keyword searches unless newest-first is asked for explicitly
+    index_sort = "date" if request.args.get('sortBy') == 'publishedAt' else None
+    try:
+        since = time_utils.parse_time(request.args['from']) if request.args.get('from') else None
+        until = time_utils.parse_time(request.args['to']) if request.args.get('to') else None
+    except ValueError as e:
+        return jsonify({"error": f"Invalid date: {e}"}), 400
     
     if not NEWS_API_KEY or NEWS_API_KEY == "YOUR_NEWS_API_KEY": # Let real keys through
-        # If no key, try RSS first
+        # If no key, try RSS first (answered from the local news index)
         if region:
-            rss_news = fetch_rss_news(region)
+            rss_news = news_from_index(region, query, since, until, limit, index_sort)
             if rss_news:
                 return jsonify({
                     "query": query or region,
@@ -966,12 +1115,12 @@ def get_advanced_news():
         
         # If no key, and no lat/lon, return mock global news
         if not lat or not lon:
-            # Fallback to general INTERNATIONAL RSS if possible
+            # Fallback to general INTERNATIONAL RSS if possible (a keyword searches every feed)
             if not region:
-                rss_intl = fetch_rss_news("INTERNATIONAL")
+                rss_intl = news_from_index(None if query else "INTERNATIONAL", query, since, until, limit, index_sort)
                 if rss_intl:
                     return jsonify({
-                        "query": "INTERNATIONAL INTEL",
+                        "query": query or "INTERNATIONAL INTEL",
                         "articles": rss_intl,
                         "count": len(rss_intl)
                     })
@@ -1005,20 +1154,17 @@ def get_advanced_news():
     search_query = query
     if lat and lon:
         try:
-            geo_url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}"
-            g_res = requests.get(geo_url, headers={'User-Agent': 'HayOS/1.0'}, timeout=5)
-            if g_res.status_code == 200:
-                address = g_res.json().get('address', {})
-                city = address.get('city') or address.get('town') or address.get('village')
-                country = address.get('country')
-                
-                if news_type == 'local' and city:
-                    search_query += f" {city}"
-                elif news_type == 'national' and country:
-                    search_query += f" {country}"
-                elif news_type == 'all':
-                    search_query += f" {city or country or ''}"
-        except:
+            place = reverse_geocode(float(lat), float(lon), timeout=5) or {}
+            city = place.get('city') or place.get('admin1')
+            country = place.get('country')
+            
+            if news_type == 'local' and city:
+                search_query += f" {city}"
+            elif news_type == 'national' and country:
+                search_query += f" {country}"
+            elif news_type == 'all':
+                search_query += f" {city or country or ''}"
+        except ValueError:
             pass
 
     sort_by = request.args.get('sortBy', 'publishedAt')
@@ -1027,13 +1173,10 @@ def get_advanced_news():
     page_size = 10 # Hard limit to 10 as per user request
     
     # --- Check Cache ---
-    cache_key = f"advanced_{search_query}_{language}_{sort_by}"
-    now_ts = datetime.now(timezone.utc).timestamp()
-    if cache_key in news_cache:
-        cached_time, cached_data = news_cache[cache_key]
-        if (now_ts - cached_time) < (NEWS_CACHE_LIMIT * 60):
-            print(f"Serving cached news for: {cache_key}")
-            return jsonify(cached_data)
+    cache_key = f"advanced_{search_query}_{language}_{sort_by}_{region}_{from_date}_{since}_{until}_{limit}"
+    cached_data = news_cache.get(cache_key)
+    if cached_data is not None:
+        return jsonify(cached_data)
 
     try:
         url = "https://newsapi.org/v2/everything"
@@ -1071,7 +1214,7 @@ def get_advanced_news():
     # If region is provided, fetch RSS to complement NewsAPI
     # DEFAULT behavior: if no region specified, mixing in INTERNATIONAL RSS
     rss_region = region if region else "INTERNATIONAL"
-    rss_news = fetch_rss_news(rss_region)
+    rss_news = news_from_index(rss_region, query, since, until, limit, index_sort)
     news_articles.extend(rss_news)
 
     # Final logic: if articles still empty, provide mock data for fallback
@@ -1101,7 +1244,7 @@ def get_advanced_news():
             "articles": news_articles,
             "count": len(news_articles)
         }
-        news_cache[cache_key] = (now_ts, result_data)
+        news_cache.put(cache_key, result_data)
 
     return jsonify({
         "query": search_query,
@@ -1175,25 +1318,45 @@ def translate_text():
         return jsonify({"error": str(e), "original": text}), 500
 
 
+# Callsign -> route cache (memory + SQLite shared by the workers) with a bounded upstream pool
+FLIGHT_ROUTES_PATH = os.path.join(app.root_path, 'geodata', 'flight_routes.db')
+_flight_routes = flight_routes.RouteResolver(FLIGHT_ROUTES_PATH)
+
+@app.route('/api/geo/flights/meta/<callsign>')
 def get_flight_meta(callsign):
     """Fetch route and registration data for a specific callsign."""
-    if not callsign or callsign == "N/A":
+    if not flight_routes.normalize(callsign):
         return jsonify({"error": "No callsign provided"}), 400
         
     try:
-        # 1. Try Routes API (Origin/Destination)
-        route_url = f"https://opensky-network.org/api/routes?callsign={callsign}"
-        r_res = requests.get(route_url, timeout=10)
-        route_data = {}
-        if r_res.status_code == 200:
-            route_data = r_res.json()
-            
-        return jsonify({
-            "callsign": callsign,
-            "route": route_data.get("route", ["UNK", "UNK"]),
-            "operator": route_data.get("operatorIata", "---"),
-            "flight_number": route_data.get("flightNumber", "---")
-        })
+        meta = _flight_routes.resolve(callsign)
+        if "error" in meta:
+            return jsonify(meta), 502
+        return jsonify(meta)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/geo/flights/meta', methods=['GET', 'POST'])
+def get_flights_meta():
+    """
+    Routes of a batch of callsigns: ?callsigns=A,B,C or a JSON body
+    {"callsigns": [...]} (at most flight_routes.MAX_BATCH).
+    Returns {"results": {callsign: meta}, "stats": {...}}.
+    """
+    if request.method == 'POST':
+        callsigns = (request.get_json(silent=True) or {}).get('callsigns') or []
+        if not isinstance(callsigns, list):
+            return jsonify({"error": "callsigns must be a list"}), 400
+        callsigns = [str(c) for c in callsigns]
+    else:
+        callsigns = request.args.get('callsigns', '').split(',')
+    if not any(map(flight_routes.normalize, callsigns)):
+        return jsonify({"error": "No callsigns provided"}), 400
+    if len(callsigns) > flight_routes.MAX_BATCH:
+        return jsonify({"error": f"At most {flight_routes.MAX_BATCH} callsigns per request"}), 400
+
+    try:
+        return jsonify({"results": _flight_routes.resolve_many(callsigns), "stats": _flight_routes.stats()})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
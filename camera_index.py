@@ -0,0 +1,96 @@
+"""
+Viewport and attribute queries over the columnar camera store.
+
+Rows of camera_store.CameraStore are sorted by quadkey, so any slippy-map tile
+is one contiguous row range. A bbox query covers the viewport with at most
+MAX_COVER_TILES tiles at the deepest zoom that allows it, concatenates their row
+ranges and applies an exact bbox mask. Attribute filters (surveillance:type,
+operator, camera:type) are evaluated with np.isin over the store's dictionary
+code arrays instead of a Python loop over property dicts.
+"""
+import numpy as np
+
+import geo_tiles
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+MAX_COVER_TILES = 16
+
+# query parameter -> feature property (all dictionary-encoded in the store)
+FILTER_FIELDS = {
+    "type": "surveillance:type",
+    "operator": "operator",
+    "camera_type": "camera:type",
+}
+
+
+def _cover_rows(store, west, south, east, north):
+    """Candidate rows of the tiles covering a bbox (west <= east)."""
+    gx, gy = geo_tiles.lonlat_to_world(np.array([west, east]), np.array([north, south]))
+    z = 0
+    while z < geo_tiles.WORLD_BITS:
+        shift = geo_tiles.WORLD_BITS - z - 1
+        span_x = (gx[1] >> shift) - (gx[0] >> shift) + 1
+        span_y = (gy[1] >> shift) - (gy[0] >> shift) + 1
+        if span_x * span_y > MAX_COVER_TILES:
+            break
+        z += 1
+
+    shift = geo_tiles.WORLD_BITS - z
+    spans = []
+    for x in range(int(gx[0] >> shift), int(gx[1] >> shift) + 1):
+        for y in range(int(gy[0] >> shift), int(gy[1] >> shift) + 1):
+            rows = store.tile_slice(z, x, y)
+            if rows.stop > rows.start:
+                spans.append(np.arange(rows.start, rows.stop))
+    return np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+
+def _codes_for(store, field, values):
+    """Codes of the vocabulary entries matching any of `values` (case-insensitive)."""
+    wanted = {v.strip().lower() for v in values if v.strip()}
+    return np.array([c for c, value in enumerate(store.cat_vocab[field]) if value.lower() in wanted], dtype=np.int32)
+
+
+def query(store, bbox=None, filters=None, limit=DEFAULT_LIMIT):
+    """
+    Return (features, total) for cameras inside bbox=(west, south, east, north)
+    matching every filter {property: [accepted values]}. A bbox crossing the
+    antimeridian (west > east) is split in two. When more than `limit` cameras
+    match, an evenly strided sample is returned so the viewport stays covered.
+    """
+    if bbox is None:
+        idx = np.arange(len(store))
+    else:
+        west, south, east, north = bbox
+        parts = [(west, south, east, north)] if west <= east else \
+            [(west, south, 180.0, north), (-180.0, south, east, north)]
+        idx = np.concatenate([_cover_rows(store, *p) for p in parts])
+        lon, lat = store.lon[idx], store.lat[idx]
+        inside = (lat >= south) & (lat <= north)
+        if west <= east:
+            inside &= (lon >= west) & (lon <= east)
+        else:
+            inside &= (lon >= west) | (lon <= east)
+        idx = idx[inside]
+
+    for field, values in (filters or {}).items():
+        if not values:
+            continue
+        idx = idx[np.isin(store.cat_codes[field][idx], _codes_for(store, field, values))]
+
+    total = len(idx)
+    if total > limit:
+        idx = idx[np.linspace(0, total - 1, limit).astype(np.int64)]
+    return store.features(idx), total
+
+
+def parse_bbox(value):
+    """Parse "west,south,east,north" into floats; raises ValueError when malformed."""
+    parts = [float(p) for p in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError("bbox must be west,south,east,north")
+    west, south, east, north = parts
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError("bbox out of range")
+    return west, south, east, north
@@ -0,0 +1,242 @@
+"""
+Columnar in-memory store of every surveillance camera.
+
+Parsing ~80 MB of tile JSON per request (or keeping 237k property dicts alive)
+costs seconds and hundreds of MB. The store keeps the grid as flat arrays:
+
+    lon, lat         float32 positions
+    qkey             int64 Morton (quadkey) code at geo_tiles.WORLD_BITS, rows sorted by it
+    cat_codes        int32 dictionary codes of the CATEGORICAL_FIELDS
+    prop_offsets     CSR offsets into prop_keys / prop_vals for the remaining properties
+    prop_keys/vals   indexes into the interned key table and the interned value table
+
+Sorting by quadkey makes every slippy-map tile, at any zoom, one contiguous row
+range: serving a tile is two binary searches and a slice.
+
+The store is built from the raw grid once and cached as an .npz next to it, so
+later startups load it in well under a second.
+"""
+import os
+import json
+import hashlib
+import threading
+
+import numpy as np
+
+import geo_tiles
+
+# Categorical properties kept as dictionary-encoded code arrays
+CATEGORICAL_FIELDS = ("surveillance:type", "operator", "camera:type")
+CACHE_VERSION = 1
+
+
+# -----------------------------------------------------------------
+# Quadkeys
+# -----------------------------------------------------------------
+def _spread_bits(v):
+    """Interleave zeros between the low 32 bits of v (uint64 array or int)."""
+    v = np.asarray(v, dtype=np.uint64) & np.uint64(0xFFFFFFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return v
+
+
+def quadkeys(gx, gy):
+    """Morton codes of integer world coordinates (x bit above y bit at every level)."""
+    return ((_spread_bits(gx) << np.uint64(1)) | _spread_bits(gy)).astype(np.int64)
+
+
+def tile_qkey_range(z, x, y):
+    """Inclusive [lo, hi] quadkey range covered by tile z/x/y."""
+    shift = 2 * (geo_tiles.WORLD_BITS - z)
+    prefix = int(quadkeys(np.array([x]), np.array([y]))[0])
+    lo = prefix << shift
+    return lo, lo + (1 << shift) - 1
+
+
+# -----------------------------------------------------------------
+# Store
+# -----------------------------------------------------------------
+class CameraStore:
+    """Quadkey-sorted columnar camera table."""
+
+    ARRAYS = ("lon", "lat", "qkey", "prop_offsets", "prop_keys", "prop_vals")
+
+    def __init__(self, arrays, keys, values, cat_vocab):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.cat_codes = {field: arrays[f"cat_{i}"] for i, field in enumerate(CATEGORICAL_FIELDS)}
+        self.cat_vocab = cat_vocab
+        self.keys = keys
+        self.values = values
+
+    @classmethod
+    def from_features(cls, features):
+        """Encode a list of GeoJSON Point features."""
+        n = len(features)
+        lon = np.array([f['geometry']['coordinates'][0] for f in features], dtype=np.float64)
+        lat = np.array([f['geometry']['coordinates'][1] for f in features], dtype=np.float64)
+        gx, gy = geo_tiles.lonlat_to_world(lon, lat)
+        qkey = quadkeys(gx, gy)
+        order = np.argsort(qkey, kind='stable')
+
+        key_lookup, keys = {}, []
+        value_lookup, values = {}, []
+        cat_lookup = {field: {} for field in CATEGORICAL_FIELDS}
+        cat_vocab = {field: [] for field in CATEGORICAL_FIELDS}
+        cat_codes = {field: np.full(n, -1, dtype=np.int32) for field in CATEGORICAL_FIELDS}
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        prop_keys, prop_vals = [], []
+
+        for row, i in enumerate(order):
+            for key, value in (features[i].get('properties') or {}).items():
+                if key in cat_lookup and isinstance(value, str):
+                    code = cat_lookup[key].get(value)
+                    if code is None:
+                        code = cat_lookup[key][value] = len(cat_vocab[key])
+                        cat_vocab[key].append(value)
+                    cat_codes[key][row] = code
+                    continue
+                k = key_lookup.get(key)
+                if k is None:
+                    k = key_lookup[key] = len(keys)
+                    keys.append(key)
+                # type name keeps 1, 1.0 and True apart in the interned table
+                vkey = (type(value).__name__, json.dumps(value, sort_keys=True) if isinstance(value, (list, dict)) else value)
+                v = value_lookup.get(vkey)
+                if v is None:
+                    v = value_lookup[vkey] = len(values)
+                    values.append(value)
+                prop_keys.append(k)
+                prop_vals.append(v)
+            offsets[row + 1] = len(prop_keys)
+
+        arrays = {
+            "lon": lon[order].astype(np.float32),
+            "lat": lat[order].astype(np.float32),
+            "qkey": qkey[order],
+            "prop_offsets": offsets,
+            "prop_keys": np.array(prop_keys, dtype=np.uint16 if len(keys) < 65536 else np.uint32),
+            "prop_vals": np.array(prop_vals, dtype=np.int32),
+        }
+        for i, field in enumerate(CATEGORICAL_FIELDS):
+            arrays[f"cat_{i}"] = cat_codes[field]
+        return cls(arrays, keys, values, cat_vocab)
+
+    def __len__(self):
+        return len(self.lon)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the numeric arrays (the interned tables come on top)."""
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS) + \
+            sum(codes.nbytes for codes in self.cat_codes.values())
+
+    # -- persistence ------------------------------------------------
+    def save(self, path, stamp):
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        for i, field in enumerate(CATEGORICAL_FIELDS):
+            arrays[f"cat_{i}"] = self.cat_codes[field]
+        meta = {"version": CACHE_VERSION, "stamp": stamp, "keys": self.keys,
+                "values": self.values, "cat_vocab": self.cat_vocab}
+        arrays["meta"] = np.frombuffer(json.dumps(meta, separators=(',', ':')).encode('utf-8'), dtype=np.uint8)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, stamp):
+        """Load a cached store; None when missing, stale or from another format version."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes())
+            if meta.get("version") != CACHE_VERSION or meta.get("stamp") != stamp:
+                return None
+            arrays = {name: data[name] for name in data.files if name != "meta"}
+        return cls(arrays, meta["keys"], meta["values"], meta["cat_vocab"])
+
+    # -- access -----------------------------------------------------
+    def tile_slice(self, z, x, y):
+        """Row slice of the cameras inside tile z/x/y."""
+        lo, hi = tile_qkey_range(z, x, y)
+        start = int(np.searchsorted(self.qkey, lo, side='left'))
+        end = int(np.searchsorted(self.qkey, hi, side='right'))
+        return slice(start, end)
+
+    def feature(self, row):
+        """Rebuild the GeoJSON feature of one row."""
+        props = {}
+        for field in CATEGORICAL_FIELDS:
+            code = self.cat_codes[field][row]
+            if code >= 0:
+                props[field] = self.cat_vocab[field][code]
+        start, end = self.prop_offsets[row], self.prop_offsets[row + 1]
+        keys, values = self.keys, self.values
+        for k, v in zip(self.prop_keys[start:end].tolist(), self.prop_vals[start:end].tolist()):
+            props[keys[k]] = values[v]
+        return {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(float(self.lon[row]), 6), round(float(self.lat[row]), 6)]},
+            "properties": props
+        }
+
+    def features(self, rows):
+        if isinstance(rows, slice):
+            rows = range(*rows.indices(len(self)))
+        return [self.feature(int(r)) for r in rows]
+
+    def tile(self, z, x, y):
+        """FeatureCollection of tile z/x/y, served as a slice of the store."""
+        return {"type": "FeatureCollection", "features": self.features(self.tile_slice(z, x, y))}
+
+
+# -----------------------------------------------------------------
+# Startup loader
+# -----------------------------------------------------------------
+def source_stamp(src_dir, zoom=geo_tiles.SOURCE_ZOOM):
+    """Fingerprint of the raw grid files (names, sizes, mtimes) used to validate the cache."""
+    digest = hashlib.sha1()
+    zoom_dir = os.path.join(src_dir, str(zoom))
+    for dirpath, _, filenames in sorted(os.walk(zoom_dir)):
+        for name in sorted(filenames):
+            if name.endswith('.json'):
+                st = os.stat(os.path.join(dirpath, name))
+                digest.update(f"{dirpath}/{name}:{st.st_size}:{int(st.st_mtime)}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_store(src_dir, cache_path):
+    """Load the store from its .npz cache, rebuilding it from the raw grid when stale."""
+    stamp = source_stamp(src_dir)
+    try:
+        store = CameraStore.load(cache_path, stamp)
+    except Exception as e:
+        print(f"Camera store cache unreadable ({e}), rebuilding")
+        store = None
+    if store is None:
+        store = CameraStore.from_features(geo_tiles.load_source_features(src_dir))
+        try:
+            store.save(cache_path, stamp)
+        except OSError as e:
+            print(f"Camera store: could not write cache {cache_path}: {e}")
+    print(f"Camera store: {len(store)} cameras, {store.nbytes / 1e6:.1f} MB of arrays")
+    return store
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store(src_dir, cache_path):
+    """Shared store, loaded on first use (thread-safe); None when the raw grid is missing."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None and os.path.isdir(os.path.join(src_dir, str(geo_tiles.SOURCE_ZOOM))):
+                _store = load_store(src_dir, cache_path)
+    return _store
@@ -0,0 +1,388 @@
+"""
+Record / replay harness and ingest benchmarks for the AIS and ADS-B feeds.
+
+Recordings are gzip-compressed NDJSON, one upstream frame per line:
+
+    ais    {"t": seconds since start, "frame": "<raw websocket text>"}
+    adsb   {"t": seconds since start, "poll": n, "path": "/v2/point/...", "body": "<raw JSON>"}
+
+Record from the live upstreams (needs network and, for AIS, GENERIC_API_KEY):
+
+    python feed_replay.py record ais  recordings/ais.ndjson.gz  --seconds 300
+    python feed_replay.py record adsb recordings/adsb.ndjson.gz --polls 10
+
+Replay them locally at 1x-100x and point the app at the stand-ins:
+
+    python feed_replay.py serve --ais recordings/ais.ndjson.gz --adsb recordings/adsb.ndjson.gz --speed 10
+    AIS_STREAM_URL=ws://127.0.0.1:8765 ADSB_API_URL=http://127.0.0.1:8766 python app.py
+
+Benchmark the ingest code paths offline (a recording, or --synthetic N frames):
+
+    python feed_replay.py bench ais  recordings/ais.ndjson.gz
+    python feed_replay.py bench adsb --synthetic 10000
+
+The benchmarks report messages/sec, p50/p99 latency from feed() to the update
+being applied in the cache (AIS) or per poll (ADS-B), and peak memory growth.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import threading
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+AIS_UPSTREAM = "wss://stream.aisstream.io/v0/stream"
+AIS_PORT = 8765
+ADSB_PORT = 8766
+ADSB_POLL_INTERVAL = 20
+
+
+# -----------------------------------------------------------------
+# Recordings
+# -----------------------------------------------------------------
+def write_recording(path, records):
+    """Write an iterable of dicts as gzip NDJSON; returns the record count."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, separators=(',', ':')))
+            f.write('\n')
+            count += 1
+    return count
+
+
+def read_recording(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def record_ais(path, seconds, api_key):
+    import websockets
+
+    async def capture():
+        records = []
+        async with websockets.connect(AIS_UPSTREAM) as websocket:
+            await websocket.send(json.dumps({"APIKey": api_key, "BoundingBoxes": [[[-90, -180], [90, 180]]]}))
+            started = time.monotonic()
+            while time.monotonic() - started < seconds:
+                try:
+                    frame = await asyncio.wait_for(websocket.recv(), 1.0)
+                except asyncio.TimeoutError:
+                    continue
+                if isinstance(frame, bytes):
+                    frame = frame.decode('utf-8')
+                records.append({"t": round(time.monotonic() - started, 4), "frame": frame})
+        return records
+
+    count = write_recording(path, asyncio.run(capture()))
+    print(f"Recorded {count} AIS frames in {seconds}s -> {path}")
+
+
+def record_adsb(path, polls, interval=ADSB_POLL_INTERVAL):
+    import requests
+    import flight_poller
+
+    def capture():
+        started = time.monotonic()
+        session = requests.Session()
+        for poll in range(polls):
+            poll_started = time.monotonic()
+            for url, region_name in flight_poller.ADSB_REGIONS:
+                try:
+                    response = session.get(url, timeout=20)
+                    response.raise_for_status()
+                except Exception as e:
+                    print(f"Error fetching {region_name}: {e}")
+                    continue
+                yield {"t": round(time.monotonic() - started, 3), "poll": poll,
+                       "path": urlparse(url).path, "body": response.text}
+            if poll + 1 < polls:
+                time.sleep(max(0.0, interval - (time.monotonic() - poll_started)))
+
+    count = write_recording(path, capture())
+    print(f"Recorded {count} ADS-B responses over {polls} polls -> {path}")
+
+
+# -----------------------------------------------------------------
+# Synthetic feeds (when no recording is at hand)
+# -----------------------------------------------------------------
+def synthetic_ais(n, vessels=20000, rate=2000.0, seed=1):
+    """n AIS frames (90% PositionReport) from `vessels` MMSIs at `rate` frames/sec."""
+    rng = random.Random(seed)
+    mids = ['419', '412', '273', '366', '538', '636', '244', '211', '563', '477']
+    fleet = [(rng.choice(mids) + f"{rng.randint(0, 999999):06d}", rng.uniform(-60, 70), rng.uniform(-180, 180))
+             for _ in range(vessels)]
+    records = []
+    for i in range(n):
+        k = rng.randrange(vessels)
+        mmsi, lat, lon = fleet[k]
+        lat, lon = lat + rng.uniform(-0.01, 0.01), lon + rng.uniform(-0.01, 0.01)
+        fleet[k] = (mmsi, lat, lon)
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()) + ".000000000 +0000 UTC"
+        meta = {"MMSI": int(mmsi), "ShipName": f"VESSEL {k}", "time_utc": stamp}
+        if rng.random() < 0.9:
+            message = {"MessageType": "PositionReport", "MetaData": meta, "Message": {"PositionReport": {
+                "Latitude": lat, "Longitude": lon, "Cog": rng.uniform(0, 360), "Sog": rng.uniform(0, 20),
+                "TrueHeading": rng.randint(0, 359), "NavigationalStatus": 0}}}
+        else:
+            message = {"MessageType": "ShipStaticData", "MetaData": meta, "Message": {"ShipStaticData": {
+                "Type": rng.randint(20, 99), "Draught": rng.randint(20, 150), "CallSign": f"C{k}",
+                "Destination": "PORT"}}}
+        records.append({"t": i / rate, "frame": json.dumps(message)})
+    return records
+
+
+def synthetic_adsb(aircraft, polls=5, seed=1):
+    """`polls` rounds of region responses covering `aircraft` aircraft (with region overlap)."""
+    import flight_poller
+
+    rng = random.Random(seed)
+    types = ['A320', 'B738', 'B77W', 'C172', 'C17', 'PA28', 'E190', 'A359']
+    prefixes = ['DAL', 'UAL', 'BAW', 'RCH', 'N', 'G-', 'AFR', 'SWA']
+    fleet = [{"hex": f"{i:06x}", "flight": rng.choice(prefixes) + str(rng.randint(1, 9999)),
+              "t": rng.choice(types), "r": f"R{i}", "lat": rng.uniform(-60, 70), "lon": rng.uniform(-180, 180),
+              "alt_baro": rng.randint(0, 40000), "gs": rng.uniform(80, 500), "track": rng.uniform(0, 360),
+              "squawk": str(rng.randint(1000, 7000))} for i in range(aircraft)]
+    regions = flight_poller.ADSB_REGIONS
+    records = []
+    for poll in range(polls):
+        for ac in fleet:
+            ac["lat"] += rng.uniform(-0.05, 0.05)
+            ac["lon"] += rng.uniform(-0.05, 0.05)
+        for r, (url, _) in enumerate(regions):
+            # every aircraft shows up in one or two regions, like the overlapping adsb.one circles
+            members = [ac for i, ac in enumerate(fleet) if i % len(regions) == r or (i * 7) % len(regions) == r]
+            records.append({"t": poll * ADSB_POLL_INTERVAL, "poll": poll, "path": urlparse(url).path,
+                            "body": json.dumps({"ac": members})})
+    return records
+
+
+# -----------------------------------------------------------------
+# Stand-in servers
+# -----------------------------------------------------------------
+async def _serve_ais(records, speed, port, loop_forever):
+    import websockets
+
+    async def handler(websocket, *args):
+        try:
+            await asyncio.wait_for(websocket.recv(), 10)   # subscription message, ignored
+        except asyncio.TimeoutError:
+            pass
+        while True:
+            started = time.monotonic()
+            for record in records:
+                delay = record["t"] / speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await websocket.send(record["frame"])
+            if not loop_forever:
+                break
+
+    async with websockets.serve(handler, "127.0.0.1", port, max_size=None):
+        print(f"AIS replay: {len(records)} frames at {speed}x on ws://127.0.0.1:{port}")
+        await asyncio.Future()
+
+
+def _adsb_server(records, speed, port):
+    by_path = {}
+    for record in records:
+        by_path.setdefault(record["path"], []).append((record["t"], record["body"].encode('utf-8')))
+    duration = max((r["t"] for r in records), default=0) + ADSB_POLL_INTERVAL
+    started = time.monotonic()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            responses = by_path.get(urlparse(self.path).path)
+            if not responses:
+                self.send_error(404)
+                return
+            # latest recorded response at the replay clock, looping over the recording
+            clock = ((time.monotonic() - started) * speed) % duration
+            body = responses[0][1]
+            for t, payload in responses:
+                if t > clock:
+                    break
+                body = payload
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"ADS-B replay: {len(records)} responses at {speed}x on http://127.0.0.1:{port}")
+    return server
+
+
+def serve(ais_path=None, adsb_path=None, speed=1.0, ais_port=AIS_PORT, adsb_port=ADSB_PORT, loop_forever=True):
+    if not (1 <= speed <= 100):
+        raise ValueError("speed must be between 1 and 100")
+    if adsb_path:
+        server = _adsb_server(read_recording(adsb_path), speed, adsb_port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    if ais_path:
+        asyncio.run(_serve_ais(read_recording(ais_path), speed, ais_port, loop_forever))
+    else:
+        threading.Event().wait()
+
+
+# -----------------------------------------------------------------
+# Benchmarks
+# -----------------------------------------------------------------
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench_ais(records):
+    """Feed frames through AISIngest as fast as possible into a fresh cache, index and track store."""
+    import ais_ingest
+    import vessel_cache
+    import vessel_index
+    import vessel_tracks
+
+    frames = [r["frame"] for r in records]
+    rss_before = _peak_rss_mb()
+    cache = vessel_cache.VesselCache()
+    index = vessel_index.VesselIndex(cache)
+    cache.index = index
+    tracks = vessel_tracks.TrackStore()
+    ingest = ais_ingest.AISIngest(cache, threading.Lock(), tracks, index)
+
+    latencies = []
+    fed_at = []
+    clock = time.perf_counter
+    started = clock()
+    for frame in frames:
+        fed_at.append(clock())
+        ingest.feed(frame)
+        if not ingest.pending:
+            done = clock()
+            latencies.extend(done - t for t in fed_at)
+            fed_at = []
+    ingest.flush()
+    done = clock()
+    latencies.extend(done - t for t in fed_at)
+    elapsed = done - started
+
+    print(f"AIS ingest: {len(frames)} frames, {len(cache)} vessels, {len(cache.static)} static-only")
+    print(f"  throughput        {len(frames) / elapsed:10.0f} msg/s")
+    print(f"  update latency    p50 {_percentile(latencies, 0.5) * 1000:.2f} ms   p99 {_percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"  peak RSS growth   {_peak_rss_mb() - rss_before:10.1f} MB")
+    return ingest.stats()
+
+
+def bench_adsb(records):
+    """Run FlightPoller.poll_once over every recorded poll with the HTTP layer replaced by the recording."""
+    import flight_poller
+
+    polls = {}
+    for record in records:
+        polls.setdefault(record["poll"], {})[record["path"]] = record["body"]
+
+    class Response:
+        def __init__(self, body):
+            self.body = body
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return json.loads(self.body)
+
+    class RecordedSession:
+        current = {}
+
+        def get(self, url, timeout=None):
+            body = self.current.get(urlparse(url).path)
+            if body is None:
+                raise IOError(f"no recorded response for {url}")
+            return Response(body)
+
+    rss_before = _peak_rss_mb()
+    poller = flight_poller.FlightPoller()
+    poller.session = RecordedSession()
+    durations = []
+    aircraft = 0
+    for poll in sorted(polls):
+        poller.session.current = polls[poll]
+        started = time.perf_counter()
+        snapshot = poller.poll_once()
+        snapshot.body()
+        durations.append(time.perf_counter() - started)
+        aircraft += len(snapshot.flights)
+
+    total = sum(durations)
+    print(f"ADS-B poll: {len(durations)} polls, {aircraft // max(1, len(durations))} aircraft per snapshot")
+    print(f"  throughput        {aircraft / total:10.0f} aircraft/s")
+    print(f"  poll latency      p50 {_percentile(durations, 0.5) * 1000:.1f} ms   p99 {_percentile(durations, 0.99) * 1000:.1f} ms")
+    print(f"  peak RSS growth   {_peak_rss_mb() - rss_before:10.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AIS / ADS-B record, replay and ingest benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="capture live upstream frames to gzip NDJSON")
+    rec.add_argument("feed", choices=["ais", "adsb"])
+    rec.add_argument("out")
+    rec.add_argument("--seconds", type=int, default=300, help="AIS capture duration")
+    rec.add_argument("--polls", type=int, default=10, help="ADS-B polls to capture")
+
+    srv = sub.add_parser("serve", help="replay recordings as local websocket / HTTP stand-ins")
+    srv.add_argument("--ais")
+    srv.add_argument("--adsb")
+    srv.add_argument("--speed", type=float, default=1.0, help="1 to 100")
+    srv.add_argument("--ais-port", type=int, default=AIS_PORT)
+    srv.add_argument("--adsb-port", type=int, default=ADSB_PORT)
+    srv.add_argument("--once", action="store_true", help="stop after one pass instead of looping")
+
+    bench = sub.add_parser("bench", help="benchmark an ingest path offline")
+    bench.add_argument("feed", choices=["ais", "adsb"])
+    bench.add_argument("recording", nargs="?")
+    bench.add_argument("--synthetic", type=int, default=0,
+                       help="generate N AIS frames / N aircraft instead of reading a recording")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        if args.feed == "ais":
+            record_ais(args.out, args.seconds, os.getenv("GENERIC_API_KEY", ""))
+        else:
+            record_adsb(args.out, args.polls)
+    elif args.command == "serve":
+        if not (args.ais or args.adsb):
+            parser.error("serve needs --ais and/or --adsb")
+        serve(args.ais, args.adsb, args.speed, args.ais_port, args.adsb_port, not args.once)
+    elif args.command == "bench":
+        if args.recording:
+            records = read_recording(args.recording)
+        elif args.synthetic:
+            records = synthetic_ais(args.synthetic) if args.feed == "ais" else synthetic_adsb(args.synthetic)
+        else:
+            parser.error("bench needs a recording or --synthetic N")
+        if args.feed == "ais":
+            bench_ais(records)
+        else:
+            bench_adsb(records)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
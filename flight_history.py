@@ -0,0 +1,363 @@
+"""
+Append-only, time-partitioned store of flight positions for playback.
+
+Every poller snapshot is appended as one "poll" to the partition of its hour:
+
+    <dir>/<partition start epoch>/
+        hex.u4 lat.f4 lon.f4 alt.i4 gs.f4 track.f4   one value per aircraft, raw little-endian
+        cells.u4                                     CELLS + 1 row offsets per poll
+        polls.bin                                    one POLL_DTYPE record per poll
+
+Rows of a poll are sorted by CELL_DEG grid cell, so the aircraft of a cell
+range are one contiguous slice (offsets in cells.u4). A poll record holds
+the timestamp (the ts column, run-length encoded), its first row and its
+lat/lon bounds; a partition's min/max time and bbox are reduced from them. A
+query skips partitions by time and bbox, picks one poll per frame with a
+binary search on the poll timestamps and reads only the cell slices under
+the bbox from memory-mapped columns.
+
+Column files are appended before the poll record, so readers (in this or
+another process) only ever see complete polls. Partitions older than the
+retention are deleted as whole directories.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import threading
+
+import numpy as np
+
+PARTITION_SECONDS = 3600
+DEFAULT_RETENTION_HOURS = 24
+CELL_DEG = 10
+CELL_COLS = 360 // CELL_DEG
+CELL_ROWS = 180 // CELL_DEG
+CELLS = CELL_ROWS * CELL_COLS
+MAX_FRAMES = 720
+MAX_POINTS = 500000
+NON_ICAO = 1 << 24      # flag bit for adsb.one "~" (non-ICAO) addresses
+
+COLUMNS = (("hex", np.uint32), ("lat", np.float32), ("lon", np.float32),
+           ("alt", np.int32), ("gs", np.float32), ("track", np.float32))
+POLL_DTYPE = np.dtype([("ts", "<f8"), ("row", "<i8"), ("lat_min", "<f4"), ("lat_max", "<f4"),
+                       ("lon_min", "<f4"), ("lon_max", "<f4")])
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0      # e.g. alt_baro "ground"
+
+
+def _hex_code(icao24):
+    """uint32 code of an ICAO address ("~" prefix: non-ICAO), None when missing or malformed."""
+    try:
+        if icao24.startswith('~'):
+            return int(icao24[1:], 16) | NON_ICAO
+        return int(icao24, 16)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _hex_str(code):
+    return f"~{code & (NON_ICAO - 1):06x}" if code & NON_ICAO else f"{code:06x}"
+
+
+def _cells(lat, lon):
+    rows = np.clip(((lat + 90) // CELL_DEG).astype(np.int64), 0, CELL_ROWS - 1)
+    cols = np.clip(((lon + 180) // CELL_DEG).astype(np.int64), 0, CELL_COLS - 1)
+    return rows * CELL_COLS + cols
+
+
+def _cell_ranges(bbox):
+    """(first cell, last cell) runs covering bbox=(west, south, east, north), one or two per grid row."""
+    west, south, east, north = bbox
+    row_lo = int(np.clip((south + 90) // CELL_DEG, 0, CELL_ROWS - 1))
+    row_hi = int(np.clip((north + 90) // CELL_DEG, 0, CELL_ROWS - 1))
+    col_w = int(np.clip((west + 180) // CELL_DEG, 0, CELL_COLS - 1))
+    col_e = int(np.clip((east + 180) // CELL_DEG, 0, CELL_COLS - 1))
+    cols = [(col_w, col_e)] if west <= east else [(col_w, CELL_COLS - 1), (0, col_e)]
+    return [(row * CELL_COLS + lo, row * CELL_COLS + hi) for row in range(row_lo, row_hi + 1) for lo, hi in cols]
+
+
+class _Partition:
+    """Memory-mapped view of one partition directory, reopened as it grows."""
+
+    def __init__(self, path, start):
+        self.path = path
+        self.start = start
+        self.polls = np.empty(0, dtype=POLL_DTYPE)
+        self.rows = 0
+        self.columns = {}
+        self.cells = None
+
+    def _map(self, name, dtype, count):
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode='r', shape=(count,))
+
+    def refresh(self):
+        try:
+            size = os.path.getsize(os.path.join(self.path, "polls.bin"))
+        except OSError:
+            return
+        n = size // POLL_DTYPE.itemsize
+        if n == len(self.polls):
+            return
+        polls = np.fromfile(os.path.join(self.path, "polls.bin"), dtype=POLL_DTYPE, count=n)
+        # rows of the last complete poll end where the cell offsets of that poll say
+        cells = self._map("cells.u4", np.uint32, n * (CELLS + 1)).reshape(n, CELLS + 1)
+        rows = int(polls["row"][-1]) + int(cells[-1, -1]) if n else 0
+        self.columns = {name: self._map(f"{name}.{np.dtype(dtype).str[1:]}", dtype, rows) for name, dtype in COLUMNS}
+        self.cells = cells
+        self.rows = rows
+        self.polls = polls
+
+    def bounds(self):
+        """(min ts, max ts, lat_min, lat_max, lon_min, lon_max) or None when empty."""
+        p = self.polls
+        if not len(p):
+            return None
+        return (p["ts"][0], p["ts"][-1], p["lat_min"].min(), p["lat_max"].max(),
+                p["lon_min"].min(), p["lon_max"].max())
+
+
+class FlightHistory:
+    """Writer (poller listener) and reader of a flight history directory."""
+
+    def __init__(self, path, retention_hours=DEFAULT_RETENTION_HOURS, partition_seconds=PARTITION_SECONDS):
+        self.path = path
+        self.retention = retention_hours * 3600
+        self.partition_seconds = partition_seconds
+        self._partitions = {}
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self.appended_polls = 0
+        self.pruned = 0
+
+    # -- writing ------------------------------------------------------
+    def append(self, snapshot):
+        """Append one FlightSnapshot (usable as a FlightPoller listener)."""
+        ts = snapshot.updated_at or time.time()
+        codes = [_hex_code(f["icao24"]) for f in snapshot.flights]
+        # aircraft without a usable hex cannot be played back: skip them, not the poll
+        flights = [f for f, code in zip(snapshot.flights, codes) if code is not None]
+        codes = [code for code in codes if code is not None]
+        n = len(flights)
+        lat = np.fromiter((f["lat"] for f in flights), dtype=np.float32, count=n)
+        lon = np.fromiter((f["long"] for f in flights), dtype=np.float32, count=n)
+        columns = {
+            "hex": np.fromiter(codes, dtype=np.uint32, count=n),
+            "lat": lat,
+            "lon": lon,
+            "alt": np.fromiter((_number(f["alt"]) for f in flights), dtype=np.float64, count=n).astype(np.int32),
+            "gs": np.fromiter((_number(f["velocity"]) for f in flights), dtype=np.float32, count=n),
+            "track": np.fromiter((_number(f["heading"]) for f in flights), dtype=np.float32, count=n),
+        }
+        cells = _cells(lat, lon)
+        order = np.argsort(cells, kind='stable')
+        offsets = np.searchsorted(cells[order], np.arange(CELLS + 1)).astype(np.uint32)
+
+        start = int(ts // self.partition_seconds * self.partition_seconds)
+        directory = os.path.join(self.path, str(start))
+        with self._write_lock:
+            os.makedirs(directory, exist_ok=True)
+            polls_path = os.path.join(directory, "polls.bin")
+            polls = os.path.getsize(polls_path) // POLL_DTYPE.itemsize if os.path.exists(polls_path) else 0
+            row = 0
+            if polls:
+                last = np.fromfile(polls_path, dtype=POLL_DTYPE, count=1, offset=(polls - 1) * POLL_DTYPE.itemsize)[0]
+                last_cells = np.fromfile(os.path.join(directory, "cells.u4"), dtype=np.uint32, count=1,
+                                         offset=((polls - 1) * (CELLS + 1) + CELLS) * 4)
+                row = int(last["row"]) + int(last_cells[0])
+            for name, dtype in COLUMNS:
+                column_path = os.path.join(directory, f"{name}.{np.dtype(dtype).str[1:]}")
+                with open(column_path, 'r+b' if os.path.exists(column_path) else 'wb') as f:
+                    # drop rows of a poll that crashed before its poll record was written
+                    f.truncate(row * np.dtype(dtype).itemsize)
+                    f.seek(0, os.SEEK_END)
+                    f.write(columns[name][order].tobytes())
+            with open(os.path.join(directory, "cells.u4"), 'r+b' if polls else 'wb') as f:
+                f.truncate(polls * (CELLS + 1) * 4)
+                f.seek(0, os.SEEK_END)
+                f.write(offsets.tobytes())
+            record = np.zeros(1, dtype=POLL_DTYPE)
+            record[0] = (ts, row, lat.min() if n else 0, lat.max() if n else 0,
+                         lon.min() if n else 0, lon.max() if n else 0)
+            with open(polls_path, 'ab') as f:
+                f.write(record.tobytes())
+            self.appended_polls += 1
+            if polls == 0:
+                self.prune()
+
+    def prune(self, now=None):
+        """Delete partitions entirely older than the retention; returns how many."""
+        cutoff = (now or time.time()) - self.retention
+        removed = 0
+        for start in self._partition_starts():
+            if start + self.partition_seconds < cutoff:
+                shutil.rmtree(os.path.join(self.path, str(start)), ignore_errors=True)
+                with self._read_lock:
+                    self._partitions.pop(start, None)
+                removed += 1
+        self.pruned += removed
+        return removed
+
+    # -- reading ------------------------------------------------------
+    def _partition_starts(self):
+        try:
+            return sorted(int(name) for name in os.listdir(self.path) if name.isdigit())
+        except FileNotFoundError:
+            return []
+
+    def _partitions_between(self, t_from, t_to):
+        found = []
+        with self._read_lock:
+            for start in self._partition_starts():
+                if start + self.partition_seconds < t_from or start > t_to:
+                    continue
+                partition = self._partitions.get(start)
+                if partition is None:
+                    partition = self._partitions[start] = _Partition(os.path.join(self.path, str(start)), start)
+                partition.refresh()
+                found.append(partition)
+        return found
+
+    def query(self, bbox=None, t_from=None, t_to=None, step=0):
+        """
+        Frames of the flights inside bbox=(west, south, east, north) between
+        t_from and t_to (epoch seconds), at most one per `step` seconds (0 = every
+        poll): {"from", "to", "step", "frames", "points", "truncated"}, each frame
+        {"t", "icao24": [...], "lat": [...], "lon", "alt", "gs", "track"} as
+        parallel columns. `step` is raised so a query never exceeds MAX_FRAMES.
+        """
+        t_to = t_to if t_to is not None else time.time()
+        t_from = t_from if t_from is not None else t_to - 3600
+        if (t_to - t_from) / MAX_FRAMES > step:
+            step = float(np.ceil((t_to - t_from) / MAX_FRAMES))
+
+        # candidate polls: (ts, partition, poll index), skipping partitions by time and bbox
+        stamps, refs = [], []
+        for partition in self._partitions_between(t_from, t_to):
+            bounds = partition.bounds()
+            if bounds is None or bounds[1] < t_from or bounds[0] > t_to:
+                continue
+            if bbox is not None:
+                west, south, east, north = bbox
+                if bounds[3] < south or bounds[2] > north:
+                    continue
+                if west <= east and (bounds[5] < west or bounds[4] > east):
+                    continue
+            ts = partition.polls["ts"]
+            lo, hi = np.searchsorted(ts, t_from, 'left'), np.searchsorted(ts, t_to, 'right')
+            stamps.append(ts[lo:hi])
+            refs.extend((partition, i) for i in range(lo, hi))
+        stamps = np.concatenate(stamps) if stamps else np.empty(0)
+
+        if step > 0 and len(stamps):
+            # latest poll at or before each frame time, skipping gaps longer than a step
+            frame_times = np.arange(t_from, t_to + step / 2, step)
+            picks = np.searchsorted(stamps, frame_times, 'right') - 1
+            valid = (picks >= 0) & (stamps[np.maximum(picks, 0)] > frame_times - step)
+            picks = np.unique(picks[valid])
+        else:
+            picks = np.arange(len(stamps))
+
+        frames, points, truncated = [], 0, False
+        ranges = _cell_ranges(bbox) if bbox is not None else [(0, CELLS - 1)]
+        for k in picks.tolist():
+            partition, i = refs[k]
+            base, offsets = int(partition.polls["row"][i]), partition.cells[i]
+            rows = [np.arange(base + int(offsets[lo]), base + int(offsets[hi + 1])) for lo, hi in ranges]
+            rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+            cols = partition.columns
+            lat, lon = cols["lat"][rows], cols["lon"][rows]
+            if bbox is not None:
+                west, south, east, north = bbox
+                keep = (lat >= south) & (lat <= north)
+                keep &= ((lon >= west) & (lon <= east)) if west <= east else ((lon >= west) | (lon <= east))
+                rows, lat, lon = rows[keep], lat[keep], lon[keep]
+            if points + len(rows) > MAX_POINTS:
+                truncated = True
+                break
+            points += len(rows)
+            hexes = cols["hex"][rows]
+            frames.append({
+                "t": float(stamps[k]),
+                "icao24": [f"{h:06x}" if h < NON_ICAO else _hex_str(h) for h in hexes.tolist()],
+                "lat": lat.astype(np.float64).round(4).tolist(),
+                "lon": lon.astype(np.float64).round(4).tolist(),
+                "alt": cols["alt"][rows].tolist(),
+                "gs": cols["gs"][rows].astype(np.float64).round(1).tolist(),
+                "track": cols["track"][rows].astype(np.float64).round(1).tolist(),
+            })
+        return {"from": t_from, "to": t_to, "step": step, "frames": frames, "points": points,
+                "truncated": truncated}
+
+    def stats(self):
+        starts = self._partition_starts()
+        return {"path": self.path, "partitions": len(starts), "oldest": starts[0] if starts else None,
+                "retention_hours": self.retention / 3600, "appended_polls": self.appended_polls,
+                "pruned_partitions": self.pruned}
+
+
+# -----------------------------------------------------------------
+# Benchmark
+# -----------------------------------------------------------------
+def benchmark(aircraft=10000, hours=24, poll_interval=20):
+    """Append `hours` of synthetic global traffic to a temporary store and time playback queries."""
+    import random
+    import tempfile
+    import flight_poller
+
+    rng = random.Random(1)
+    fleet = [{"icao24": f"{i:06x}", "lat": rng.uniform(-60, 70), "long": rng.uniform(-180, 180),
+              "alt": rng.randint(0, 40000), "velocity": rng.uniform(80, 500), "heading": rng.uniform(0, 360)}
+             for i in range(aircraft)]
+    # adsb.one occasionally sends a record without a hex: it must not cost the poll
+    hexless = {"icao24": "", "lat": 0.0, "long": 0.0, "alt": 0, "velocity": 0.0, "heading": 0.0}
+    lat = np.array([f["lat"] for f in fleet])
+    lon = np.array([f["long"] for f in fleet])
+    with tempfile.TemporaryDirectory() as tmp:
+        history = FlightHistory(tmp, retention_hours=hours + 1)
+        t0 = time.time() - hours * 3600
+        started = time.perf_counter()
+        polls = hours * 3600 // poll_interval
+        for p in range(polls):
+            lat = np.clip(lat + np.random.uniform(-0.05, 0.05, aircraft), -89, 89)
+            lon = (lon + np.random.uniform(-0.05, 0.05, aircraft) + 180) % 360 - 180
+            for f, a, o in zip(fleet, lat.tolist(), lon.tolist()):
+                f["lat"], f["long"] = a, o
+            history.append(flight_poller.FlightSnapshot(fleet + [hexless], t0 + p * poll_interval))
+        write_s = time.perf_counter() - started
+        assert history.appended_polls == polls, "polls lost while appending"
+
+        for label, bbox, step in (("global, 1 day, step 15 min", None, 900),
+                                  ("Europe, 1 day, step 5 min", (-10, 35, 30, 60), 300),
+                                  ("antimeridian, 1 day, every poll", (170, -50, -170, 10), 0)):
+            started = time.perf_counter()
+            result = history.query(bbox, t0, t0 + hours * 3600, step)
+            elapsed = time.perf_counter() - started
+            print(f"{label:34s} {len(result['frames']):4d} frames {result['points']:8d} points "
+                  f"{elapsed * 1000:8.1f} ms{' (truncated)' if result['truncated'] else ''}")
+    print(f"append {polls} polls x {aircraft} aircraft: {write_s:.1f} s ({write_s / polls * 1000:.1f} ms/poll)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flight position history")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="time playback queries over synthetic traffic")
+    bench.add_argument("--aircraft", type=int, default=10000)
+    bench.add_argument("--hours", type=int, default=24)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        benchmark(args.aircraft, args.hours)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
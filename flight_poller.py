@@ -0,0 +1,207 @@
+"""
+Background adsb.one poller.
+
+/api/geo/flights used to call nine adsb.one regions one after another inside
+the request (20 s timeout each), for every polling browser tab. Here a single
+daemon thread fetches all regions in parallel over one pooled keep-alive
+session, merges them into one snapshot deduplicated by hex and swaps it in
+atomically. Requests only read the current snapshot.
+"""
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import aircraft_classifier
+
+# adsb.one provides excellent global coverage - query multiple regions
+# Format: /v2/point/{lat}/{lon}/{radius_nm}
+# ADSB_API_URL points the poller at another server (e.g. feed_replay.py serve)
+ADSB_API_URL = os.getenv("ADSB_API_URL", "https://api.adsb.one").rstrip('/')
+ADSB_REGIONS = [
+    (ADSB_API_URL + "/v2/point/40/-100/4000", "Americas"),   # North America
+    (ADSB_API_URL + "/v2/point/50/10/3000", "Europe"),       # Europe
+    (ADSB_API_URL + "/v2/point/25/80/3000", "Asia"),         # South Asia
+    (ADSB_API_URL + "/v2/point/35/135/2500", "EastAsia"),    # East Asia
+    (ADSB_API_URL + "/v2/point/-25/135/2000", "Oceania"),    # Australia
+    (ADSB_API_URL + "/v2/point/60/90/4000", "Russia"),       # Russia/Eurasia
+    (ADSB_API_URL + "/v2/point/35/105/2500", "China"),       # China/Central Asia
+    (ADSB_API_URL + "/v2/point/-15/-60/3000", "SouthAmerica"), # South America
+    (ADSB_API_URL + "/v2/point/5/20/3500", "Africa"),          # Africa
+]
+
+POLL_INTERVAL = 20      # seconds between the start of two polls
+REQUEST_TIMEOUT = 20    # per region
+
+
+def parse_aircraft(ac):
+    """
+    Map one adsb.one aircraft record to the API's flight dict (None without a
+    position). "type" is left for the poller to fill in with one batch classify.
+    """
+    # Skip if no position data
+    if ac.get('lat') is None or ac.get('lon') is None:
+        return None
+
+    hex_code = ac.get('hex', '').upper()
+    callsign = (ac.get('flight', '') or '').strip() or ac.get('r', '') or hex_code
+    registration = ac.get('r', '')
+    aircraft_type = ac.get('t', '')
+
+    return {
+        "icao24": hex_code.lower(),
+        "callsign": callsign,
+        "registration": registration or "---",
+        "aircraft_type": aircraft_type or "---",
+        "long": ac.get('lon'),
+        "lat": ac.get('lat'),
+        "alt": ac.get('alt_baro') or ac.get('alt_geom') or 0,
+        "velocity": ac.get('gs', 0),
+        "heading": ac.get('track', 0),
+        "squawk": ac.get('squawk', '----'),
+        "type": None
+    }
+
+
+class FlightSnapshot:
+    """Immutable result of one poll: flights in region order plus a hex lookup."""
+
+    __slots__ = ("flights", "by_hex", "updated_at", "region_errors", "_body")
+
+    def __init__(self, flights, updated_at, region_errors=None, body=None):
+        self.flights = flights
+        self.by_hex = {f["icao24"]: f for f in flights}
+        self.updated_at = updated_at
+        self.region_errors = region_errors or {}
+        self._body = body
+
+    def body(self):
+        """Serialized JSON list of all flights, built once per snapshot."""
+        if self._body is None:
+            self._body = json.dumps(self.flights)
+        return self._body
+
+    def filter(self, q='', icao='', bbox=None):
+        """
+        Flights matching every given filter: q (substring of hex, callsign or
+        registration), icao (exact hex) and bbox (west, south, east, north).
+        """
+        if icao:
+            flight = self.by_hex.get(icao.strip().lower())
+            flights = [flight] if flight else []
+        else:
+            flights = self.flights
+
+        if q:
+            q = q.strip().upper()
+            flights = [f for f in flights
+                       if q in f["icao24"].upper() or q in f["callsign"].upper() or q in f["registration"].upper()]
+
+        if bbox:
+            west, south, east, north = bbox
+            if west <= east:
+                flights = [f for f in flights if south <= f["lat"] <= north and west <= f["long"] <= east]
+            else:
+                flights = [f for f in flights if south <= f["lat"] <= north and (f["long"] >= west or f["long"] <= east)]
+        return flights
+
+
+class FlightPoller:
+    """Daemon thread keeping the latest FlightSnapshot of all adsb.one regions."""
+
+    def __init__(self, regions=ADSB_REGIONS, interval=POLL_INTERVAL, timeout=REQUEST_TIMEOUT):
+        self.regions = regions
+        self.interval = interval
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(regions), pool_maxsize=len(regions))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.classifier = aircraft_classifier.AircraftClassifier()
+        self._executor = ThreadPoolExecutor(max_workers=len(regions), thread_name_prefix="adsb")
+        self._snapshot = FlightSnapshot([], 0)
+        self._listeners = []
+        self.first_snapshot = threading.Event()
+        self._thread = None
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def add_listener(self, callback):
+        """Call callback(snapshot) after every poll (from the poller thread)."""
+        self._listeners.append(callback)
+
+    def _fetch_region(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get('ac', [])
+
+    def poll_once(self):
+        """Fetch every region in parallel and publish the merged snapshot."""
+        futures = [(name, self._executor.submit(self._fetch_region, url)) for url, name in self.regions]
+        all_flights = {}  # Use dict to dedupe by hex
+        records = []      # classifier inputs, in the same order
+        errors = {}
+        for region_name, future in futures:
+            try:
+                aircraft_list = future.result()
+            except Exception as e:
+                errors[region_name] = str(e)
+                print(f"Error fetching {region_name}: {e}")
+                continue
+            for ac in aircraft_list:
+                hex_code = ac.get('hex', '').upper()
+                if hex_code in all_flights:
+                    continue  # Already have this aircraft
+                flight = parse_aircraft(ac)
+                if flight is not None:
+                    all_flights[hex_code] = flight
+                    records.append((hex_code, flight["callsign"], ac.get('t', ''),
+                                    ac.get('emergency', 'none'), ac.get('squawk')))
+
+        flights = list(all_flights.values())
+        for flight, f_type in zip(flights, self.classifier.classify_batch(records)):
+            flight["type"] = f_type
+        snapshot = FlightSnapshot(flights, time.time(), errors)
+        self._snapshot = snapshot  # single reference swap, readers never see a partial poll
+        self.first_snapshot.set()
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Flight snapshot listener error: {e}")
+        return snapshot
+
+    def _run(self):
+        while True:
+            started = time.time()
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Flight poller error: {e}")
+            time.sleep(max(1.0, self.interval - (time.time() - started)))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="flight-poller", daemon=True)
+            self._thread.start()
+            print("Flight poller thread started")
+        return self
+
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def get_poller():
+    """The process-wide poller, started on first use."""
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = FlightPoller().start()
+        return _poller
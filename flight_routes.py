@@ -0,0 +1,225 @@
+"""
+Batched, cached callsign -> route lookups for /api/geo/flights/meta.
+
+OpenSky's routes API answers one callsign per request and routes rarely
+change, so instead of one synchronous call per click:
+
+    - results are kept in memory (an LRU of MEMORY_ENTRIES callsigns) and in
+      a SQLite file (shared by every web worker and kept across restarts) for
+      ROUTE_TTL, unknown callsigns for NEGATIVE_TTL;
+    - the misses of a batch are fetched concurrently on a bounded pool over
+      one keep-alive session;
+    - concurrent lookups of the same callsign share one upstream request
+      (single-flight);
+    - after a 429 the upstream is left alone for RATE_LIMIT_BACKOFF seconds.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ROUTES_API_URL = "https://opensky-network.org/api/routes"
+ROUTE_TTL = 7 * 86400
+NEGATIVE_TTL = 3600
+MAX_WORKERS = 8
+MEMORY_ENTRIES = 20000
+MAX_BATCH = 200
+REQUEST_TIMEOUT = 10
+BATCH_TIMEOUT = 15
+RATE_LIMIT_BACKOFF = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS routes (
+    callsign TEXT PRIMARY KEY,
+    data TEXT,
+    fetched REAL NOT NULL
+)
+"""
+
+
+def normalize(callsign):
+    callsign = (callsign or '').strip().upper()
+    return '' if callsign in ('', 'N/A') else callsign
+
+
+def route_meta(callsign, route_data):
+    """The API's meta dict for a callsign from an OpenSky routes response (None when unknown)."""
+    route_data = route_data or {}
+    return {
+        "callsign": callsign,
+        "route": route_data.get("route", ["UNK", "UNK"]),
+        "operator": route_data.get("operatorIata", "---"),
+        "flight_number": route_data.get("flightNumber", "---")
+    }
+
+
+class RouteResolver:
+    """Resolves batches of callsigns through the memory / SQLite cache and a bounded upstream pool."""
+
+    def __init__(self, path, ttl=ROUTE_TTL, negative_ttl=NEGATIVE_TTL, max_workers=MAX_WORKERS,
+                 timeout=REQUEST_TIMEOUT, max_entries=MEMORY_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="routes")
+        self._memory = OrderedDict()    # callsign -> (route data or None, fetched), least recently used first
+        self._inflight = {}         # callsign -> Future
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn = None
+        self._blocked_until = 0.0
+        self.hits = 0
+        self.db_hits = 0
+        self.upstream = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.evictions = 0
+
+    # -- cache ---------------------------------------------------------
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _fresh(self, entry, now):
+        data, fetched = entry
+        return now - fetched < (self.ttl if data is not None else self.negative_ttl)
+
+    def _recall(self, callsign, now):
+        """Fresh in-memory entry of a callsign or None; drops it when expired (call with _lock held)."""
+        entry = self._memory.get(callsign)
+        if entry is None:
+            return None
+        if not self._fresh(entry, now):
+            del self._memory[callsign]
+            return None
+        self._memory.move_to_end(callsign)
+        return entry
+
+    def _remember(self, callsign, entry):
+        """Insert an entry, evicting the least recently used beyond max_entries (call with _lock held)."""
+        self._memory[callsign] = entry
+        self._memory.move_to_end(callsign)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, callsigns, now):
+        """Fresh entries of `callsigns` stored by any process, moved into memory."""
+        found = {}
+        with self._db_lock:
+            conn = self._db()
+            for i in range(0, len(callsigns), 500):
+                chunk = callsigns[i:i + 500]
+                rows = conn.execute(f"SELECT callsign, data, fetched FROM routes WHERE callsign IN "
+                                    f"({','.join('?' * len(chunk))})", chunk).fetchall()
+                for callsign, data, fetched in rows:
+                    entry = (json.loads(data) if data is not None else None, fetched)
+                    if self._fresh(entry, now):
+                        found[callsign] = entry
+        with self._lock:
+            for callsign, entry in found.items():
+                self._remember(callsign, entry)
+        return found
+
+    def _store(self, callsign, data, fetched):
+        with self._lock:
+            self._remember(callsign, (data, fetched))
+        with self._db_lock:
+            with self._db() as conn:
+                conn.execute("INSERT OR REPLACE INTO routes (callsign, data, fetched) VALUES (?, ?, ?)",
+                             (callsign, json.dumps(data) if data is not None else None, fetched))
+
+    # -- upstream ------------------------------------------------------
+    def _fetch(self, callsign):
+        try:
+            if time.time() < self._blocked_until:
+                raise IOError("OpenSky rate limit, backing off")
+            self.upstream += 1
+            response = self.session.get(ROUTES_API_URL, params={"callsign": callsign}, timeout=self.timeout)
+            if response.status_code == 429:
+                self._blocked_until = time.time() + RATE_LIMIT_BACKOFF
+                raise IOError("OpenSky rate limit (429)")
+            if response.status_code == 404:
+                data = None     # no known route: cached for NEGATIVE_TTL
+            else:
+                response.raise_for_status()
+                data = response.json()
+            self._store(callsign, data, time.time())
+            return data
+        finally:
+            with self._lock:
+                self._inflight.pop(callsign, None)
+
+    def _future(self, callsign):
+        """The in-flight lookup of a callsign, started if there is none (call with _lock held)."""
+        future = self._inflight.get(callsign)
+        if future is not None:
+            self.coalesced += 1
+            return future
+        future = self._inflight[callsign] = self._executor.submit(self._fetch, callsign)
+        return future
+
+    # -- API -----------------------------------------------------------
+    def resolve_many(self, callsigns, timeout=BATCH_TIMEOUT):
+        """
+        {callsign: meta} for up to MAX_BATCH callsigns. Callsigns whose lookup
+        failed or is still running after `timeout` map to {"callsign", "error"}.
+        """
+        wanted = list(dict.fromkeys(filter(None, map(normalize, callsigns))))[:MAX_BATCH]
+        now = time.time()
+        results, missing = {}, []
+        with self._lock:
+            for callsign in wanted:
+                entry = self._recall(callsign, now)
+                if entry is not None:
+                    results[callsign] = route_meta(callsign, entry[0])
+                    self.hits += 1
+                else:
+                    missing.append(callsign)
+        if missing:
+            stored = self._load(missing, now)
+            for callsign, (data, _) in stored.items():
+                results[callsign] = route_meta(callsign, data)
+            self.db_hits += len(stored)
+            missing = [c for c in missing if c not in stored]
+        if missing:
+            with self._lock:
+                futures = {callsign: self._future(callsign) for callsign in missing}
+            wait(futures.values(), timeout=timeout)
+            for callsign, future in futures.items():
+                if not future.done():
+                    results[callsign] = {"callsign": callsign, "error": "timeout"}
+                elif future.exception() is not None:
+                    self.errors += 1
+                    results[callsign] = {"callsign": callsign, "error": str(future.exception())}
+                else:
+                    results[callsign] = route_meta(callsign, future.result())
+        return results
+
+    def resolve(self, callsign):
+        return self.resolve_many([callsign]).get(normalize(callsign))
+
+    def stats(self):
+        with self._lock:
+            cached, inflight = len(self._memory), len(self._inflight)
+        return {"cached": cached, "max_cached": self.max_entries, "evictions": self.evictions,
+                "inflight": inflight, "hits": self.hits, "db_hits": self.db_hits,
+                "upstream_requests": self.upstream, "coalesced": self.coalesced, "errors": self.errors,
+                "backing_off": time.time() < self._blocked_until}
@@ -0,0 +1,178 @@
+"""
+Delta-encoded flight updates for /api/geo/flights/stream (Server-Sent Events).
+
+The poller publishes a new snapshot every ~20 s, but most aircraft only move a
+little between two polls. FlightStreamHub diffs consecutive snapshots once per
+tick into added / moved / removed sets. Each client then gets one "keyframe"
+event with every aircraft in its bbox, followed by one "delta" event per tick
+that only lists what changed inside the bbox. Filtering a tick's changes per
+client costs O(changes), not O(aircraft).
+
+Rows are positional arrays instead of dicts (field names are sent once with the
+keyframe) and coordinates are rounded to COORD_DECIMALS:
+
+    keyframe  {"seq", "fields": FIELDS, "rows": [[...FIELDS], ...]}
+    delta     {"seq", "added": [[...FIELDS]], "moved": [[...MOVE_FIELDS]], "removed": [icao24, ...]}
+"""
+import json
+import threading
+
+FIELDS = ("icao24", "callsign", "registration", "aircraft_type", "long", "lat",
+          "alt", "velocity", "heading", "squawk", "type")
+MOVE_FIELDS = ("icao24", "long", "lat", "alt", "velocity", "heading")
+COORD_DECIMALS = 4      # ~11 m
+HEARTBEAT = 15          # seconds between keep-alive comments on an idle stream
+
+
+def _row(f):
+    return [f["icao24"], f["callsign"], f["registration"], f["aircraft_type"],
+            round(f["long"], COORD_DECIMALS), round(f["lat"], COORD_DECIMALS),
+            f["alt"], f["velocity"], f["heading"], f["squawk"], f["type"]]
+
+
+def _move_row(f):
+    return [f["icao24"], round(f["long"], COORD_DECIMALS), round(f["lat"], COORD_DECIMALS),
+            f["alt"], f["velocity"], f["heading"]]
+
+
+def _moved(old, new):
+    return any(old[k] != new[k] for k in MOVE_FIELDS[1:])
+
+
+def _same_identity(old, new):
+    return all(old[k] == new[k] for k in FIELDS if k not in MOVE_FIELDS)
+
+
+def diff_snapshots(old, new):
+    """(changed, moved, removed): full changes, position-only changes and hexes gone."""
+    previous = old.by_hex if old is not None else {}
+    changed, moved = [], []
+    for f in new.flights:
+        before = previous.get(f["icao24"])
+        if before is None or not _same_identity(before, f):
+            changed.append(f)
+        elif _moved(before, f):
+            moved.append(f)
+    removed = [icao for icao in previous if icao not in new.by_hex]
+    return changed, moved, removed
+
+
+def _inside(f, bbox):
+    if bbox is None:
+        return True
+    west, south, east, north = bbox
+    if not (south <= f["lat"] <= north):
+        return False
+    if west <= east:
+        return west <= f["long"] <= east
+    return f["long"] >= west or f["long"] <= east
+
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    """One client's bbox and the set of aircraft it currently holds."""
+
+    def __init__(self, bbox=None):
+        self.bbox = bbox
+        self.visible = set()
+
+    def keyframe(self, seq, snapshot):
+        flights = [f for f in snapshot.flights if _inside(f, self.bbox)]
+        self.visible = {f["icao24"] for f in flights}
+        return {"seq": seq, "fields": FIELDS, "rows": [_row(f) for f in flights]}
+
+    def delta(self, seq, tick):
+        """This client's share of a tick's changes (None when nothing it sees changed)."""
+        changed, moved, removed = tick
+        visible, bbox = self.visible, self.bbox
+        out_added, out_moved, out_removed = [], [], []
+
+        for f in changed:
+            icao = f["icao24"]
+            if _inside(f, bbox):
+                out_added.append(_row(f))
+                visible.add(icao)
+            elif icao in visible:
+                out_removed.append(icao)
+                visible.discard(icao)
+        for f in moved:
+            icao = f["icao24"]
+            if _inside(f, bbox):
+                if icao in visible:
+                    out_moved.append(_move_row(f))
+                else:
+                    out_added.append(_row(f))
+                    visible.add(icao)
+            elif icao in visible:
+                out_removed.append(icao)
+                visible.discard(icao)
+        for icao in removed:
+            if icao in visible:
+                out_removed.append(icao)
+                visible.discard(icao)
+
+        if not (out_added or out_moved or out_removed):
+            return None
+        return {"seq": seq, "added": out_added, "moved": out_moved, "removed": out_removed}
+
+
+class FlightStreamHub:
+    """Keeps the latest snapshot and its delta; stream generators wait on it."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.seq = 0
+        self.snapshot = None
+        self.tick = None
+
+    def publish(self, snapshot):
+        """Poller listener: diff against the previous snapshot and wake every stream."""
+        tick = diff_snapshots(self.snapshot, snapshot)
+        with self._cond:
+            self.seq += 1
+            self.snapshot = snapshot
+            self.tick = tick
+            self._cond.notify_all()
+
+    def wait(self, seq, timeout):
+        """(seq, snapshot, tick) once a tick newer than seq exists, or the current state on timeout."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != seq, timeout)
+            return self.seq, self.snapshot, self.tick
+
+    def stream(self, bbox=None, heartbeat=HEARTBEAT):
+        """SSE text for one client: a keyframe, then deltas (a keyframe again after missed ticks)."""
+        sub = Subscription(bbox)
+        yield "retry: 5000\n\n"
+        seq = 0
+        while True:
+            new_seq, snapshot, tick = self.wait(seq, heartbeat)
+            if new_seq == seq:
+                yield ": keep-alive\n\n"
+                continue
+            if seq and new_seq == seq + 1:
+                payload = sub.delta(new_seq, tick)
+                if payload is not None:
+                    yield sse_event("delta", payload)
+            else:
+                yield sse_event("keyframe", sub.keyframe(new_seq, snapshot))
+            seq = new_seq
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub(poller):
+    """The process-wide hub, subscribed to poller on first use."""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = FlightStreamHub()
+            if poller.first_snapshot.is_set():
+                _hub.publish(poller.snapshot)
+            poller.add_listener(_hub.publish)
+        return _hub
@@ -0,0 +1,463 @@
+"""
+Proximity and anomaly alerts over the live flight, vessel and camera data.
+
+The map only labels each aircraft on its own. AlertEngine.process() runs on
+every flight poller snapshot and cross-references it with the vessel grid
+index and the surveillance camera store, fully vectorized:
+
+    vessel_proximity   aircraft of the watched classes (military by default)
+                       within VESSEL_RADIUS_KM of vessels
+    camera_proximity   aircraft below CAMERA_MAX_ALT_FT within CAMERA_RADIUS_KM
+                       of a surveillance cluster (a CLUSTER_CELL_DEG cell with at
+                       least CLUSTER_MIN_CAMERAS cameras)
+    squawk_change      squawk changes between polls (7500 / 7600 / 7700 are high)
+    loitering          aircraft moving faster than LOITER_MIN_SPEED_KTS whose
+                       last LOITER_WINDOW positions stay within LOITER_RADIUS_KM
+
+Neighbour candidates come from a spatial hash (sorted cell keys + binary
+search over the neighbouring cells) and are confirmed with haversine on
+arrays, so 10k aircraft against 50k vessels is a few thousand distance
+evaluations instead of 500M.
+
+    python geo_alerts.py bench --aircraft 10000 --vessels 50000
+"""
+import sys
+import math
+import time
+import argparse
+import threading
+from collections import deque
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+
+VESSEL_RADIUS_KM = 30
+CAMERA_RADIUS_KM = 10
+CAMERA_MAX_ALT_FT = 10000
+CLUSTER_CELL_DEG = 0.1
+CLUSTER_MIN_CAMERAS = 25
+LOITER_WINDOW = 30              # polls (10 min at the 20 s poll interval)
+LOITER_MIN_POINTS = 20
+LOITER_RADIUS_KM = 15
+LOITER_MIN_SPEED_KTS = 60
+SQUAWK_EVENT_TTL = 600          # seconds a squawk change stays listed
+MAX_ALERTS = 5000
+
+EMERGENCY_SQUAWKS = {"7500": "hijack", "7600": "radio failure", "7700": "emergency"}
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2}
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0      # e.g. alt "ground"
+
+
+# -----------------------------------------------------------------
+# Vectorized geometry
+# -----------------------------------------------------------------
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between arrays of points (degrees)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _expand(starts, counts):
+    """Concatenation of the ranges [start, start + count)."""
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    shifts = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return np.arange(total, dtype=np.int64) + shifts
+
+
+def proximity_pairs(lat_a, lon_a, lat_b, lon_b, radius_km):
+    """
+    (i, j, km) for every point a[i] within radius_km of b[j]. b is hashed into
+    cells of radius_km on a side; each a looks at the 3 rows of cells around
+    it and as many columns as its latitude needs to cover radius_km.
+    """
+    lat_a, lon_a = np.asarray(lat_a, dtype=np.float64), np.asarray(lon_a, dtype=np.float64)
+    lat_b, lon_b = np.asarray(lat_b, dtype=np.float64), np.asarray(lon_b, dtype=np.float64)
+    empty = np.empty(0, dtype=np.int64)
+    if not len(lat_a) or not len(lat_b):
+        return empty, empty, np.empty(0)
+
+    cell = min(radius_km / KM_PER_DEG, 90.0)
+    cols = int(math.ceil(360 / cell))
+    cell_lon = 360 / cols       # whole columns, so the ring wraps without a narrow last one
+    rows_b = np.floor((lat_b + 90) / cell).astype(np.int64)
+    cols_b = np.floor((lon_b + 180) / cell_lon).astype(np.int64) % cols
+    keys_b = rows_b * cols + cols_b
+    order_b = np.argsort(keys_b, kind='stable')
+    sorted_keys = keys_b[order_b]
+
+    rows_a = np.floor((lat_a + 90) / cell).astype(np.int64)
+    cols_a = np.floor((lon_a + 180) / cell_lon).astype(np.int64) % cols
+    # columns to scan either side: the longitude span of the radius_km cap around
+    # each point, asin(sin(d) / cos(lat)); a cap over the pole needs the whole ring
+    span = np.sin(np.radians(cell)) / np.maximum(np.cos(np.radians(lat_a)), 1e-12)
+    reach = np.full(len(lat_a), cols, dtype=np.int64)
+    partial = span < 1
+    reach[partial] = np.ceil(np.degrees(np.arcsin(span[partial])) / cell_lon).astype(np.int64)
+    reach = np.clip(reach, 1, cols)
+
+    pairs_i, pairs_j = [], []
+    for k in np.unique(reach).tolist():
+        members = np.flatnonzero(reach == k)
+        r, c = rows_a[members], cols_a[members]
+        offsets = range(-k, k + 1) if 2 * k + 1 < cols else range(cols)
+        for dy in (-1, 0, 1):
+            for dx in offsets:
+                keys = (r + dy) * cols + (c + dx) % cols
+                starts = np.searchsorted(sorted_keys, keys, 'left')
+                counts = np.searchsorted(sorted_keys, keys, 'right') - starts
+                hit = counts > 0
+                if not hit.any():
+                    continue
+                pairs_i.append(np.repeat(members[hit], counts[hit]))
+                pairs_j.append(order_b[_expand(starts[hit], counts[hit])])
+    if not pairs_i:
+        return empty, empty, np.empty(0)
+    i, j = np.concatenate(pairs_i), np.concatenate(pairs_j)
+    km = haversine_km(lat_a[i], lon_a[i], lat_b[j], lon_b[j])
+    close = km <= radius_km
+    return i[close], j[close], km[close]
+
+
+def nearest_per_source(i, j, km):
+    """For every distinct i: (i, nearest j, its km, number of j) from proximity pairs."""
+    if not len(i):
+        return i, j, km, np.empty(0, dtype=np.int64)
+    order = np.lexsort((km, i))
+    i, j, km = i[order], j[order], km[order]
+    first = np.flatnonzero(np.r_[True, i[1:] != i[:-1]])
+    counts = np.diff(np.r_[first, len(i)])
+    return i[first], j[first], km[first], counts
+
+
+def camera_clusters(lat, lon, cell_deg=CLUSTER_CELL_DEG, min_cameras=CLUSTER_MIN_CAMERAS):
+    """(lat, lon, count) centroids of the cell_deg cells holding at least min_cameras cameras."""
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    if not len(lat):
+        return np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+    cols = int(round(360 / cell_deg))
+    keys = np.floor((lat + 90) / cell_deg).astype(np.int64) * cols + np.floor((lon + 180) / cell_deg).astype(np.int64)
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    sum_lat = np.bincount(inverse, weights=lat)
+    sum_lon = np.bincount(inverse, weights=lon)
+    dense = counts >= min_cameras
+    return sum_lat[dense] / counts[dense], sum_lon[dense] / counts[dense], counts[dense]
+
+
+# -----------------------------------------------------------------
+# Engine
+# -----------------------------------------------------------------
+class _PositionHistory:
+    """Last `window` positions of every aircraft, one ring column per poll."""
+
+    def __init__(self, window=LOITER_WINDOW):
+        self.window = window
+        self.slots = {}
+        self.capacity = 0
+        self.lat = np.empty((0, window))
+        self.lon = np.empty((0, window))
+        self.ts = np.empty((0, window))
+        self.last_seen = np.empty(0, dtype=np.int64)
+        self.free = []
+        self.tick = 0
+
+    def _grow(self, needed):
+        capacity = max(needed, self.capacity * 2, 1024)
+        extra = capacity - self.capacity
+        self.lat = np.vstack([self.lat, np.full((extra, self.window), np.nan)])
+        self.lon = np.vstack([self.lon, np.full((extra, self.window), np.nan)])
+        self.ts = np.vstack([self.ts, np.full((extra, self.window), np.nan)])
+        self.last_seen = np.concatenate([self.last_seen, np.full(extra, -1, dtype=np.int64)])
+        self.free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def update(self, hexes, lat, lon, ts):
+        """Record one poll; returns the slot of every aircraft."""
+        self.tick += 1
+        col = self.tick % self.window
+        new = [h for h in hexes if h not in self.slots]
+        if len(new) > len(self.free):
+            self._grow(self.capacity + len(new))
+        for h in new:
+            slot = self.free.pop()
+            self.slots[h] = slot
+            self.lat[slot] = self.lon[slot] = self.ts[slot] = np.nan
+        slots = np.fromiter((self.slots[h] for h in hexes), dtype=np.int64, count=len(hexes))
+        self.lat[:, col] = self.lon[:, col] = self.ts[:, col] = np.nan
+        self.lat[slots, col] = lat
+        self.lon[slots, col] = lon
+        self.ts[slots, col] = ts
+        self.last_seen[slots] = self.tick
+        # aircraft gone for a whole window give their slot back
+        stale = [h for h, s in self.slots.items() if self.tick - self.last_seen[s] >= self.window]
+        for h in stale:
+            self.free.append(self.slots.pop(h))
+        return slots
+
+    def loitering(self, slots, min_points=LOITER_MIN_POINTS, radius_km=LOITER_RADIUS_KM):
+        """(mask, center lat, center lon, max km from center, seconds covered) for the given slots."""
+        lat, lon, ts = self.lat[slots], self.lon[slots], self.ts[slots]
+        points = np.sum(~np.isnan(lat), axis=1)
+        candidates = points >= min_points
+        n = len(slots)
+        center_lat, center_lon = np.full(n, np.nan), np.full(n, np.nan)
+        spread, duration = np.full(n, np.inf), np.zeros(n)
+        if candidates.any():
+            c_lat, c_lon = lat[candidates], lon[candidates]
+            # unwrap longitudes around the newest fix so orbits on the antimeridian stay compact
+            ref = np.nanmax(np.where(np.isnan(c_lon), -np.inf, c_lon), axis=1, keepdims=True)
+            c_lon = ref + (c_lon - ref + 180) % 360 - 180
+            m_lat, m_lon = np.nanmean(c_lat, axis=1), np.nanmean(c_lon, axis=1)
+            km = haversine_km(c_lat, c_lon, m_lat[:, None], m_lon[:, None])
+            center_lat[candidates] = m_lat
+            center_lon[candidates] = (m_lon + 180) % 360 - 180
+            spread[candidates] = np.nanmax(km, axis=1)
+            duration[candidates] = np.nanmax(ts[candidates], axis=1) - np.nanmin(ts[candidates], axis=1)
+        return candidates & (spread <= radius_km), center_lat, center_lon, spread, duration
+
+
+class AlertEngine:
+    """
+    Runs every rule on each flight snapshot (use process() as a FlightPoller
+    listener) and keeps the latest result for /api/geo/alerts.
+
+    `vessels` is a callable returning a vessel_index.VesselSnapshot (or None),
+    `cameras` one returning a camera_store.CameraStore (or None).
+    """
+
+    def __init__(self, vessels=None, cameras=None, proximity_classes=("military",),
+                 vessel_radius_km=VESSEL_RADIUS_KM, camera_radius_km=CAMERA_RADIUS_KM):
+        self.vessels = vessels
+        self.cameras = cameras
+        self.proximity_classes = set(proximity_classes) if proximity_classes else None
+        self.vessel_radius_km = vessel_radius_km
+        self.camera_radius_km = camera_radius_km
+        self._clusters = None
+        self._clusters_source = None
+        self._history = _PositionHistory()
+        self._previous = None
+        self._squawk_events = deque()
+        self._result = {"generated": None, "alerts": [], "counts": {}}
+        self._lock = threading.Lock()
+        self.ticks = 0
+        self.last_duration = None
+
+    @property
+    def result(self):
+        return self._result
+
+    def _camera_clusters(self):
+        store = self.cameras() if self.cameras is not None else None
+        if store is None:
+            return None
+        if self._clusters_source is not store:
+            self._clusters = camera_clusters(store.lat, store.lon)
+            self._clusters_source = store
+        return self._clusters
+
+    def process(self, snapshot):
+        """Evaluate every rule against one FlightSnapshot and publish the result."""
+        with self._lock:
+            started = time.perf_counter()
+            alerts = self._evaluate(snapshot)
+            alerts.sort(key=lambda a: -SEVERITY_RANK[a["severity"]])
+            counts = {}
+            for alert in alerts:
+                counts[alert["type"]] = counts.get(alert["type"], 0) + 1
+            self.ticks += 1
+            self.last_duration = round(time.perf_counter() - started, 4)
+            self._result = {"generated": snapshot.updated_at or time.time(), "duration_seconds": self.last_duration,
+                            "counts": counts, "alerts": alerts[:MAX_ALERTS], "truncated": len(alerts) > MAX_ALERTS}
+            return self._result
+
+    def _evaluate(self, snapshot):
+        flights = snapshot.flights
+        n = len(flights)
+        lat = np.fromiter((f["lat"] for f in flights), dtype=np.float64, count=n)
+        lon = np.fromiter((f["long"] for f in flights), dtype=np.float64, count=n)
+        alt = np.fromiter((_number(f["alt"]) for f in flights), dtype=np.float64, count=n)
+        speed = np.fromiter((_number(f["velocity"]) for f in flights), dtype=np.float64, count=n)
+        now = snapshot.updated_at or time.time()
+        alerts = []
+
+        def aircraft(k):
+            f = flights[k]
+            return {"icao24": f["icao24"], "callsign": f["callsign"], "aircraft_class": f["type"],
+                    "lat": f["lat"], "lon": f["long"], "alt": f["alt"]}
+
+        # vessel proximity
+        vessel_snapshot = self.vessels() if self.vessels is not None else None
+        near_vessels = np.zeros(n, dtype=np.int64)
+        if vessel_snapshot is not None and n:
+            v_lat, v_lon, v_records = vessel_snapshot.positions()
+            watched = np.arange(n) if self.proximity_classes is None else np.fromiter(
+                (k for k, f in enumerate(flights) if f["type"] in self.proximity_classes), dtype=np.int64)
+            i, j, km = proximity_pairs(lat[watched], lon[watched], v_lat, v_lon, self.vessel_radius_km)
+            i, j, km, count = nearest_per_source(i, j, km)
+            near_vessels[watched[i]] = count
+            for a, v, d, c in zip(watched[i].tolist(), j.tolist(), km.tolist(), count.tolist()):
+                vessel = v_records[v]
+                alerts.append(dict(aircraft(a), type="vessel_proximity",
+                                   severity="high" if vessel.get("type") == "military" else "medium",
+                                   distance_km=round(d, 2), vessels_nearby=c,
+                                   vessel={"mmsi": vessel.get("mmsi"), "name": vessel.get("name"),
+                                           "type": vessel.get("type"), "lat": vessel.get("lat"),
+                                           "lon": vessel.get("lon")}))
+
+        # surveillance cluster proximity
+        clusters = self._camera_clusters()
+        if clusters is not None and len(clusters[0]) and n:
+            low = np.flatnonzero(alt <= CAMERA_MAX_ALT_FT)
+            i, j, km = proximity_pairs(lat[low], lon[low], clusters[0], clusters[1], self.camera_radius_km)
+            i, j, km, _ = nearest_per_source(i, j, km)
+            for a, c, d in zip(low[i].tolist(), j.tolist(), km.tolist()):
+                alerts.append(dict(aircraft(a), type="camera_proximity", severity="low", distance_km=round(d, 2),
+                                   cluster={"lat": round(float(clusters[0][c]), 4), "lon": round(float(clusters[1][c]), 4),
+                                            "cameras": int(clusters[2][c])}))
+
+        # squawk changes since the previous poll
+        previous = self._previous.by_hex if self._previous is not None else {}
+        for k, f in enumerate(flights):
+            before = previous.get(f["icao24"])
+            if before is None:
+                continue
+            old, new = before.get("squawk"), f.get("squawk")
+            if old and new and old != new and "----" not in (old, new):
+                emergency = EMERGENCY_SQUAWKS.get(new) or EMERGENCY_SQUAWKS.get(old)
+                self._squawk_events.append(dict(aircraft(k), type="squawk_change",
+                                                severity="high" if emergency else "low",
+                                                squawk_from=old, squawk_to=new, meaning=emergency, at=now))
+        self._previous = snapshot
+        while self._squawk_events and now - self._squawk_events[0]["at"] > SQUAWK_EVENT_TTL:
+            self._squawk_events.popleft()
+        alerts.extend(self._squawk_events)
+
+        # loitering
+        slots = self._history.update([f["icao24"] for f in flights], lat, lon, now)
+        loiter, c_lat, c_lon, spread, duration = self._history.loitering(slots)
+        loiter &= speed >= LOITER_MIN_SPEED_KTS
+        for k in np.flatnonzero(loiter).tolist():
+            military = flights[k]["type"] == "military"
+            alerts.append(dict(aircraft(k), type="loitering",
+                               severity="high" if military and near_vessels[k] else "medium" if military else "low",
+                               center=[round(float(c_lat[k]), 4), round(float(c_lon[k]), 4)],
+                               radius_km=round(float(spread[k]), 2), duration_seconds=round(float(duration[k])),
+                               vessels_nearby=int(near_vessels[k])))
+        return alerts
+
+    def stats(self):
+        return {"ticks": self.ticks, "last_duration_seconds": self.last_duration,
+                "tracked_aircraft": len(self._history.slots),
+                "camera_clusters": len(self._clusters[0]) if self._clusters is not None else 0}
+
+
+def filter_alerts(alerts, types=None, bbox=None, min_severity=None):
+    """Alerts of the given types, inside bbox=(west, south, east, north) and at least min_severity."""
+    rank = SEVERITY_RANK.get(min_severity, 0)
+    result = []
+    for alert in alerts:
+        if types and alert["type"] not in types:
+            continue
+        if SEVERITY_RANK[alert["severity"]] < rank:
+            continue
+        if bbox:
+            west, south, east, north = bbox
+            lat, lon = alert["lat"], alert["lon"]
+            if not (south <= lat <= north):
+                continue
+            if (lon < west or lon > east) if west <= east else (lon < west and lon > east):
+                continue
+        result.append(alert)
+    return result
+
+
+# -----------------------------------------------------------------
+# Benchmark
+# -----------------------------------------------------------------
+def benchmark(aircraft=10000, vessels=50000, cameras=200000, ticks=25):
+    """Time full ticks on synthetic traffic, and the proximity kernel against brute force."""
+    import random
+    import flight_poller
+    import vessel_cache
+    import vessel_index
+
+    rng = np.random.default_rng(1)
+    cache = vessel_cache.VesselCache()
+    index = vessel_index.VesselIndex(cache)
+    v_lat, v_lon = rng.uniform(-60, 70, vessels), rng.uniform(-180, 180, vessels)
+    for k in range(vessels):
+        mmsi = str(200000000 + k)
+        cache.apply_position(mmsi, {"mmsi": mmsi, "name": f"VESSEL {k}", "lat": float(v_lat[k]),
+                                    "lon": float(v_lon[k])})
+    index.add_many(list(cache.vessels), v_lat, v_lon)
+    index.publish(force=True)
+
+    cities = rng.integers(0, 500, cameras)
+    city_lat, city_lon = rng.uniform(-50, 65, 500), rng.uniform(-180, 180, 500)
+
+    class Cameras:
+        lat = city_lat[cities] + rng.normal(0, 0.05, cameras)
+        lon = city_lon[cities] + rng.normal(0, 0.05, cameras)
+
+    py = random.Random(1)
+    fleet = [{"icao24": f"{k:06x}", "callsign": f"CS{k}", "registration": "---", "aircraft_type": "---",
+              "lat": py.uniform(-60, 70), "long": py.uniform(-180, 180), "alt": py.choice([1500, 8000, 35000]),
+              "velocity": 250, "heading": 0, "squawk": "1200",
+              "type": "military" if k % 10 == 0 else "commercial"} for k in range(aircraft)]
+    engine = AlertEngine(lambda: index.snapshot, lambda: Cameras, proximity_classes=None)
+    durations = []
+    for t in range(ticks):
+        for k, f in enumerate(fleet):
+            if k % 50:      # every 50th aircraft orbits in place, the rest fly on
+                f["lat"] = min(f["lat"] + 0.02, 80)
+            else:
+                f["lat"] += 0.01 * math.sin(t)
+                f["long"] += 0.01 * math.cos(t)
+            if k % 997 == 0 and t == ticks - 1:
+                f["squawk"] = "7700"
+        started = time.perf_counter()
+        result = engine.process(flight_poller.FlightSnapshot([dict(f) for f in fleet], time.time() + t * 20))
+        durations.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    i, j, km = proximity_pairs(np.array([f["lat"] for f in fleet]), np.array([f["long"] for f in fleet]),
+                               v_lat, v_lon, VESSEL_RADIUS_KM)
+    kernel = time.perf_counter() - started
+    sample = min(aircraft, 300)
+    brute = sum(int((haversine_km(fleet[k]["lat"], fleet[k]["long"], v_lat, v_lon) <= VESSEL_RADIUS_KM).sum())
+                for k in range(sample))
+
+    print(f"{aircraft} aircraft x {vessels} vessels x {cameras} cameras "
+          f"({len(engine._clusters[0])} clusters), all aircraft watched")
+    print(f"tick           p50 {np.percentile(durations, 50) * 1000:7.1f} ms   max {max(durations) * 1000:7.1f} ms")
+    print(f"proximity kernel {kernel * 1000:7.1f} ms, {len(i)} pairs "
+          f"(brute force over the first {sample} aircraft: {brute}, hash: {int((i < sample).sum())})")
+    print(f"last tick alerts: {result['counts']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aircraft / vessel proximity and anomaly alerts")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="time alert ticks on synthetic traffic")
+    bench.add_argument("--aircraft", type=int, default=10000)
+    bench.add_argument("--vessels", type=int, default=50000)
+    bench.add_argument("--cameras", type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        benchmark(args.aircraft, args.vessels, args.cameras)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Bounded response caches for the news routes.
+
+news_cache used to be a plain dict keyed on the raw request (for
+/api/geo/news the float coordinates), so it never evicted anything and two
+clicks a metre apart each ran the whole geocode + Twitter + RSS + NewsAPI +
+LLM pipeline. TTLCache is an LRU dict with a per-entry TTL and a size bound;
+get_or_compute() runs concurrent misses of one key once (single-flight), the
+other callers wait for that result. geo_key() quantizes coordinates to a
+geohash cell so nearby clicks share an entry.
+"""
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+DEFAULT_MAX_ENTRIES = 512
+GEO_PRECISION = 4           # geohash characters: ~39 x 20 km cells
+COMPUTE_TIMEOUT = 60        # longest a coalesced caller waits for the computing one
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat, lon, precision=GEO_PRECISION):
+    """Standard geohash of a point (`precision` base-32 characters)."""
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value, lon_lo = (value << 1) | 1, mid
+            else:
+                value, lon_hi = value << 1, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value, lat_lo = (value << 1) | 1, mid
+            else:
+                value, lat_hi = value << 1, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def geo_key(prefix, lat, lon, precision=GEO_PRECISION):
+    """Cache key of the geohash cell containing (lat, lon)."""
+    lat = min(90.0, max(-90.0, lat))
+    lon = (lon + 180.0) % 360.0 - 180.0
+    return f"{prefix}_{geohash(lat, lon, precision)}"
+
+
+class TTLCache:
+    """LRU dict of at most `max_entries` values, each valid for `ttl` seconds."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=900):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (stored_at, value), least recently used first
+        self._inflight = {}             # key -> Future
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.errors = 0
+
+    def _lookup(self, key, now):
+        """Fresh value of `key` or None, counting the hit (call with _lock held)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry[0] >= self.ttl:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def _store(self, key, value, now):
+        self._entries[key] = (now, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            value = self._lookup(key, time.time())
+            if value is None:
+                self.misses += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value, time.time())
+
+    def get_or_compute(self, key, compute, timeout=COMPUTE_TIMEOUT):
+        """
+        Cached value of `key`, else compute() stored under it. While one caller
+        computes a key, other callers of the same key wait for its result
+        (exceptions are raised in every caller and nothing is stored).
+        """
+        with self._lock:
+            value = self._lookup(key, time.time())
+            if value is not None:
+                return value
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                future = self._inflight[key] = Future()
+                owner = True
+        if not owner:
+            return future.result(timeout)
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self.errors += 1
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, value, time.time())
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            size, inflight = len(self._entries), len(self._inflight)
+        lookups = self.hits + self.misses + self.coalesced
+        return {"entries": size, "max_entries": self.max_entries, "ttl": self.ttl, "inflight": inflight,
+                "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                "evictions": self.evictions, "expirations": self.expirations, "errors": self.errors,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else None}
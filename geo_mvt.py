@@ -0,0 +1,173 @@
+"""
+Minimal Mapbox Vector Tile (spec v2) encoder for the surveillance grid.
+
+GeoJSON repeats every property key per feature and ships full-precision floats.
+An MVT layer stores keys and values once in deduplicated tables, features only
+reference them by index, and coordinates are quantized to integers on a tile
+local grid (`extent`). Only Point geometries are needed for the camera grid.
+
+No protobuf dependency: the handful of message types are written by hand.
+"""
+import json
+import math
+import struct
+
+DEFAULT_EXTENT = 4096
+MVT_MIMETYPE = 'application/vnd.mapbox-vector-tile'
+
+# Geometry types (vector_tile.proto: Tile.GeomType)
+GEOM_POINT = 1
+
+# Wire types
+_VARINT = 0
+_LENGTH = 2
+_FIXED64 = 1
+
+_CMD_MOVE_TO = 1
+_MAX_LAT = 85.05112878
+
+
+# -----------------------------------------------------------------
+# Protobuf primitives
+# -----------------------------------------------------------------
+def _varint(value, out):
+    value &= 0xFFFFFFFFFFFFFFFF
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field, wire_type, out):
+    _varint((field << 3) | wire_type, out)
+
+
+def _bytes_field(field, payload, out):
+    _key(field, _LENGTH, out)
+    _varint(len(payload), out)
+    out += payload
+
+
+def _varint_field(field, value, out):
+    _key(field, _VARINT, out)
+    _varint(value, out)
+
+
+def _packed_field(field, values, out):
+    packed = bytearray()
+    for v in values:
+        _varint(v, packed)
+    _bytes_field(field, packed, out)
+
+
+def _encode_value(value):
+    """Encode a Tile.Value message. Nested lists/dicts are stored as JSON strings."""
+    out = bytearray()
+    if isinstance(value, bool):
+        _varint_field(7, int(value), out)
+    elif isinstance(value, int) and -(1 << 63) <= value < (1 << 63):
+        if value >= 0:
+            _varint_field(5, value, out)                    # uint_value
+        else:
+            _varint_field(6, _zigzag(value), out)           # sint_value
+    elif isinstance(value, float):
+        _key(3, _FIXED64, out)                              # double_value
+        out += struct.pack('<d', value)
+    else:
+        if not isinstance(value, str):
+            value = json.dumps(value, separators=(',', ':'))
+        _bytes_field(1, value.encode('utf-8'), out)
+    return bytes(out)
+
+
+# -----------------------------------------------------------------
+# Projection
+# -----------------------------------------------------------------
+def project_point(lon, lat, z, x, y, extent=DEFAULT_EXTENT):
+    """Project lon/lat to integer tile-local coordinates for tile z/x/y."""
+    n = 1 << z
+    lat = max(-_MAX_LAT, min(_MAX_LAT, lat))
+    fx = (lon + 180.0) / 360.0 * n - x
+    rad = math.radians(lat)
+    fy = (1.0 - math.log(math.tan(rad) + 1.0 / math.cos(rad)) / math.pi) / 2.0 * n - y
+    return int(round(fx * extent)), int(round(fy * extent))
+
+
+# -----------------------------------------------------------------
+# Layer / tile encoding
+# -----------------------------------------------------------------
+class LayerBuilder:
+    """Accumulates point features of one layer with shared key/value tables."""
+
+    def __init__(self, name, extent=DEFAULT_EXTENT):
+        self.name = name
+        self.extent = extent
+        self.keys = []
+        self.values = []
+        self._key_index = {}
+        self._value_index = {}
+        self._features = bytearray()
+
+    def _tag(self, key, value):
+        k = self._key_index.get(key)
+        if k is None:
+            k = self._key_index[key] = len(self.keys)
+            self.keys.append(key)
+        # bool/int/float compare equal across types (True == 1 == 1.0), keep them apart
+        vkey = (type(value).__name__, value if isinstance(value, (str, int, float, bool)) else json.dumps(value, sort_keys=True))
+        v = self._value_index.get(vkey)
+        if v is None:
+            v = self._value_index[vkey] = len(self.values)
+            self.values.append(_encode_value(value))
+        return k, v
+
+    def add_point(self, px, py, properties=None, feature_id=None):
+        has_id = isinstance(feature_id, int) and not isinstance(feature_id, bool) and feature_id >= 0
+        tags = []
+        for key, value in (properties or {}).items():
+            # the OSM id travels as the feature id, not as a one-off table value
+            if value is None or (has_id and key == 'id'):
+                continue
+            tags.extend(self._tag(key, value))
+
+        feat = bytearray()
+        if has_id:
+            _varint_field(1, feature_id, feat)
+        if tags:
+            _packed_field(2, tags, feat)
+        _varint_field(3, GEOM_POINT, feat)
+        _packed_field(4, [(_CMD_MOVE_TO & 0x7) | (1 << 3), _zigzag(px), _zigzag(py)], feat)
+        _bytes_field(2, feat, self._features)
+
+    def encode(self):
+        out = bytearray()
+        _varint_field(15, 2, out)                           # version
+        _bytes_field(1, self.name.encode('utf-8'), out)
+        out += self._features
+        for key in self.keys:
+            _bytes_field(3, key.encode('utf-8'), out)
+        for value in self.values:
+            _bytes_field(4, value, out)
+        _varint_field(5, self.extent, out)
+        return bytes(out)
+
+
+def encode_feature_collection(data, z, x, y, layer_name='surveillance', extent=DEFAULT_EXTENT):
+    """Encode the Point features of a GeoJSON FeatureCollection as a single-layer MVT tile."""
+    layer = LayerBuilder(layer_name, extent)
+    for feat in data.get('features', []):
+        geom = feat.get('geometry') or {}
+        if geom.get('type') != 'Point':
+            continue
+        lon, lat = geom['coordinates'][:2]
+        px, py = project_point(lon, lat, z, x, y, extent)
+        props = feat.get('properties') or {}
+        layer.add_point(px, py, props, props.get('id'))
+
+    tile = bytearray()
+    _bytes_field(3, layer.encode(), tile)
+    return bytes(tile)
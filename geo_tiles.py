@@ -0,0 +1,302 @@
+"""
+Surveillance grid tile pyramid.
+
+The raw grid under geodata/geo/ only has zoom 6 and some of those tiles hold
+13k+ cameras. This module turns it into a z0-z14 pyramid where every tile stays
+under a feature budget: dense tiles are aggregated into grid clusters (count +
+dominant surveillance:type), sparse tiles keep the raw camera points and become
+"leaf" tiles that deeper zooms are cut from (overzoom).
+
+Build once, offline:
+    python geo_tiles.py build --src geodata/geo --out geodata/pyramid
+"""
+import os
+import sys
+import json
+import math
+import argparse
+
+import numpy as np
+
+MIN_ZOOM = 0
+MAX_ZOOM = 14
+SOURCE_ZOOM = 6
+TILE_FEATURE_BUDGET = 2000
+CLUSTER_GRID = 64                # cells per tile side before coarsening
+WORLD_BITS = MAX_ZOOM + 8        # integer world coords: 256 px per tile at MAX_ZOOM
+MAX_LAT = 85.05112878
+UNKNOWN_TYPE = "unknown"
+
+
+# -----------------------------------------------------------------
+# Tile math
+# -----------------------------------------------------------------
+def lonlat_to_world(lon, lat):
+    """Project lon/lat arrays to integer Web Mercator world coordinates (WORLD_BITS bits)."""
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LAT, MAX_LAT)
+    scale = float(1 << WORLD_BITS)
+    fx = (lon + 180.0) / 360.0
+    rad = np.radians(lat)
+    fy = (1.0 - np.log(np.tan(rad) + 1.0 / np.cos(rad)) / math.pi) / 2.0
+    gx = np.clip((fx * scale).astype(np.int64), 0, (1 << WORLD_BITS) - 1)
+    gy = np.clip((fy * scale).astype(np.int64), 0, (1 << WORLD_BITS) - 1)
+    return gx, gy
+
+
+def tile_bounds(z, x, y):
+    """Return (west, south, east, north) of a tile in degrees."""
+    n = 1 << z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+
+def valid_tile(z, x, y):
+    return MIN_ZOOM <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+# -----------------------------------------------------------------
+# Source loading & clustering
+# -----------------------------------------------------------------
+def load_source_features(src_dir, zoom=SOURCE_ZOOM):
+    """Read every Point feature of the raw grid under src_dir/<zoom>/."""
+    features = []
+    zoom_dir = os.path.join(src_dir, str(zoom))
+    for x_name in sorted(os.listdir(zoom_dir)):
+        x_dir = os.path.join(zoom_dir, x_name)
+        if not os.path.isdir(x_dir):
+            continue
+        for y_name in sorted(os.listdir(x_dir)):
+            if not y_name.endswith('.json'):
+                continue
+            with open(os.path.join(x_dir, y_name), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for feat in data.get('features', []):
+                geom = feat.get('geometry') or {}
+                if geom.get('type') == 'Point' and len(geom.get('coordinates') or []) >= 2:
+                    features.append(feat)
+    return features
+
+
+def load_source_points(src_dir, zoom=SOURCE_ZOOM):
+    """Read every raw tile of the source grid into (lon, lat, type_codes, type_names, features)."""
+    features = load_source_features(src_dir, zoom)
+    lon = np.array([f['geometry']['coordinates'][0] for f in features], dtype=np.float64)
+    lat = np.array([f['geometry']['coordinates'][1] for f in features], dtype=np.float64)
+
+    type_names = []
+    type_lookup = {}
+    codes = np.empty(len(features), dtype=np.int32)
+    for i, feat in enumerate(features):
+        name = (feat.get('properties') or {}).get('surveillance:type') or UNKNOWN_TYPE
+        code = type_lookup.get(name)
+        if code is None:
+            code = type_lookup[name] = len(type_names)
+            type_names.append(name)
+        codes[i] = code
+    return lon, lat, codes, type_names, features
+
+
+def cluster_points(idx, z, gx, gy, lon, lat, codes, type_names, features, budget=TILE_FEATURE_BUDGET):
+    """
+    Grid-aggregate the points `idx` of a tile at zoom `z` into at most `budget` features.
+    Cells holding a single camera keep the raw feature; denser cells become cluster points.
+    """
+    shift_base = WORLD_BITS - z
+    grid = CLUSTER_GRID
+    n_types = len(type_names)
+    while True:
+        cell_bits = int(math.log2(grid))
+        shift = shift_base - cell_bits
+        cx = (gx[idx] >> shift) & (grid - 1)
+        cy = (gy[idx] >> shift) & (grid - 1)
+        cell_ids, inverse = np.unique(cx * grid + cy, return_inverse=True)
+        if len(cell_ids) <= budget or grid == 1:
+            break
+        grid //= 2
+
+    n_cells = len(cell_ids)
+    counts = np.bincount(inverse, minlength=n_cells)
+    mean_lon = np.bincount(inverse, weights=lon[idx], minlength=n_cells) / counts
+    mean_lat = np.bincount(inverse, weights=lat[idx], minlength=n_cells) / counts
+    type_hist = np.bincount(inverse * n_types + codes[idx], minlength=n_cells * n_types).reshape(n_cells, n_types)
+    dominant = type_hist.argmax(axis=1)
+
+    # first point of every cell, used when a cell holds a single camera
+    first = np.full(n_cells, -1, dtype=np.int64)
+    first[inverse[::-1]] = idx[::-1]
+
+    out = []
+    for c in range(n_cells):
+        if counts[c] == 1:
+            out.append(features[first[c]])
+            continue
+        nz = np.nonzero(type_hist[c])[0]
+        out.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(float(mean_lon[c]), 6), round(float(mean_lat[c]), 6)]},
+            "properties": {
+                "cluster": True,
+                "point_count": int(counts[c]),
+                "surveillance:type": type_names[dominant[c]],
+                "type_counts": {type_names[t]: int(type_hist[c, t]) for t in nz}
+            }
+        })
+    return out
+
+
+# -----------------------------------------------------------------
+# Pyramid builder
+# -----------------------------------------------------------------
+def _write_tile(out_dir, z, x, y, features):
+    tile_dir = os.path.join(out_dir, str(z), str(x))
+    os.makedirs(tile_dir, exist_ok=True)
+    with open(os.path.join(tile_dir, f"{y}.json"), 'w', encoding='utf-8') as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f, separators=(',', ':'))
+
+
+def build_pyramid(src_dir, out_dir, max_zoom=MAX_ZOOM, budget=TILE_FEATURE_BUDGET):
+    """
+    Build the z0..max_zoom pyramid from the raw zoom-6 grid.
+
+    A tile whose cameras fit the budget is written raw and marked as a leaf; its
+    children are not written and are served by clipping the leaf (see read_tile).
+    Denser tiles are clustered and subdivided until they fit or max_zoom is hit.
+    """
+    lon, lat, codes, type_names, features = load_source_points(src_dir)
+    gx, gy = lonlat_to_world(lon, lat)
+    print(f"Pyramid: {len(features)} cameras loaded from {src_dir}")
+
+    index = {
+        "min_zoom": MIN_ZOOM,
+        "max_zoom": max_zoom,
+        "source_zoom": SOURCE_ZOOM,
+        "budget": budget,
+        "total_cameras": len(features),
+        "tiles": {}
+    }
+
+    stack = [(0, 0, 0, np.arange(len(features), dtype=np.int64))]
+    while stack:
+        z, x, y, idx = stack.pop()
+        if len(idx) <= budget:
+            tile_features = [features[i] for i in idx]
+            leaf = True
+        else:
+            tile_features = cluster_points(idx, z, gx, gy, lon, lat, codes, type_names, features, budget)
+            leaf = False
+            if z < max_zoom:
+                shift = WORLD_BITS - z - 1
+                child = ((gx[idx] >> shift) & 1) * 2 + ((gy[idx] >> shift) & 1)
+                for c in range(4):
+                    sub = idx[child == c]
+                    if len(sub):
+                        stack.append((z + 1, x * 2 + c // 2, y * 2 + c % 2, sub))
+
+        _write_tile(out_dir, z, x, y, tile_features)
+        index["tiles"][f"{z}/{x}/{y}"] = {
+            "cameras": int(len(idx)),
+            "features": len(tile_features),
+            "leaf": leaf
+        }
+
+    with open(os.path.join(out_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    print(f"Pyramid: wrote {len(index['tiles'])} tiles to {out_dir}")
+    return index
+
+
+# -----------------------------------------------------------------
+# Serving helpers
+# -----------------------------------------------------------------
+_pyramid_indexes = {}  # index.json stamp -> parsed index
+
+
+def load_pyramid_index(source):
+    """
+    Load the pyramid index of a tile source, or None when no pyramid is built.
+    A source is anything with read(rel) -> bytes | None and stamp(rel) -> hashable | None
+    (tile_store.TileStore, tile_pack.TilePack). The parsed index is memoized on the
+    stamp of index.json, so a rebuilt pyramid is picked up and a missing one is not cached.
+    """
+    stamp = source.stamp('index.json')
+    if stamp is None:
+        return None
+    index = _pyramid_indexes.get(stamp)
+    if index is None:
+        payload = source.read('index.json')
+        if payload is None:
+            return None
+        index = json.loads(payload)
+        if len(_pyramid_indexes) >= 4:
+            _pyramid_indexes.clear()
+        _pyramid_indexes[stamp] = index
+    return index
+
+
+def resolve_tile(index, z, x, y):
+    """
+    Map a requested tile onto the pyramid.
+
+    Returns (key, clip) where key is the "z/x/y" tile to read and clip tells whether
+    it is an ancestor leaf that must be cut to the requested bounds. key is None when
+    the requested tile holds no cameras.
+    """
+    tiles = index["tiles"]
+    key = f"{z}/{x}/{y}"
+    if key in tiles:
+        return key, False
+    pz, px, py = z, x, y
+    while pz > MIN_ZOOM:
+        pz, px, py = pz - 1, px // 2, py // 2
+        parent = tiles.get(f"{pz}/{px}/{py}")
+        if parent is not None:
+            return (f"{pz}/{px}/{py}", True) if parent.get("leaf") else (None, False)
+    return None, False
+
+
+def clip_features(features, z, x, y):
+    """Keep the point features of an ancestor leaf that fall inside tile z/x/y."""
+    if not features:
+        return []
+    coords = np.array([f["geometry"]["coordinates"][:2] for f in features], dtype=np.float64)
+    gx, gy = lonlat_to_world(coords[:, 0], coords[:, 1])
+    shift = WORLD_BITS - z
+    keep = np.nonzero(((gx >> shift) == x) & ((gy >> shift) == y))[0]
+    return [features[i] for i in keep]
+
+
+def read_tile(source, z, x, y):
+    """Return the FeatureCollection for any z/x/y, or None when the source holds no pyramid."""
+    index = load_pyramid_index(source)
+    if index is None:
+        return None
+    key, clip = resolve_tile(index, z, x, y)
+    if key is None:
+        return {"type": "FeatureCollection", "features": []}
+    data = json.loads(source.read(f"{key}.json"))
+    if clip:
+        data["features"] = clip_features(data["features"], z, x, y)
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Surveillance grid tile pyramid builder")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="build the z0-z14 pyramid from the zoom-6 grid")
+    build.add_argument("--src", default=os.path.join("geodata", "geo"))
+    build.add_argument("--out", default=os.path.join("geodata", "pyramid"))
+    build.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    build.add_argument("--budget", type=int, default=TILE_FEATURE_BUDGET)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        build_pyramid(args.src, args.out, min(args.max_zoom, MAX_ZOOM), args.budget)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
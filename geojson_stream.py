@@ -0,0 +1,301 @@
+"""
+Streaming reader for large GeoJSON layers.
+
+/api/geojson/<filename> used to json.load the whole file just to return 500
+features and a count. Here the file is memory-mapped and the "features" array
+is walked one feature at a time (each feature is decoded on its own by the C
+json decoder), so memory stays flat whatever the file size.
+
+A sidecar index (<file>.idx, JSON) is written on first use with the total
+feature count and a checkpoint every BLOCK_SIZE features: the byte offset
+where the block starts and the block's bbox. Offsets let a page start close to
+its first feature, and block bboxes let bbox queries skip whole blocks.
+"""
+import os
+import re
+import json
+import mmap
+import threading
+
+BLOCK_SIZE = 1000
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 50000
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+
+_WS = re.compile(rb'[ \t\r\n]*')
+_decoder = json.JSONDecoder()
+
+
+# -----------------------------------------------------------------
+# Incremental decoding over a memory map
+# -----------------------------------------------------------------
+def _skip_ws(buf, pos):
+    return _WS.match(buf, pos).end()
+
+
+def _decode_at(buf, pos, window=4096):
+    """Decode the JSON value starting at byte `pos`; returns (value, end byte offset)."""
+    size = len(buf)
+    while True:
+        chunk = buf[pos:pos + window]
+        try:
+            text = chunk.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # window cut a multi-byte character in half: drop the partial tail
+            if e.start < len(chunk) - 3:
+                raise
+            text = chunk[:e.start].decode('utf-8')
+        try:
+            value, end = _decoder.raw_decode(text)
+        except json.JSONDecodeError:
+            if pos + window >= size:
+                raise
+            window *= 4
+            continue
+        return value, pos + len(text[:end].encode('utf-8'))
+
+
+def _expect(buf, pos, token):
+    pos = _skip_ws(buf, pos)
+    if buf[pos:pos + 1] != token:
+        raise ValueError(f"Invalid GeoJSON: expected {token!r} at byte {pos}")
+    return pos + 1
+
+
+def _features_start(buf):
+    """Byte offset just inside the top-level "features" array (None when absent)."""
+    pos = _expect(buf, 0, b'{')
+    while True:
+        pos = _skip_ws(buf, pos)
+        if buf[pos:pos + 1] == b'}':
+            return None
+        key, pos = _decode_at(buf, pos)
+        pos = _expect(buf, pos, b':')
+        if key == 'features':
+            return _expect(buf, pos, b'[')
+        _, pos = _decode_at(buf, _skip_ws(buf, pos))
+        pos = _skip_ws(buf, pos)
+        if buf[pos:pos + 1] == b',':
+            pos += 1
+
+
+def _iter_array(buf, pos):
+    """Yield (byte offset, feature) for the array items from `pos` to the closing bracket."""
+    window = 4096
+    while True:
+        pos = _skip_ws(buf, pos)
+        if buf[pos:pos + 1] in (b']', b''):
+            return
+        start = pos
+        feature, pos = _decode_at(buf, pos, window)
+        # neighbouring features are usually of similar size: size the next window on this one
+        window = max(4096, 2 * (pos - start))
+        yield start, feature
+        pos = _skip_ws(buf, pos)
+        if buf[pos:pos + 1] == b',':
+            pos += 1
+
+
+# -----------------------------------------------------------------
+# Geometry helpers
+# -----------------------------------------------------------------
+def geometry_bbox(geom):
+    """[west, south, east, north] of any GeoJSON geometry, None when empty."""
+    if not geom:
+        return None
+    if geom.get('type') == 'GeometryCollection':
+        boxes = [b for b in (geometry_bbox(g) for g in geom.get('geometries', [])) if b]
+        return _union(boxes)
+    stack = [geom.get('coordinates')]
+    west = south = float('inf')
+    east = north = float('-inf')
+    while stack:
+        item = stack.pop()
+        if not isinstance(item, list) or not item:
+            continue
+        if isinstance(item[0], (int, float)):
+            if len(item) >= 2:
+                west, east = min(west, item[0]), max(east, item[0])
+                south, north = min(south, item[1]), max(north, item[1])
+        else:
+            stack.extend(item)
+    return [west, south, east, north] if west <= east else None
+
+
+def _union(boxes):
+    if not boxes:
+        return None
+    return [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)]
+
+
+def bbox_intersects(a, b):
+    return a is not None and a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
+
+
+def _split_antimeridian(bbox):
+    west, south, east, north = bbox
+    if west <= east:
+        return [bbox]
+    return [(west, south, 180.0, north), (-180.0, south, east, north)]
+
+
+def _hits(box, query_boxes):
+    return any(bbox_intersects(box, q) for q in query_boxes)
+
+
+# -----------------------------------------------------------------
+# Sidecar index
+# -----------------------------------------------------------------
+_index_cache = {}
+_index_locks = {}               # path -> lock serializing the build of that file's index
+_index_locks_lock = threading.Lock()
+
+
+def _open_map(path):
+    f = open(path, 'rb')
+    try:
+        return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # empty file cannot be mapped
+        f.close()
+        raise ValueError("Invalid GeoJSON: empty file")
+
+
+def build_index(path):
+    """Scan the file once and return its index (total, checkpoints with offsets and bboxes)."""
+    st = os.stat(path)
+    f, buf = _open_map(path)
+    try:
+        checkpoints = []
+        total = 0
+        block_boxes = []
+        start = _features_start(buf)
+        if start is not None:
+            for offset, feature in _iter_array(buf, start):
+                if total % BLOCK_SIZE == 0:
+                    if checkpoints:
+                        checkpoints[-1]["bbox"] = _union(block_boxes)
+                    checkpoints.append({"n": total, "offset": offset, "bbox": None})
+                    block_boxes = []
+                box = geometry_bbox((feature or {}).get('geometry'))
+                if box:
+                    block_boxes.append(box)
+                total += 1
+            if checkpoints:
+                checkpoints[-1]["bbox"] = _union(block_boxes)
+    finally:
+        buf.close()
+        f.close()
+    return {"version": INDEX_VERSION, "size": st.st_size, "mtime": st.st_mtime,
+            "total": total, "checkpoints": checkpoints}
+
+
+def _fresh(index, st):
+    return index is not None and index["size"] == st.st_size and index["mtime"] == st.st_mtime
+
+
+def _write_sidecar(path, index):
+    """Atomically replace the .idx sidecar of path."""
+    tmp = f"{path}{INDEX_SUFFIX}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(tmp, path + INDEX_SUFFIX)
+    except OSError as e:
+        print(f"GeoJSON index: could not write sidecar for {path}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def load_index(path):
+    """
+    Cached index of a file: memory, then the sidecar, then a fresh scan (written back).
+    A scan only holds the lock of its own file, so other layers keep being served.
+    """
+    st = os.stat(path)
+    index = _index_cache.get(path)
+    if _fresh(index, st):
+        return index
+
+    with _index_locks_lock:
+        lock = _index_locks.setdefault(path, threading.Lock())
+    with lock:
+        index = _index_cache.get(path)
+        if _fresh(index, st):
+            return index
+
+        try:
+            with open(path + INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get("version") != INDEX_VERSION or not _fresh(index, st):
+                index = None
+        except (OSError, ValueError, KeyError):
+            index = None
+
+        if index is None:
+            index = build_index(path)
+            _write_sidecar(path, index)
+        _index_cache[path] = index
+        return index
+
+
+# -----------------------------------------------------------------
+# Paging
+# -----------------------------------------------------------------
+def iter_page(path, index, offset=0, limit=DEFAULT_LIMIT, bbox=None):
+    """
+    Yield up to `limit` features after skipping `offset` (counted among bbox matches
+    when bbox=(west, south, east, north) is given, west > east crossing the
+    antimeridian), reading only the needed blocks.
+    """
+    checkpoints = index["checkpoints"]
+    if not checkpoints or limit <= 0:
+        return
+    f, buf = _open_map(path)
+    try:
+        if bbox is None:
+            block = min(offset // BLOCK_SIZE, len(checkpoints) - 1)
+            skip = offset - checkpoints[block]["n"]
+            sent = 0
+            for _, feature in _iter_array(buf, checkpoints[block]["offset"]):
+                if skip > 0:
+                    skip -= 1
+                    continue
+                yield feature
+                sent += 1
+                if sent >= limit:
+                    return
+            return
+
+        query_boxes = _split_antimeridian(bbox)
+        matched = sent = 0
+        for i, cp in enumerate(checkpoints):
+            if not _hits(cp["bbox"], query_boxes):
+                continue
+            count = (checkpoints[i + 1]["n"] if i + 1 < len(checkpoints) else index["total"]) - cp["n"]
+            for _, feature in _iter_array(buf, cp["offset"]):
+                count -= 1
+                if _hits(geometry_bbox((feature or {}).get('geometry')), query_boxes):
+                    matched += 1
+                    if matched > offset:
+                        yield feature
+                        sent += 1
+                        if sent >= limit:
+                            return
+                if count <= 0:
+                    break
+    finally:
+        buf.close()
+        f.close()
+
+
+def summarize(feature):
+    """The subset of a feature sent to the map (same shape as the legacy summary)."""
+    return {
+        "type": feature.get("type"),
+        "properties": feature.get("properties"),
+        "geometry": feature.get("geometry")
+    }
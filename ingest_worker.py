@@ -0,0 +1,133 @@
+"""
+Standalone ingest process for multi-worker deployments.
+
+Owns the AISstream.io websocket (vessel cache, grid index, tracks, SQLite
+snapshots, TTL sweeper) and the adsb.one flight poller, and publishes their
+snapshots to a shared directory (see shared_snapshot); it also keeps the RSS
+news index (news_index) filled. Web workers started with the same
+INGEST_SHARED_DIR read those files instead of running their own feeds, so N
+workers cost one upstream connection and one copy of the data:
+
+    INGEST_SHARED_DIR=/dev/shm/geosentinel python ingest_worker.py
+    INGEST_SHARED_DIR=/dev/shm/geosentinel gunicorn -w 4 app:app
+
+Put the directory on a tmpfs (/dev/shm) so publishing never touches the disk.
+"""
+import os
+import sys
+import argparse
+import threading
+
+from dotenv import load_dotenv
+
+import ais_ingest
+import ais_snapshot
+import camera_store
+import geo_alerts
+import flight_history
+import flight_poller
+import news_fetcher
+import news_index
+import shared_snapshot
+import vessel_cache
+import vessel_index
+import vessel_tracks
+
+try:
+    from news_config import NEWS_SOURCES
+except ImportError:
+    NEWS_SOURCES = {}
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AIS_SNAPSHOT_PATH = os.path.join(BASE_DIR, 'geodata', 'ais_snapshot.db')
+FLIGHT_HISTORY_DIR = os.path.join(BASE_DIR, 'geodata', 'flight_history')
+GEO_TILE_DIR = os.path.join(BASE_DIR, 'geodata', 'geo')
+CAMERA_STORE_CACHE = os.path.join(BASE_DIR, 'geodata', 'cameras.npz')
+NEWS_INDEX_PATH = os.path.join(BASE_DIR, 'geodata', 'news_index.db')
+
+
+def start_flights(directory, index=None):
+    """
+    Start the flight poller, publish every snapshot to the shared directory,
+    append it to the flight history and run the alert engine on it (against
+    the vessels of `index` when AIS runs too).
+    """
+    publisher = shared_snapshot.FlightPublisher(directory)
+    history = flight_history.FlightHistory(
+        os.getenv("FLIGHT_HISTORY_DIR", FLIGHT_HISTORY_DIR),
+        int(os.getenv("FLIGHT_HISTORY_HOURS", flight_history.DEFAULT_RETENTION_HOURS)))
+    engine = geo_alerts.AlertEngine((lambda: index.snapshot) if index is not None else None,
+                                    lambda: camera_store.get_store(GEO_TILE_DIR, CAMERA_STORE_CACHE))
+    alerts_path = os.path.join(directory, shared_snapshot.ALERTS_FILE)
+
+    def publish_alerts(snapshot):
+        result = engine.process(snapshot)
+        shared_snapshot.write_json(alerts_path, dict(result, stats=engine.stats()))
+
+    poller = flight_poller.FlightPoller()
+    poller.add_listener(publisher.publish)
+    poller.add_listener(history.append)
+    poller.add_listener(publish_alerts)
+    return poller.start()
+
+
+def start_news(directory):
+    """
+    Keep every configured RSS feed ingested into the news index the web
+    workers query, and publish the feed health table after every round.
+    """
+    index = news_index.NewsIndex(os.getenv("NEWS_INDEX_PATH", NEWS_INDEX_PATH))
+    ingestor = news_index.NewsIngestor(index, news_fetcher.FeedFetcher(), NEWS_SOURCES)
+    health_path = os.path.join(directory, shared_snapshot.NEWS_HEALTH_FILE)
+    ingestor.add_listener(lambda ingestor: shared_snapshot.write_json(health_path, ingestor.report()))
+    return ingestor.start()
+
+
+def start_vessels(directory, interval=shared_snapshot.PUBLISH_INTERVAL):
+    """Build the AIS pipeline with its track slab in the shared directory; returns the ingest."""
+    cache = vessel_cache.VesselCache.from_env()
+    lock = threading.Lock()
+    index = vessel_index.VesselIndex(cache)
+    cache.index = index
+    tracks = vessel_tracks.TrackStore.from_env(os.path.join(directory, shared_snapshot.TRACKS_PREFIX))
+    ingest = ais_ingest.AISIngest(cache, lock, tracks, index)
+
+    try:
+        ais_snapshot.warm_start(AIS_SNAPSHOT_PATH, cache, lock, index)
+    except Exception as e:
+        print(f"AIS warm start failed: {e}")
+    writer = ais_snapshot.SnapshotWriter(AIS_SNAPSHOT_PATH, ingest).start()
+    vessel_cache.Sweeper(cache, lock).start()
+    shared_snapshot.VesselPublisher(directory, ingest, writer, interval).start()
+    return ingest
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="AIS / ADS-B ingest process shared by the web workers")
+    parser.add_argument("--dir", default=os.getenv("INGEST_SHARED_DIR", os.path.join(BASE_DIR, 'geodata', 'shared')),
+                        help="shared snapshot directory (INGEST_SHARED_DIR)")
+    parser.add_argument("--interval", type=float, default=shared_snapshot.PUBLISH_INTERVAL,
+                        help="seconds between vessel snapshots")
+    parser.add_argument("--no-ais", action="store_true")
+    parser.add_argument("--no-flights", action="store_true")
+    parser.add_argument("--no-news", action="store_true")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.dir, exist_ok=True)
+    print(f"Ingest worker publishing to {args.dir}")
+    ingest = None if args.no_ais else start_vessels(args.dir, args.interval)
+    if not args.no_flights:
+        start_flights(args.dir, ingest.index if ingest is not None else None)
+    if not args.no_news:
+        start_news(args.dir)
+    if ingest is None:
+        threading.Event().wait()
+        return 0
+    ais_ingest.run_stream(ingest, os.getenv("GENERIC_API_KEY", "YOUR_API_KEYS"),
+                          os.getenv("AIS_STREAM_URL", ais_ingest.AIS_STREAM_URL))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,420 @@
+"""
+Local full-text index of every configured RSS feed.
+
+/api/news/advanced and /api/geo/news used to fetch a region's feeds live and
+keep the result per query string, so a keyword could only be matched against
+the one region that was fetched. Here a background ingestor keeps every feed
+of news_config.NEWS_SOURCES in a SQLite database (WAL, shared by every web
+worker) and the routes query it:
+
+    - articles are deduplicated by URL; an article seen in the feeds of
+      several regions is listed under each of them (article_regions);
+    - an FTS5 table over title and description (external content, kept in
+      step by triggers) answers keyword queries ranked by BM25, titles
+      weighted TITLE_WEIGHT times the description;
+    - published times are stored as epoch seconds, so date filters and
+      newest-first listings are index range scans;
+    - feeds that answered 304 (see news_fetcher) cost no database work.
+"""
+import os
+import re
+import sys
+import time
+import sqlite3
+import calendar
+import argparse
+import threading
+from datetime import datetime, timezone
+
+import news_fetcher
+
+INGEST_INTERVAL = 60        # longest sleep between two rounds over the due feeds
+INGEST_TIMEOUT = 60         # longest a round waits for its feeds
+PRUNE_INTERVAL = 3600
+RETENTION_DAYS = 30
+TITLE_WEIGHT = 4.0
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+DESCRIPTION_CHARS = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    source TEXT,
+    region TEXT,
+    published REAL NOT NULL,
+    published_raw TEXT,
+    ingested REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_published ON articles (published);
+CREATE TABLE IF NOT EXISTS article_regions (
+    region TEXT NOT NULL,
+    article_id INTEGER NOT NULL,
+    published REAL NOT NULL,
+    PRIMARY KEY (region, article_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS article_regions_published ON article_regions (region, published);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, description, content='articles', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='3'
+);
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, description)
+    VALUES ('delete', old.id, old.title, old.description);
+END;
+"""
+
+_TAG = re.compile(r'<[^>]+>')
+_SPACE = re.compile(r'\s+')
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def clean_text(text):
+    """Feed HTML reduced to plain text."""
+    return _SPACE.sub(' ', _TAG.sub(' ', text or '')).strip()
+
+
+def match_query(q):
+    """
+    An FTS5 MATCH expression for free text: every word must occur, as a word
+    or a word prefix ("iran" matches "Iranian"). Operators and quotes typed
+    by the user are dropped, so any input is a valid query ('' for none).
+    """
+    return ' '.join(f'"{word}"*' for word in _WORD.findall(q or ''))
+
+
+def entry_time(entry, fallback):
+    """Epoch seconds an entry was published (never later than `fallback`, the ingest time)."""
+    parsed = entry.get('published_parsed')
+    if parsed:
+        try:
+            return min(float(calendar.timegm(parsed)), fallback)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    return fallback
+
+
+class NewsIndex:
+    """SQLite FTS5 store of RSS articles."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    # -- writing -------------------------------------------------------
+    def add(self, region, source, entries, now=None, retention_days=RETENTION_DAYS):
+        """
+        Store the entries of one feed of `region` (except those already past
+        retention); returns the number of new articles.
+        """
+        now = time.time() if now is None else now
+        oldest = now - retention_days * 86400
+        rows = []
+        for entry in entries:
+            url = (entry.get('url') or '').strip()
+            title = clean_text(entry.get('title'))
+            published = entry_time(entry, now)
+            if not url or not title or published < oldest:
+                continue
+            rows.append((url, title, clean_text(entry.get('summary'))[:DESCRIPTION_CHARS], source, region,
+                         published, entry.get('published'), now))
+        if not rows:
+            return 0
+        with self._lock:
+            conn = self._db()
+            with conn:
+                added = conn.executemany("INSERT OR IGNORE INTO articles (url, title, description, source, "
+                                         "region, published, published_raw, ingested) "
+                                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows).rowcount
+                conn.executemany("INSERT OR IGNORE INTO article_regions (region, article_id, published) "
+                                 "SELECT ?, id, published FROM articles WHERE url = ?",
+                                 [(region, row[0]) for row in rows])
+        return added
+
+    def prune(self, retention_days=RETENTION_DAYS):
+        """Drop articles published more than `retention_days` ago; returns how many."""
+        cutoff = time.time() - retention_days * 86400
+        with self._lock:
+            conn = self._db()
+            with conn:
+                conn.execute("DELETE FROM article_regions WHERE article_id IN "
+                             "(SELECT id FROM articles WHERE published < ?)", (cutoff,))
+                return conn.execute("DELETE FROM articles WHERE published < ?", (cutoff,)).rowcount
+
+    # -- reading -------------------------------------------------------
+    def search(self, q='', regions=None, since=None, until=None, limit=DEFAULT_LIMIT, offset=0, sort=None):
+        """
+        Articles in the API's shape. With `q`, matches ranked by BM25 (or
+        newest first with sort="date"); without, newest first. `regions`
+        restricts to articles seen in those regions' feeds, `since`/`until`
+        (epoch seconds) to a publication window.
+        """
+        match = match_query(q)
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        clauses, params = [], []
+        if match:
+            sql = ("SELECT a.url, a.title, a.description, a.source, a.region, a.published_raw, a.published "
+                   "FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid")
+            clauses.append("articles_fts MATCH ?")
+            params.append(match)
+        else:
+            sql = ("SELECT a.url, a.title, a.description, a.source, a.region, a.published_raw, a.published "
+                   "FROM articles a")
+        if regions:
+            regions = list(regions)
+            if match:
+                # one primary key probe per match instead of materialising the regions' ids
+                clauses.append(f"EXISTS (SELECT 1 FROM article_regions r WHERE r.region IN "
+                               f"({','.join('?' * len(regions))}) AND r.article_id = a.id)")
+                params.extend(regions)
+            else:
+                # newest first within the regions: walk article_regions (region, published)
+                sql = ("SELECT a.url, a.title, a.description, a.source, r.region, a.published_raw, a.published "
+                       "FROM article_regions r JOIN articles a ON a.id = r.article_id")
+                clauses.append(f"r.region IN ({','.join('?' * len(regions))})")
+                params.extend(regions)
+        column = "r.published" if regions and not match else "a.published"
+        if since is not None:
+            clauses.append(f"{column} >= ?")
+            params.append(float(since))
+        if until is not None:
+            clauses.append(f"{column} < ?")
+            params.append(float(until))
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if match and sort != "date":
+            sql += f" ORDER BY bm25(articles_fts, {TITLE_WEIGHT}, 1.0)"
+        else:
+            sql += f" ORDER BY {column} DESC"
+        sql += " LIMIT ? OFFSET ?"
+        params.extend((limit, max(0, int(offset))))
+
+        with self._lock:
+            rows = self._db().execute(sql, params).fetchall()
+        articles, seen = [], set()
+        for url, title, description, source, region, published_raw, published in rows:
+            if url in seen:     # listed once per matching region
+                continue
+            seen.add(url)
+            articles.append({
+                "source": source,
+                "title": title,
+                "url": url,
+                "published": published_raw or datetime.fromtimestamp(published, timezone.utc).isoformat(),
+                "description": description[:200] + "..." if description else "",
+                "image": None,
+                "type": f"RSS_{region}"
+            })
+        return articles
+
+    def stats(self):
+        with self._lock:
+            conn = self._db()
+            articles, newest = conn.execute("SELECT COUNT(*), MAX(published) FROM articles").fetchone()
+            regions = dict(conn.execute("SELECT region, COUNT(*) FROM article_regions GROUP BY region"))
+        return {"articles": articles, "newest": newest, "regions": regions}
+
+
+class NewsIngestor:
+    """
+    Background thread that keeps every feed of `sources` (NEWS_SOURCES) in the
+    index. Each round fetches only the feeds the fetcher's schedule says are
+    due, then sleeps until the next one is (at most `interval`).
+    """
+
+    def __init__(self, index, fetcher, sources, interval=INGEST_INTERVAL, retention_days=RETENTION_DAYS):
+        self.index = index
+        self.fetcher = fetcher
+        self.sources = sources
+        self.interval = interval
+        self.retention_days = retention_days
+        self.first_pass = threading.Event()
+        self._indexed = {}          # (region, url) -> changed_at of the entries last stored
+        self._listeners = []
+        self._thread = None
+        self._pruned = 0.0
+        self.passes = 0
+        self.added = 0
+        self.last_pass = None
+
+    def add_listener(self, callback):
+        """callback(ingestor) after every round."""
+        self._listeners.append(callback)
+
+    def feeds(self):
+        """(region, url) of every configured RSS feed."""
+        return [(region, url) for region, config in self.sources.items() for url in config.get('rss', [])]
+
+    def regions(self):
+        """url -> [regions] of every configured RSS feed."""
+        regions = {}
+        for region, url in self.feeds():
+            regions.setdefault(url, []).append(region)
+        return regions
+
+    def ingest_once(self, force=False):
+        """One round over the due feeds (all with `force`); returns the number of new articles."""
+        started = time.time()
+        feeds = self.feeds()
+        requests_before = self.fetcher.requests
+        states = {state.url: state for state in
+                  self.fetcher.fetch_many([url for _, url in feeds], timeout=INGEST_TIMEOUT, force=force)}
+        added = 0
+        for region, url in feeds:
+            state = states[url]
+            if state.changed_at and state.changed_at != self._indexed.get((region, url)):
+                added += self.index.add(region, state.title, state.entries, retention_days=self.retention_days)
+                self._indexed[(region, url)] = state.changed_at
+        self.passes += 1
+        self.added += added
+        self.last_pass = {"at": started, "seconds": round(time.time() - started, 2), "feeds": len(feeds),
+                          "fetched": self.fetcher.requests - requests_before, "added": added}
+        self.first_pass.set()
+        for callback in self._listeners:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"News ingest listener error: {e}")
+        return added
+
+    def health(self):
+        """The fetcher's per-feed health rows, with the regions each feed belongs to."""
+        regions = self.regions()
+        rows = self.fetcher.health(regions)
+        for row in rows:
+            row["regions"] = regions.get(row["url"], [])
+        return rows
+
+    def report(self):
+        """Per-feed health table and totals, as served by /api/news/feeds."""
+        rows = self.health()
+        circuits = {}
+        for row in rows:
+            circuits[row["circuit"]] = circuits.get(row["circuit"], 0) + 1
+        stats = self.fetcher.stats()
+        return {"generated": time.time(),
+                "summary": {"feeds": len(rows), "circuits": circuits, "failing": stats["failing"],
+                            "requests": stats["requests"], "not_modified": stats["not_modified"],
+                            "unchanged": stats["unchanged"], "errors": stats["errors"],
+                            "articles_added": self.added},
+                "feeds": rows}
+
+    def _run(self):
+        while True:
+            try:
+                added = self.ingest_once()
+                if self.last_pass["fetched"]:
+                    print(f"News ingest: {self.last_pass['fetched']} feeds fetched, {added} new articles "
+                          f"in {self.last_pass['seconds']:.1f}s")
+                if time.time() - self._pruned > PRUNE_INTERVAL:
+                    self._pruned = time.time()
+                    self.index.prune(self.retention_days)
+            except Exception as e:
+                print(f"News ingest error: {e}")
+            wake = self.fetcher.next_due([url for _, url in self.feeds()])
+            time.sleep(min(self.interval, max(1.0, wake - time.time())))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="news-ingest", daemon=True)
+            self._thread.start()
+            print("News ingest thread started")
+        return self
+
+    def stats(self):
+        return {"passes": self.passes, "added": self.added, "last_pass": self.last_pass,
+                "fetcher": self.fetcher.stats()}
+
+
+# ---------------------------------------------------------------------------
+# CLI: python news_index.py ingest|search|bench
+# ---------------------------------------------------------------------------
+def _synthetic(index, count, regions):
+    """`count` articles per region drawn from a Zipf-distributed vocabulary with the topic words mixed in."""
+    import random
+    import string
+    rng = random.Random(7)
+    topics = ("iran israel china taiwan russia ukraine election market oil gold missile drone border "
+              "talks summit sanctions protest storm earthquake cyber attack navy strait trade tariff "
+              "ceasefire minister president parliament court vote energy gas pipeline satellite").split()
+    vocab = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))) for _ in range(20000)]
+    vocab[20:20 + len(topics)] = topics
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]
+    now = time.time()
+    for start in range(0, count, 1000):
+        for region in regions:
+            entries = [{"url": f"https://example.org/{region}/{i}",
+                        "title": ' '.join(rng.choices(vocab, weights, k=10)).capitalize(),
+                        "summary": ' '.join(rng.choices(vocab, weights, k=40)),
+                        "published_parsed": time.gmtime(now - rng.uniform(0, 30 * 86400))}
+                       for i in range(start, min(count, start + 1000))]
+            index.add(region, "Synthetic", entries, now)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RSS article index")
+    parser.add_argument("--db", default=os.getenv("NEWS_INDEX_PATH", os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'geodata', 'news_index.db')))
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("ingest", help="run one pass over all configured feeds")
+    search = sub.add_parser("search", help="query the index")
+    search.add_argument("q", nargs="?", default="")
+    search.add_argument("--region", action="append")
+    search.add_argument("--limit", type=int, default=10)
+    bench = sub.add_parser("bench", help="time queries over a synthetic index")
+    bench.add_argument("--articles", type=int, default=10000, help="articles per region")
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest":
+        from news_config import NEWS_SOURCES
+        index = NewsIndex(args.db)
+        ingestor = NewsIngestor(index, news_fetcher.FeedFetcher(), NEWS_SOURCES)
+        print(f"{ingestor.ingest_once(force=True)} new articles: {ingestor.last_pass}")
+        print(index.stats())
+    elif args.command == "search":
+        for article in NewsIndex(args.db).search(args.q, args.region, limit=args.limit):
+            print(f"{article['published'][:25]:25} {article['type']:18} {article['title']}")
+    else:
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            index = NewsIndex(os.path.join(tmp, "bench.db"))
+            regions = ["INTERNATIONAL", "USA", "EUROPE", "IRAN", "CHINA"]
+            started = time.time()
+            _synthetic(index, args.articles, regions)
+            total = args.articles * len(regions)
+            print(f"indexed {total} articles in {time.time() - started:.1f}s")
+            week = time.time() - 7 * 86400
+            for label, kwargs in (("region newest", {"regions": ["IRAN"]}),
+                                  ("keyword", {"q": "missile strait"}),
+                                  ("keyword+region", {"q": "sanctions", "regions": ["CHINA"]}),
+                                  ("keyword+region+7d", {"q": "oil", "regions": ["IRAN"], "since": week}),
+                                  ("prefix", {"q": "elect"})):
+                runs = []
+                for _ in range(20):
+                    started = time.perf_counter()
+                    found = index.search(**kwargs)
+                    runs.append(time.perf_counter() - started)
+                runs.sort()
+                print(f"{label:18} {len(found):4d} hits  median {runs[10] * 1000:.2f} ms  max {runs[-1] * 1000:.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
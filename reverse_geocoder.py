@@ -0,0 +1,450 @@
+"""
+Offline reverse geocoder: lat/lon -> country, admin1 and NEWS_SOURCES region.
+
+/api/geo/news and /api/news/advanced used to ask nominatim.openstreetmap.org
+on every uncached request (2-5 s, rate limited) and then map the country
+name to a region with substring loops. Here the admin-1 boundaries of
+Natural Earth (a GeoJSON downloaded once to geodata/boundaries/, see
+`python reverse_geocoder.py download`) are prepared into a grid index:
+
+    cell_offsets     CSR offsets (one 1 degree cell each) into the pairs
+    pair_feature     boundary feature whose bbox overlaps the cell
+    pair_inside      whether the cell centre lies inside that feature
+    pair_edges       CSR offsets into the edge arrays
+    x1/y1/x2/y2      the feature's polygon edges that overlap the cell
+
+A point is inside a feature when the centre of its cell is, flipped once for
+every edge the segment centre -> point crosses; only the few edges inside
+that cell are looked at, never the whole polygon. lookup_many() does this
+for a batch of points in one vectorized pass.
+
+The index is built from the GeoJSON once and cached as an .npz next to it.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+import numpy as np
+
+CELL_DEG = 1.0
+COLS = int(360 / CELL_DEG)
+ROWS = int(180 / CELL_DEG)
+CACHE_VERSION = 1
+BATCH_CHUNK = 65536
+
+NATURAL_EARTH_URL = ("https://raw.githubusercontent.com/nvkelso/natural-earth-vector/master/geojson/"
+                     "ne_10m_admin_1_states_provinces.geojson")
+DEFAULT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geodata', 'boundaries',
+                              'ne_10m_admin_1_states_provinces.geojson')
+
+# NEWS_SOURCES region keys by ISO 3166-1 alpha-2 code
+COUNTRY_REGIONS = {
+    "US": "USA", "IN": "INDIA", "CN": "CHINA", "RU": "RUSSIA", "JP": "JAPAN", "AU": "AUSTRALIA",
+    "TW": "TAIWAN", "KR": "SOUTH_KOREA", "IL": "ISRAEL", "AE": "UAE", "IR": "IRAN",
+}
+EUROPE = set("AL AD AT BY BE BA BG HR CY CZ DK EE FI FR DE GR HU IS IE IT XK LV LI LT LU MT MD MC ME NL "
+             "MK NO PL PT RO SM RS SK SI ES SE CH UA GB VA".split())
+AFRICA = set("DZ AO BJ BW BF BI CV CM CF TD KM CD CG CI DJ EG GQ ER SZ ET GA GM GH GN GW KE LS LR LY MG "
+             "MW ML MR MU MA MZ NA NE NG RW ST SN SC SL SO ZA SS SD TZ TG TN UG ZM ZW EH".split())
+# names as returned by Nominatim, for the online fallback
+COUNTRY_CODES = {
+    "United States": "US", "India": "IN", "China": "CN", "Russia": "RU", "Japan": "JP",
+    "Australia": "AU", "Taiwan": "TW", "South Korea": "KR", "Israel": "IL",
+    "United Arab Emirates": "AE", "Iran": "IR",
+}
+
+
+def region_for(code=None, country=None):
+    """NEWS_SOURCES region key of a country (ISO alpha-2 code or name); '' when none applies."""
+    code = (code or '').upper()
+    if len(code) != 2 and country:
+        code = COUNTRY_CODES.get(country, '')
+    if code in COUNTRY_REGIONS:
+        return COUNTRY_REGIONS[code]
+    if code in EUROPE:
+        return "EUROPE"
+    if code in AFRICA:
+        return "AFRICA"
+    return ""
+
+
+def _cols(x):
+    return np.clip(np.floor((np.asarray(x, dtype=np.float64) + 180.0) / CELL_DEG).astype(np.int64), 0, COLS - 1)
+
+
+def _rows(y):
+    return np.clip(np.floor((np.asarray(y, dtype=np.float64) + 90.0) / CELL_DEG).astype(np.int64), 0, ROWS - 1)
+
+
+def _first(props, *keys):
+    for key in keys:
+        value = props.get(key)
+        if value not in (None, '', '-1', '-99'):
+            return str(value)
+    return None
+
+
+def feature_names(props):
+    """(country, ISO alpha-2, admin1) of a Natural Earth / geoBoundaries / GADM style feature."""
+    country = _first(props, 'admin', 'ADMIN', 'geonunit', 'country', 'NAME_0', 'shapeGroup', 'NAME')
+    code = _first(props, 'iso_a2', 'ISO_A2', 'ISO_A2_EH', 'iso_3166_1', 'ISO_2')
+    admin1 = _first(props, 'name', 'name_en', 'NAME_1', 'shapeName') if \
+        any(k in props for k in ('iso_3166_2', 'NAME_1', 'shapeISO', 'adm1_code')) else None
+    return country, code, admin1
+
+
+def _polygons(geometry):
+    if not geometry:
+        return []
+    if geometry.get('type') == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry.get('type') == 'MultiPolygon':
+        return geometry['coordinates']
+    return []
+
+
+class ReverseGeocoder:
+    """Grid index of boundary polygons answering point lookups from flat arrays."""
+
+    ARRAYS = ("cell_offsets", "pair_feature", "pair_inside", "pair_edges", "x1", "y1", "x2", "y2")
+
+    def __init__(self, arrays, countries, codes, admin1):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.countries = countries
+        self.codes = codes
+        self.admin1 = admin1
+        self.regions = [region_for(code, country) for country, code in zip(countries, codes)]
+
+    def __len__(self):
+        return len(self.countries)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
+
+    # -- build ------------------------------------------------------
+    @classmethod
+    def from_geojson(cls, collection):
+        """Prepare the index from a FeatureCollection of (Multi)Polygon boundaries."""
+        countries, codes, admin1 = [], [], []
+        edge_parts, part_boxes = [], []     # (feature, x1, y1, x2, y2), (feature, bbox)
+        for feature in collection.get('features', []):
+            polygons = _polygons(feature.get('geometry'))
+            if not polygons:
+                continue
+            f = len(countries)
+            country, code, name = feature_names(feature.get('properties') or {})
+            countries.append(country)
+            codes.append(code)
+            admin1.append(name)
+            for polygon in polygons:
+                for i, ring in enumerate(polygon):
+                    ring = np.asarray(ring, dtype=np.float64)[:, :2]
+                    if len(ring) < 3:
+                        continue
+                    if not np.array_equal(ring[0], ring[-1]):
+                        ring = np.vstack([ring, ring[:1]])
+                    edge_parts.append((f, ring[:-1, 0], ring[:-1, 1], ring[1:, 0], ring[1:, 1]))
+                    if i == 0:      # holes lie inside their exterior ring
+                        part_boxes.append((f, ring[:, 0].min(), ring[:, 1].min(), ring[:, 0].max(), ring[:, 1].max()))
+        nf = max(1, len(countries))
+        ef = np.concatenate([np.full(len(p[1]), p[0], dtype=np.int64) for p in edge_parts]) \
+            if edge_parts else np.zeros(0, dtype=np.int64)
+        ex1, ey1, ex2, ey2 = (np.concatenate([p[k] for p in edge_parts]) if edge_parts else np.zeros(0)
+                              for k in (1, 2, 3, 4))
+
+        # (cell, feature) pairs: every cell of every polygon part's bbox
+        pair_keys = []
+        for f, w, s, e, n in part_boxes:
+            cols = np.arange(_cols(w), _cols(e) + 1)
+            rows = np.arange(_rows(s), _rows(n) + 1)
+            pair_keys.append(((rows[:, None] * COLS + cols[None, :]).ravel()) * nf + f)
+        pair_keys = np.unique(np.concatenate(pair_keys)) if pair_keys else np.zeros(0, dtype=np.int64)
+
+        # edge incidences: every cell of each edge's bbox
+        c0, c1 = _cols(np.minimum(ex1, ex2)), _cols(np.maximum(ex1, ex2))
+        r0, r1 = _rows(np.minimum(ey1, ey2)), _rows(np.maximum(ey1, ey2))
+        width = c1 - c0 + 1
+        counts = width * (r1 - r0 + 1)
+        edge_ids = np.repeat(np.arange(len(ef)), counts)
+        k = np.arange(len(edge_ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = (r0[edge_ids] + k // width[edge_ids]) * COLS + c0[edge_ids] + k % width[edge_ids]
+        incidence = cells * nf + ef[edge_ids]
+        order = np.argsort(incidence, kind='stable')
+        incidence, edge_ids = incidence[order], edge_ids[order]
+
+        # centre of each pair's cell inside its feature? (ray cast east over the feature's edges)
+        pair_cell, pair_feature = pair_keys // nf, pair_keys % nf
+        cx = (pair_cell % COLS + 0.5) * CELL_DEG - 180.0
+        cy = (pair_cell // COLS + 0.5) * CELL_DEG - 90.0
+        inside = np.zeros(len(pair_keys), dtype=bool)
+        by_feature = np.argsort(ef, kind='stable')
+        bounds = np.searchsorted(ef[by_feature], np.arange(nf + 1))
+        pair_order = np.lexsort((cy, pair_feature))
+        starts = np.searchsorted(pair_feature[pair_order], np.arange(nf + 1))
+        for f in range(len(countries)):
+            rows_of_f = pair_order[starts[f]:starts[f + 1]]
+            if not len(rows_of_f):
+                continue
+            idx = by_feature[bounds[f]:bounds[f + 1]]
+            fx1, fy1, fx2, fy2 = ex1[idx], ey1[idx], ex2[idx], ey2[idx]
+            for y in np.unique(cy[rows_of_f]):
+                sel = rows_of_f[cy[rows_of_f] == y]
+                crossing = (fy1 > y) != (fy2 > y)
+                xs = np.sort(fx1[crossing] + (y - fy1[crossing]) * (fx2[crossing] - fx1[crossing]) /
+                             (fy2[crossing] - fy1[crossing]))
+                east = len(xs) - np.searchsorted(xs, cx[sel], side='right')
+                inside[sel] = (east % 2) == 1
+
+        # keep pairs that can answer "inside": a crossing edge, or the whole cell inside
+        first = np.searchsorted(incidence, pair_keys, side='left')
+        last = np.searchsorted(incidence, pair_keys, side='right')
+        keep = inside | (last > first)
+        pair_keys, pair_feature, inside, first, last = (a[keep] for a in (pair_keys, pair_feature, inside, first, last))
+        pair_edges = np.zeros(len(pair_keys) + 1, dtype=np.int64)
+        np.cumsum(last - first, out=pair_edges[1:])
+        take = edge_ids[np.concatenate([np.arange(a, b) for a, b in zip(first.tolist(), last.tolist())])
+                        if len(first) else np.zeros(0, dtype=np.int64)]
+        arrays = {
+            "cell_offsets": np.searchsorted(pair_keys // nf, np.arange(COLS * ROWS + 1)).astype(np.int64),
+            "pair_feature": pair_feature.astype(np.int32),
+            "pair_inside": inside,
+            "pair_edges": pair_edges,
+            "x1": ex1[take], "y1": ey1[take], "x2": ex2[take], "y2": ey2[take],
+        }
+        return cls(arrays, countries, codes, admin1)
+
+    # -- persistence ------------------------------------------------
+    def save(self, path, stamp):
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        meta = {"version": CACHE_VERSION, "stamp": stamp, "countries": self.countries,
+                "codes": self.codes, "admin1": self.admin1}
+        arrays["meta"] = np.frombuffer(json.dumps(meta, separators=(',', ':')).encode('utf-8'), dtype=np.uint8)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, stamp):
+        """Load a cached index; None when missing, stale or from another format version."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes())
+            if meta.get("version") != CACHE_VERSION or meta.get("stamp") != stamp:
+                return None
+            arrays = {name: data[name] for name in data.files if name != "meta"}
+        return cls(arrays, meta["countries"], meta["codes"], meta["admin1"])
+
+    # -- lookups ----------------------------------------------------
+    def _features(self, lat, lon):
+        m = len(lat)
+        col, row = _cols(lon), _rows(lat)
+        cell = row * COLS + col
+        p0 = self.cell_offsets[cell]
+        n = self.cell_offsets[cell + 1] - p0
+        point = np.repeat(np.arange(m), n)
+        pair = np.repeat(p0, n) + np.arange(len(point)) - np.repeat(np.cumsum(n) - n, n)
+        inside = self.pair_inside[pair]
+
+        e0 = self.pair_edges[pair]
+        ne = self.pair_edges[pair + 1] - e0
+        if ne.sum():
+            q = np.repeat(np.arange(len(pair)), ne)
+            edge = np.repeat(e0, ne) + np.arange(len(q)) - np.repeat(np.cumsum(ne) - ne, ne)
+            pt = point[q]
+            ax = (col[pt] + 0.5) * CELL_DEG - 180.0     # segment from the cell centre ...
+            ay = (row[pt] + 0.5) * CELL_DEG - 90.0
+            bx, by = lon[pt], lat[pt]                   # ... to the point
+            cx, cy, dx, dy = self.x1[edge], self.y1[edge], self.x2[edge], self.y2[edge]
+            o1 = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax) > 0
+            o2 = (bx - ax) * (dy - ay) - (by - ay) * (dx - ax) > 0
+            o3 = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx) > 0
+            o4 = (dx - cx) * (by - cy) - (dy - cy) * (bx - cx) > 0
+            crossings = np.bincount(q, weights=(o1 != o2) & (o3 != o4), minlength=len(pair))
+            inside = inside ^ (crossings.astype(np.int64) % 2 == 1)
+
+        result = np.full(m, -1, dtype=np.int32)
+        result[point[inside]] = self.pair_feature[pair[inside]]
+        return result
+
+    def lookup_ids(self, lats, lons):
+        """Feature index per point (-1 outside every boundary, e.g. at sea)."""
+        lat = np.asarray(lats, dtype=np.float64).ravel()
+        lon = (np.asarray(lons, dtype=np.float64).ravel() + 180.0) % 360.0 - 180.0
+        out = np.empty(len(lat), dtype=np.int32)
+        for start in range(0, len(lat), BATCH_CHUNK):
+            out[start:start + BATCH_CHUNK] = self._features(lat[start:start + BATCH_CHUNK], lon[start:start + BATCH_CHUNK])
+        return out
+
+    def place(self, feature):
+        if feature < 0:
+            return None
+        return {"country": self.countries[feature], "country_code": self.codes[feature],
+                "admin1": self.admin1[feature], "region": self.regions[feature]}
+
+    def lookup_many(self, lats, lons):
+        """[{"country", "country_code", "admin1", "region"} or None] per point."""
+        return [self.place(f) for f in self.lookup_ids(lats, lons).tolist()]
+
+    def lookup(self, lat, lon):
+        """Single point: the same test as lookup_ids on the slices of one cell."""
+        lat = min(90.0, max(-90.0, float(lat)))
+        lon = (float(lon) + 180.0) % 360.0 - 180.0
+        col = min(COLS - 1, int((lon + 180.0) // CELL_DEG))
+        row = min(ROWS - 1, int((lat + 90.0) // CELL_DEG))
+        cell = row * COLS + col
+        ax, ay = (col + 0.5) * CELL_DEG - 180.0, (row + 0.5) * CELL_DEG - 90.0
+        for pair in range(int(self.cell_offsets[cell]), int(self.cell_offsets[cell + 1])):
+            inside = bool(self.pair_inside[pair])
+            e0, e1 = int(self.pair_edges[pair]), int(self.pair_edges[pair + 1])
+            if e1 > e0:
+                cx, cy, dx, dy = self.x1[e0:e1], self.y1[e0:e1], self.x2[e0:e1], self.y2[e0:e1]
+                o1 = (lon - ax) * (cy - ay) - (lat - ay) * (cx - ax) > 0
+                o2 = (lon - ax) * (dy - ay) - (lat - ay) * (dx - ax) > 0
+                o3 = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx) > 0
+                o4 = (dx - cx) * (lat - cy) - (dy - cy) * (lon - cx) > 0
+                inside ^= bool(np.count_nonzero((o1 != o2) & (o3 != o4)) & 1)
+            if inside:
+                return self.place(int(self.pair_feature[pair]))
+        return None
+
+
+# -----------------------------------------------------------------
+# Startup loader
+# -----------------------------------------------------------------
+def source_stamp(path):
+    st = os.stat(path)
+    return f"{os.path.basename(path)}:{st.st_size}:{int(st.st_mtime)}"
+
+
+def cache_path_for(source):
+    return os.path.splitext(source)[0] + '.npz'
+
+
+def load_geocoder(source, cache_path=None):
+    """Load the index from its .npz cache, rebuilding it from the GeoJSON when stale."""
+    cache_path = cache_path or cache_path_for(source)
+    stamp = source_stamp(source)
+    try:
+        geocoder = ReverseGeocoder.load(cache_path, stamp)
+    except Exception as e:
+        print(f"Reverse geocoder cache unreadable ({e}), rebuilding")
+        geocoder = None
+    if geocoder is None:
+        started = time.time()
+        with open(source, 'rb') as f:
+            geocoder = ReverseGeocoder.from_geojson(json.load(f))
+        print(f"Reverse geocoder: indexed {len(geocoder)} boundaries in {time.time() - started:.1f}s")
+        try:
+            geocoder.save(cache_path, stamp)
+        except OSError as e:
+            print(f"Reverse geocoder: could not write cache {cache_path}: {e}")
+    print(f"Reverse geocoder: {len(geocoder)} boundaries, {geocoder.nbytes / 1e6:.1f} MB of arrays")
+    return geocoder
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def get_geocoder(source=None):
+    """Shared geocoder, loaded on first use (thread-safe); None when the boundary file is missing."""
+    global _geocoder
+    source = source or os.getenv("REVERSE_GEOCODER_SOURCE", DEFAULT_SOURCE)
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None and os.path.exists(source):
+                _geocoder = load_geocoder(source)
+    return _geocoder
+
+
+# ---------------------------------------------------------------------------
+# CLI: python reverse_geocoder.py download|lookup|bench
+# ---------------------------------------------------------------------------
+def synthetic_boundaries(count=4000, vertices=400, seed=5):
+    """Jagged, non-overlapping star polygons (some with holes or a second part) on a world grid."""
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(count * 2)))
+    features = []
+    for i in range(count):
+        gx, gy = i % (side * 2), i // (side * 2)
+        cx = -180 + (gx + 0.5) * 360 / (side * 2)
+        cy = -80 + (gy + 0.5) * 160 / max(1, count // (side * 2) + 1)
+        rx, ry = 360 / (side * 2) * 0.48, 160 / max(1, count // (side * 2) + 1) * 0.48
+        angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+        radius = rng.uniform(0.55, 1.0, vertices)
+        ring = np.column_stack([cx + rx * radius * np.cos(angles), cy + ry * radius * np.sin(angles)])
+        rings = [np.vstack([ring, ring[:1]]).tolist()]
+        if i % 7 == 0:
+            hole = np.column_stack([cx + rx * 0.2 * np.cos(angles[::20]), cy + ry * 0.2 * np.sin(angles[::20])])
+            rings.append(np.vstack([hole, hole[:1]]).tolist())
+        features.append({"type": "Feature", "properties": {"admin": f"Country {i // 20}", "iso_a2": "XX",
+                                                           "name": f"Province {i}", "iso_3166_2": f"XX-{i}"},
+                         "geometry": {"type": "Polygon", "coordinates": rings}})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline reverse geocoder")
+    parser.add_argument("--source", default=os.getenv("REVERSE_GEOCODER_SOURCE", DEFAULT_SOURCE),
+                        help="admin-1 boundaries GeoJSON")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("download", help="download the Natural Earth admin-1 boundaries to --source")
+    lookup = sub.add_parser("lookup", help="resolve one point")
+    lookup.add_argument("lat", type=float)
+    lookup.add_argument("lon", type=float)
+    bench = sub.add_parser("bench", help="time single and batch lookups (synthetic boundaries without --source file)")
+    bench.add_argument("--points", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    if args.command == "download":
+        import requests
+        os.makedirs(os.path.dirname(os.path.abspath(args.source)), exist_ok=True)
+        print(f"Downloading {NATURAL_EARTH_URL}")
+        with requests.get(NATURAL_EARTH_URL, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            with open(args.source + '.tmp', 'wb') as f:
+                for chunk in response.iter_content(1 << 20):
+                    f.write(chunk)
+        os.replace(args.source + '.tmp', args.source)
+        load_geocoder(args.source)
+        return 0
+    if args.command == "lookup":
+        if not os.path.exists(args.source):
+            print(f"No boundaries at {args.source} (run: python reverse_geocoder.py download)")
+            return 1
+        print(load_geocoder(args.source).lookup(args.lat, args.lon))
+        return 0
+
+    if os.path.exists(args.source):
+        geocoder = load_geocoder(args.source)
+    else:
+        started = time.time()
+        geocoder = ReverseGeocoder.from_geojson(synthetic_boundaries())
+        print(f"synthetic: {len(geocoder)} boundaries, {len(geocoder.x1)} cell edges, "
+              f"built in {time.time() - started:.1f}s")
+    rng = np.random.default_rng(1)
+    lats, lons = rng.uniform(-80, 80, args.points), rng.uniform(-180, 180, args.points)
+    runs = []
+    for lat, lon in zip(lats[:2000].tolist(), lons[:2000].tolist()):
+        started = time.perf_counter()
+        geocoder.lookup(lat, lon)
+        runs.append(time.perf_counter() - started)
+    runs.sort()
+    print(f"single lookup: median {runs[len(runs) // 2] * 1e6:.0f} us  p99 {runs[int(len(runs) * 0.99)] * 1e6:.0f} us")
+    started = time.perf_counter()
+    ids = geocoder.lookup_ids(lats, lons)
+    elapsed = time.perf_counter() - started
+    print(f"batch: {args.points} points in {elapsed * 1000:.0f} ms ({elapsed / args.points * 1e6:.2f} us/point), "
+          f"{(ids >= 0).mean() * 100:.0f}% inside a boundary")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
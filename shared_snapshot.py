@@ -0,0 +1,418 @@
+"""
+Snapshots shared between ingest_worker.py and the web workers.
+
+Running the AIS websocket and the adsb.one poller inside the web app means
+every worker process opens its own upstream connections and keeps its own
+copy of the vessel cache. Instead, ingest_worker.py owns the feeds and
+publishes into a shared directory:
+
+    flights.snap        the poller's JSON body, rewritten after every poll
+    vessels.snap        columns (lat, lon, type code) over the pre-serialized
+                        JSON of every indexed vessel, priority MIDs first,
+                        plus the ingest / cache stats
+    tracks.slots        MMSI -> slot map of the track slab and its generation
+    tracks.<g>.<a>.npy  the vessel_tracks.TrackStore slab itself (memory-mapped
+                        by the worker as it writes; a new generation per worker start)
+    alerts.snap         the latest geo_alerts result
+
+A .snap file is a small JSON header followed by aligned numpy arrays. Writers
+build a temporary file and os.replace() it; readers stat the path, mmap the new
+inode when it changed and view the arrays in place with np.frombuffer, so N
+web workers share one copy of the data through the page cache. A reader
+keeps its old mapping until the next refresh, so a swap never tears a read.
+"""
+import os
+import json
+import mmap
+import time
+import struct
+import threading
+
+import numpy as np
+
+import flight_poller
+import vessel_index
+import vessel_tracks
+
+MAGIC = b"GSSNAP01"
+ALIGN = 64
+PUBLISH_INTERVAL = 2.0      # seconds between vessel snapshots
+WATCH_INTERVAL = 1.0        # seconds between flight file checks in the web workers
+
+FLIGHTS_FILE = "flights.snap"
+VESSELS_FILE = "vessels.snap"
+TRACK_SLOTS_FILE = "tracks.slots"
+ALERTS_FILE = "alerts.snap"
+NEWS_HEALTH_FILE = "news_health.snap"
+TRACKS_PREFIX = "tracks"
+
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    orjson = None
+
+    def _dumps(value):
+        return json.dumps(value).encode('utf-8')
+
+
+def _aligned(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_arrays(path, arrays, meta=None):
+    """Atomically replace `path` with the named numpy arrays and a JSON-able meta dict."""
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    layout, offset = [], 0
+    for name, a in arrays.items():
+        layout.append([name, a.dtype.str, list(a.shape), offset])
+        offset += _aligned(a.nbytes)
+    header = json.dumps({"meta": meta or {}, "arrays": layout}).encode('utf-8')
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        f.write(b'\0' * (data_start - len(MAGIC) - 8 - len(header)))
+        for a in arrays.values():
+            f.write(a.data if a.nbytes else b'')
+            f.write(b'\0' * (_aligned(a.nbytes) - a.nbytes))
+    os.replace(tmp, path)
+
+
+class SharedFile:
+    """Read-only view of a file written by write_arrays(), remapped when replaced."""
+
+    def __init__(self, path):
+        self.path = path
+        self._key = None
+        self._state = ({}, {})
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Map the file again if the writer replaced it; True when it changed."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if key == self._key:
+            return False
+        with self._lock:
+            if key == self._key:
+                return False
+            with open(self.path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{self.path} is not a shared snapshot")
+            header_len, = struct.unpack_from('<Q', mm, len(MAGIC))
+            header = json.loads(mm[len(MAGIC) + 8:len(MAGIC) + 8 + header_len])
+            data_start = _aligned(len(MAGIC) + 8 + header_len)
+            arrays = {}
+            for name, dtype, shape, offset in header["arrays"]:
+                dtype = np.dtype(dtype)
+                count = int(np.prod(shape)) if shape else 1
+                if count == 0:
+                    arrays[name] = np.empty(shape, dtype=dtype)
+                else:
+                    arrays[name] = np.frombuffer(mm, dtype, count, data_start + offset).reshape(shape)
+            self._state = (header["meta"], arrays)
+            self._key = key
+        return True
+
+    @property
+    def state(self):
+        """(meta, arrays) of the current mapping, refreshed first."""
+        self.refresh()
+        return self._state
+
+    def age(self):
+        try:
+            return time.time() - os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+
+
+def write_json(path, value):
+    """Atomically replace `path` with one JSON document (read back with SharedJSON)."""
+    write_arrays(path, {"body": np.frombuffer(_dumps(value), dtype=np.uint8)})
+
+
+class SharedJSON:
+    """Document written by write_json(), decoded once per new version of the file."""
+
+    def __init__(self, path, default=None):
+        self.file = SharedFile(path)
+        self._value = default
+        self._lock = threading.Lock()
+
+    @property
+    def value(self):
+        with self._lock:
+            if self.file.refresh():
+                _, arrays = self.file.state
+                self._value = json.loads(arrays["body"].tobytes())
+            return self._value
+
+
+# -----------------------------------------------------------------
+# Flights
+# -----------------------------------------------------------------
+class FlightPublisher:
+    """Poller listener writing every FlightSnapshot to <directory>/flights.snap."""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, FLIGHTS_FILE)
+
+    def publish(self, snapshot):
+        body = snapshot.body().encode('utf-8')
+        write_arrays(self.path, {"body": np.frombuffer(body, dtype=np.uint8)},
+                     {"updated_at": snapshot.updated_at, "region_errors": snapshot.region_errors,
+                      "count": len(snapshot.flights)})
+
+
+class SharedFlights:
+    """
+    Drop-in for flight_poller.FlightPoller in the web workers (snapshot,
+    first_snapshot, add_listener): a watcher thread picks up every snapshot
+    the ingest worker publishes.
+    """
+
+    def __init__(self, directory, interval=WATCH_INTERVAL):
+        self.file = SharedFile(os.path.join(directory, FLIGHTS_FILE))
+        self.interval = interval
+        self._snapshot = flight_poller.FlightSnapshot([], 0)
+        self._listeners = []
+        self.first_snapshot = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def check(self):
+        """Load a newly published snapshot; returns it, or None when unchanged."""
+        if not self.file.refresh():
+            return None
+        meta, arrays = self.file.state
+        body = arrays["body"].tobytes().decode('utf-8')
+        snapshot = flight_poller.FlightSnapshot(json.loads(body), meta.get("updated_at", 0),
+                                                meta.get("region_errors"), body)
+        self._snapshot = snapshot
+        self.first_snapshot.set()
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Flight snapshot listener error: {e}")
+        return snapshot
+
+    def _run(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Shared flights error: {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="shared-flights", daemon=True)
+                self._thread.start()
+        return self
+
+
+# -----------------------------------------------------------------
+# Vessels
+# -----------------------------------------------------------------
+def _encode_bucket(vessels, type_codes):
+    lat = np.fromiter((v['lat'] for v in vessels), dtype=np.float64, count=len(vessels))
+    lon = np.fromiter((v['lon'] for v in vessels), dtype=np.float64, count=len(vessels))
+    types = np.fromiter((type_codes.setdefault(v.get('type'), len(type_codes)) for v in vessels),
+                        dtype=np.uint16, count=len(vessels))
+    blobs = [_dumps(v) for v in vessels]
+    lengths = np.fromiter(map(len, blobs), dtype=np.int64, count=len(blobs))
+    return lat, lon, types, lengths, b''.join(blobs)
+
+
+class VesselPublisher:
+    """
+    Daemon thread writing the grid index's current VesselSnapshot (and the
+    track slot map) to the shared directory. Cells whose tuples did not change
+    since the last run reuse their encoded chunks.
+    """
+
+    def __init__(self, directory, ingest, writer=None, interval=PUBLISH_INTERVAL):
+        self.directory = directory
+        self.ingest = ingest
+        self.writer = writer
+        self.interval = interval
+        self.path = os.path.join(directory, VESSELS_FILE)
+        self._chunks = {}       # cell -> (buckets, (priority chunk, other chunk))
+        self._type_codes = {}
+        self.runs = 0
+        self.last_duration = None
+        self._thread = None
+
+    def publish_once(self):
+        started = time.perf_counter()
+        ingest = self.ingest
+        snapshot = ingest.index.snapshot
+        chunks = {}
+        for cell in sorted(snapshot.cells):
+            buckets = snapshot.cells[cell]
+            cached = self._chunks.get(cell)
+            if cached is None or cached[0] is not buckets:
+                cached = (buckets, tuple(_encode_bucket(b, self._type_codes) for b in buckets))
+            chunks[cell] = cached
+        self._chunks = chunks
+
+        # priority bucket of every cell first, like VesselSnapshot.query
+        parts = [c[1][0] for c in chunks.values()] + [c[1][1] for c in chunks.values()]
+        lengths = np.concatenate([p[3] for p in parts]) if parts else np.empty(0, dtype=np.int64)
+        arrays = {
+            "lat": np.concatenate([p[0] for p in parts]) if parts else np.empty(0),
+            "lon": np.concatenate([p[1] for p in parts]) if parts else np.empty(0),
+            "type": np.concatenate([p[2] for p in parts]) if parts else np.empty(0, dtype=np.uint16),
+            "offsets": np.concatenate(([0], np.cumsum(lengths))).astype(np.int64),
+            "blob": np.frombuffer(b''.join(p[4] for p in parts), dtype=np.uint8),
+        }
+        with ingest.lock:
+            cache_stats = ingest.cache.stats()
+        meta = {
+            "types": sorted(self._type_codes, key=self._type_codes.get),
+            "created": snapshot.created,
+            "stats": {"running": True, "vessels": cache_stats["vessels"], "cache": cache_stats,
+                      "ingest": ingest.stats(),
+                      "tracks": ingest.tracks.stats() if ingest.tracks is not None else None,
+                      "snapshot": self.writer.stats() if self.writer is not None else None,
+                      "shared": {"runs": self.runs, "last_duration_seconds": self.last_duration}},
+        }
+        write_arrays(self.path, arrays, meta)
+        if ingest.tracks is not None:
+            mmsis, slots = ingest.tracks.slot_map()
+            write_arrays(os.path.join(self.directory, TRACK_SLOTS_FILE), {"mmsi": mmsis, "slot": slots},
+                         {"depth": ingest.tracks.depth, "generation": ingest.tracks.generation})
+        self.runs += 1
+        self.last_duration = round(time.perf_counter() - started, 3)
+
+    def _run(self):
+        while True:
+            try:
+                self.publish_once()
+            except Exception as e:
+                print(f"Shared vessel snapshot error: {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="shared-vessels", daemon=True)
+            self._thread.start()
+        return self
+
+
+class SharedVessels:
+    """Web worker side of vessels.snap: viewport queries straight off the mapping."""
+
+    def __init__(self, directory):
+        self.file = SharedFile(os.path.join(directory, VESSELS_FILE))
+
+    def query(self, bounds=None, types=None, limit=vessel_index.DEFAULT_LIMIT):
+        """JSON array (bytes) of the vessels VesselSnapshot.query() would return."""
+        meta, arrays = self.file.state
+        if not arrays:
+            return b'[]'
+        mask = None
+        if bounds is not None:
+            west, south, east, north = bounds
+            lat, lon = arrays["lat"], arrays["lon"]
+            mask = (lat >= south) & (lat <= north)
+            if west <= east:
+                mask &= (lon >= west) & (lon <= east)
+            else:
+                mask &= (lon >= west) | (lon <= east)
+        if types:
+            codes = [i for i, name in enumerate(meta["types"]) if name in types]
+            wanted = np.isin(arrays["type"], codes)
+            mask = wanted if mask is None else mask & wanted
+        if mask is None:
+            rows = range(min(limit, len(arrays["lat"])))
+        else:
+            rows = np.flatnonzero(mask)[:limit].tolist()
+        offsets, blob = arrays["offsets"], memoryview(arrays["blob"])
+        return b'[' + b','.join(blob[offsets[i]:offsets[i + 1]] for i in rows) + b']'
+
+    def stats(self):
+        meta, _ = self.file.state
+        stats = meta.get("stats")
+        if stats is None:
+            return {"running": False, "vessels": 0}
+        return dict(stats, shared_age_seconds=round(self.file.age() or 0, 3))
+
+
+# -----------------------------------------------------------------
+# Tracks
+# -----------------------------------------------------------------
+class SharedTracks:
+    """
+    Read-only TrackStore.track() over the worker's memory-mapped slab. The slot
+    map lags the slab by at most one publish interval; the slab is remapped
+    when the slot map names a new generation (the worker restarted).
+    """
+
+    def __init__(self, directory):
+        self.prefix = os.path.join(directory, TRACKS_PREFIX)
+        self.slots = SharedFile(os.path.join(directory, TRACK_SLOTS_FILE))
+        self._generation = None
+        self._arrays = None
+        self._lock = threading.Lock()
+
+    def _slab(self, generation):
+        with self._lock:
+            if self._arrays is None or generation != self._generation:
+                self._arrays = {name: np.load(vessel_tracks.slab_file(self.prefix, generation, name), mmap_mode='r')
+                                for name in vessel_tracks.SLAB_ARRAYS}
+                self._generation = generation
+            return self._arrays
+
+    def track(self, mmsi, since=None):
+        meta, arrays = self.slots.state
+        empty = np.empty(0, dtype=np.float32)
+        if not arrays or not str(mmsi).isdigit():
+            return empty, empty, np.empty(0, dtype=np.uint32)
+        mmsis, key = arrays["mmsi"], int(mmsi)
+        i = int(np.searchsorted(mmsis, key))
+        if i >= len(mmsis) or mmsis[i] != key:
+            return empty, empty, np.empty(0, dtype=np.uint32)
+        slot = int(arrays["slot"][i])
+        try:
+            slab = self._slab(meta.get("generation"))
+        except FileNotFoundError:
+            # slot map of a generation the restarted worker already removed; the next publish fixes it
+            return empty, empty, np.empty(0, dtype=np.uint32)
+        order = vessel_tracks.chronological(int(slab["head"][slot]), int(slab["count"][slot]), meta["depth"])
+        lat, lon, ts = slab["lat"][slot, order], slab["lon"][slot, order], slab["ts"][slot, order]
+        if since is not None:
+            keep = ts >= since
+            lat, lon, ts = lat[keep], lon[keep], ts[keep]
+        return lat, lon, ts
+
+
+class SharedIngest:
+    """Readers for everything ingest_worker.py publishes to `directory`."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.flights = SharedFlights(directory)
+        self.vessels = SharedVessels(directory)
+        self.tracks = SharedTracks(directory)
+        self.alerts = SharedJSON(os.path.join(directory, ALERTS_FILE), {"generated": None, "alerts": [], "counts": {}})
+        self.news_health = SharedJSON(os.path.join(directory, NEWS_HEALTH_FILE),
+                                      {"generated": None, "summary": {}, "feeds": []})
@@ -0,0 +1,161 @@
+"""
+Single-file packed tile archive (PMTiles-style).
+
+Packs a tile tree (every .json under a root, index.json included) into one
+file so a deploy ships one artifact and serving needs no open/stat per tile:
+
+    [header][blob data ...][directory]
+
+header     magic "GSPK", format version, directory offset and length
+blobs      identity / gzip / brotli bytes of every file, identical blobs stored once
+directory  JSON: {"files": {"6/34/21.json": {"etag", "identity": [off, len],
+                  "gzip": [off, len], "br": [off, len]}}}
+
+The archive is memory-mapped once per process and shared by all request
+threads; lookups are a dict hit, and each tile is copied out of the map once
+(WSGI servers reject memoryview chunks, so the body must be bytes). A repacked
+archive (new inode or mtime) is re-mapped on the next request.
+
+    python tile_pack.py pack geodata/pyramid geodata/pyramid.gspk
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+import argparse
+import threading
+
+from flask import Response
+
+import tile_store
+
+MAGIC = b'GSPK'
+VERSION = 1
+HEADER = struct.Struct('<4sHxxQQ')   # magic, version, directory offset, directory length
+
+
+# -----------------------------------------------------------------
+# Packer
+# -----------------------------------------------------------------
+def pack_tree(root, out_path, gzip_level=9, brotli_quality=11):
+    """Pack every .json under root (with precompressed variants) into out_path."""
+    directory = {}
+    blobs = {}  # content etag -> (offset, length), dedupes identical payloads
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+
+        def put(payload):
+            key = tile_store.content_etag(payload)
+            if key not in blobs:
+                blobs[key] = (f.tell(), len(payload))
+                f.write(payload)
+            return list(blobs[key])
+
+        for rel, path in tile_store.iter_json_files(root):
+            with open(path, 'rb') as src:
+                payload = src.read()
+            entry = {"etag": tile_store.content_etag(payload), "identity": put(payload)}
+            for encoding, compressed in tile_store.compress_variants(payload, gzip_level, brotli_quality).items():
+                entry[encoding] = put(compressed)
+            directory[rel] = entry
+
+        dir_bytes = json.dumps({"files": directory}, separators=(',', ':')).encode('utf-8')
+        dir_offset = f.tell()
+        f.write(dir_bytes)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, dir_offset, len(dir_bytes)))
+    os.replace(tmp_path, out_path)
+    print(f"Tile pack: {len(directory)} files, {len(blobs)} blobs, {os.path.getsize(out_path)} bytes -> {out_path}")
+    return out_path
+
+
+# -----------------------------------------------------------------
+# Reader
+# -----------------------------------------------------------------
+class TilePack:
+    """Memory-mapped read side of an archive; same serving interface as tile_store.TileStore."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, dir_offset, dir_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a GSPK v{VERSION} tile pack")
+        self._files = json.loads(self._mmap[dir_offset:dir_offset + dir_length])["files"]
+
+    def entry(self, rel):
+        return self._files.get(rel)
+
+    def stamp(self, rel):
+        """Content etag of a stored file, or None when it is not in the archive."""
+        entry = self._files.get(rel)
+        return (self.path, entry["etag"]) if entry is not None else None
+
+    def read(self, rel, encoding=None):
+        """Bytes of a stored variant, or None when missing."""
+        entry = self._files.get(rel)
+        if entry is None:
+            return None
+        offset, length = entry[encoding or "identity"]
+        return self._mmap[offset:offset + length]
+
+    def response(self, rel, req, mimetype='application/json'):
+        """Serve a stored file from the map; None when it is not in the archive."""
+        entry = self._files.get(rel)
+        if entry is None:
+            return None
+
+        encoding = tile_store.negotiate(entry, req.accept_encodings)
+        etag = tile_store.variant_etag(entry["etag"], encoding)
+        if req.if_none_match.contains(etag):
+            return tile_store.not_modified(etag)
+
+        body = self.read(rel, encoding)
+        response = Response([body], mimetype=mimetype, direct_passthrough=True)
+        response.headers['Content-Length'] = str(len(body))
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return tile_store.cache_headers(response, etag)
+
+
+_packs = {}  # path -> ((st_ino, st_mtime_ns), TilePack)
+_packs_lock = threading.Lock()
+
+
+def open_pack(path):
+    """
+    Shared per-process TilePack for path, or None when the archive does not
+    exist (not cached, so a pack deployed later is picked up). The map is
+    reopened when the file is replaced or rewritten.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_ino, st.st_mtime_ns)
+    with _packs_lock:
+        cached = _packs.get(path)
+        if cached is None or cached[0] != stamp:
+            # The old map is unmapped once no request holds the old TilePack
+            cached = _packs[path] = (stamp, TilePack(path))
+        return cached[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Packed tile archive builder")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pack = sub.add_parser("pack", help="pack a tile directory into a single archive")
+    pack.add_argument("root", help="tile directory (e.g. geodata/pyramid)")
+    pack.add_argument("out", help="archive path (e.g. geodata/pyramid.gspk)")
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        pack_tree(args.root, args.out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+Pre-compressed tile store.
+
+Tile bytes never change between deploys, so instead of json.load + jsonify on
+every request the build step writes gzip (and brotli, when installed) variants
+next to every tile and index.json, plus a manifest.json holding a content-hash
+ETag per file. Serving then picks the best variant for the client's
+Accept-Encoding and streams the bytes from disk as-is.
+
+Build after the pyramid (and again after every geodata update):
+    python tile_store.py build geodata/pyramid geodata/geo
+"""
+import os
+import sys
+import gzip
+import json
+import hashlib
+import argparse
+
+from flask import send_file, make_response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+TILE_CACHE_MAX_AGE = 7 * 24 * 3600  # seconds; revalidation is cheap thanks to the ETag
+
+# Preferred order when the client accepts several encodings
+ENCODINGS = (
+    ('br', '.br'),
+    ('gzip', '.gz'),
+)
+
+
+# -----------------------------------------------------------------
+# Build step
+# -----------------------------------------------------------------
+def content_etag(payload):
+    return hashlib.sha256(payload).hexdigest()[:24]
+
+
+def compress_variants(payload, gzip_level=9, brotli_quality=11):
+    """Return {encoding: compressed bytes} for every encoding available here."""
+    # mtime=0 keeps the gzip output byte-identical across rebuilds
+    variants = {"gzip": gzip.compress(payload, compresslevel=gzip_level, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(payload, quality=brotli_quality)
+    return variants
+
+
+def iter_json_files(root):
+    """Yield (relative path, absolute path) of every servable .json file under root."""
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            if name.endswith('.json') and name != MANIFEST_NAME:
+                path = os.path.join(dirpath, name)
+                yield os.path.relpath(path, root).replace(os.sep, '/'), path
+
+
+def build_store(root, gzip_level=9, brotli_quality=11):
+    """Write .gz/.br variants for every .json under root and (re)write its manifest."""
+    suffixes = dict(ENCODINGS)
+    manifest = {"files": {}}
+    for rel, path in iter_json_files(root):
+        with open(path, 'rb') as f:
+            payload = f.read()
+
+        entry = {"etag": content_etag(payload), "size": len(payload), "encodings": {}}
+        for encoding, compressed in compress_variants(payload, gzip_level, brotli_quality).items():
+            with open(path + suffixes[encoding], 'wb') as f:
+                f.write(compressed)
+            entry["encodings"][encoding] = len(compressed)
+        manifest["files"][rel] = entry
+
+    with open(os.path.join(root, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    total = sum(e["size"] for e in manifest["files"].values())
+    packed = sum(min(e["encodings"].values()) for e in manifest["files"].values())
+    print(f"Tile store: {len(manifest['files'])} files in {root}, {total} -> {packed} bytes")
+    return manifest
+
+
+# -----------------------------------------------------------------
+# Serving
+# -----------------------------------------------------------------
+def negotiate(available, accept_encodings):
+    """Pick the best of `available` encodings for werkzeug's request.accept_encodings (None = identity)."""
+    for encoding, _ in ENCODINGS:
+        if encoding in available and accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def variant_etag(etag, encoding):
+    return etag + (f"-{encoding}" if encoding else "")
+
+
+def not_modified(etag):
+    response = make_response('', 304)
+    return cache_headers(response, etag)
+
+
+def cache_headers(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"public, max-age={TILE_CACHE_MAX_AGE}"
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+class TileStore:
+    """Read side of a built store rooted at a tile directory."""
+
+    def __init__(self, root):
+        self.root = root
+        self._manifest = None
+        self._manifest_mtime = None
+
+    def _files(self):
+        path = os.path.join(self.root, MANIFEST_NAME)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        if mtime != self._manifest_mtime:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._manifest = json.load(f)["files"]
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def entry(self, rel):
+        """Manifest entry for a file relative to the root, or None when not built."""
+        files = self._files()
+        return files.get(rel) if files else None
+
+    def stamp(self, rel):
+        """Cache key of a file under the root (its size and mtime), or None when it does not exist."""
+        try:
+            st = os.stat(os.path.join(self.root, rel))
+        except OSError:
+            return None
+        return (self.root, st.st_size, st.st_mtime_ns)
+
+    def read(self, rel):
+        """Raw (identity) bytes of a file under the root, or None when it does not exist."""
+        try:
+            with open(os.path.join(self.root, rel), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def response(self, rel, req, mimetype='application/json'):
+        """
+        Build the response for `rel` straight from the precompressed bytes.
+        Returns None when the file is not in the store.
+        """
+        entry = self.entry(rel)
+        if entry is None:
+            return None
+
+        encoding = negotiate(entry["encodings"], req.accept_encodings)
+        etag = variant_etag(entry["etag"], encoding)
+        if req.if_none_match.contains(etag):
+            return not_modified(etag)
+
+        response = send_file(os.path.join(self.root, rel) + dict(ENCODINGS).get(encoding, ''),
+                             mimetype=mimetype, conditional=False, etag=False)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return cache_headers(response, etag)
+
+
+def derived_etag(base_etag, key):
+    """ETag for a response computed from a stored file (e.g. a tile clipped from a leaf)."""
+    return content_etag(f"{base_etag}:{key}".encode('utf-8'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-compressed tile store builder")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="write gzip/brotli variants and the ETag manifest")
+    build.add_argument("roots", nargs='+', help="tile directories (e.g. geodata/pyramid geodata/geo)")
+    args = parser.parse_args(argv)
+
+    if brotli is None:
+        print("Tile store: brotli not installed, writing gzip variants only")
+    for root in args.roots:
+        build_store(root)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
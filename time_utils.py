@@ -0,0 +1,15 @@
+"""
+Time parameter parsing shared by the API routes (flight playback, news search).
+"""
+from datetime import datetime, timezone
+
+
+def parse_time(value):
+    """Epoch seconds from a number or an ISO 8601 string (UTC unless an offset is given)."""
+    try:
+        return float(value)
+    except ValueError:
+        stamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if stamp.tzinfo is None:
+            stamp = stamp.replace(tzinfo=timezone.utc)
+        return stamp.timestamp()
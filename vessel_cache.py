@@ -0,0 +1,237 @@
+"""
+Bounded live vessel cache for the AIS ingest.
+
+The cache used to be a plain dict nothing ever removed from: vessels that left
+coverage days ago stayed forever, and every ShipStaticData message without a
+position created a placeholder at lat/lon 0. VesselCache keeps:
+
+    vessels   OrderedDict mmsi -> vessel dict, in last-seen order (LRU at the front)
+    seen      mmsi -> epoch seconds of the last message
+    static    static-only records (no position yet) as compact tuples, also LRU
+
+sweep() expires vessels not seen for `ttl` seconds and enforces the memory
+budget; inserts enforce the entry budgets. Because the OrderedDicts are in
+last-seen order, expiry only ever looks at the front. Evicted vessels are
+dropped from the grid index (`index`) too.
+
+All methods expect the caller to hold the ingest's cache lock.
+"""
+import os
+import sys
+import time
+import threading
+from itertools import islice
+from collections import OrderedDict
+
+DEFAULT_TTL = 3 * 3600              # seconds without a message before a vessel expires
+DEFAULT_MAX_VESSELS = 200000
+DEFAULT_MAX_STATIC = 100000
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+SWEEP_INTERVAL = 60
+SIZE_SAMPLE = 200                   # vessels sampled to estimate the bytes per entry
+
+STATIC_FIELDS = ("name", "type", "country", "imo", "draft", "arrival", "callsign")
+
+
+def _entry_bytes(vessel):
+    return sys.getsizeof(vessel) + sum(sys.getsizeof(v) for v in vessel.values())
+
+
+class VesselCache:
+    """Live vessels with positions plus a compact static-only table, with TTL and LRU budgets."""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_vessels=DEFAULT_MAX_VESSELS,
+                 max_static=DEFAULT_MAX_STATIC, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_vessels = max_vessels
+        self.max_static = max_static
+        self.max_bytes = max_bytes
+        self.index = None
+        self.vessels = OrderedDict()
+        self.seen = {}
+        self.static = OrderedDict()
+        self.entry_bytes = 0
+        self.expired = 0
+        self.evicted_lru = 0
+        self.evicted_memory = 0
+        self.static_expired = 0
+        self.static_evicted = 0
+        self.sweeps = 0
+
+    @classmethod
+    def from_env(cls):
+        """Cache with the budgets overridable by AIS_VESSEL_TTL, AIS_MAX_VESSELS and AIS_CACHE_MAX_MB."""
+        return cls(
+            ttl=int(os.getenv("AIS_VESSEL_TTL", DEFAULT_TTL)),
+            max_vessels=int(os.getenv("AIS_MAX_VESSELS", DEFAULT_MAX_VESSELS)),
+            max_bytes=int(os.getenv("AIS_CACHE_MAX_MB", DEFAULT_MAX_BYTES // (1024 * 1024))) * 1024 * 1024)
+
+    # -- dict-like read access ----------------------------------------
+    def get(self, mmsi, default=None):
+        return self.vessels.get(mmsi, default)
+
+    def __getitem__(self, mmsi):
+        return self.vessels[mmsi]
+
+    def __contains__(self, mmsi):
+        return mmsi in self.vessels
+
+    def __len__(self):
+        return len(self.vessels)
+
+    # -- updates ------------------------------------------------------
+    def _touch(self, mmsi, now):
+        self.seen[mmsi] = now
+        self.vessels.move_to_end(mmsi)
+
+    def _drop(self, mmsi):
+        del self.vessels[mmsi]
+        self.seen.pop(mmsi, None)
+        if self.index is not None:
+            self.index.remove(mmsi)
+
+    def apply_position(self, mmsi, fields, now=None):
+        """Store a position report, keeping type / country learned from static data."""
+        now = now or time.time()
+        existing = self.vessels.get(mmsi)
+        if existing is not None:
+            fields["type"] = existing.get("type", "cargo")
+            fields["country"] = existing.get("country", "--")
+        else:
+            record = self.static.pop(mmsi, None)
+            fields["type"] = record[1] if record else "cargo"
+            fields["country"] = record[2] if record else "--"
+        fields["category"] = fields["type"]
+        self.vessels[mmsi] = fields
+        self._touch(mmsi, now)
+        if existing is None and len(self.vessels) > self.max_vessels:
+            self._drop(next(iter(self.vessels)))
+            self.evicted_lru += 1
+        return fields
+
+    def apply_static(self, mmsi, fields, now=None):
+        """Attach static data to a known vessel, or keep it in the static-only table."""
+        now = now or time.time()
+        existing = self.vessels.get(mmsi)
+        if existing is not None:
+            existing["type"] = fields["type"]
+            existing["country"] = fields["country"]
+            existing["category"] = fields["category"]
+            self._touch(mmsi, now)
+            return
+        self.static[mmsi] = tuple(fields[k] for k in STATIC_FIELDS) + (now,)
+        self.static.move_to_end(mmsi)
+        if len(self.static) > self.max_static:
+            self.static.popitem(last=False)
+            self.static_evicted += 1
+
+    def load(self, items):
+        """Warm start: (mmsi, vessel, seen) in ascending seen order."""
+        vessels, seen_at = self.vessels, self.seen
+        for mmsi, vessel, seen in items:
+            if mmsi in vessels:
+                vessels.move_to_end(mmsi)
+            vessels[mmsi] = vessel
+            seen_at[mmsi] = seen
+        while len(self.vessels) > self.max_vessels:
+            self._drop(next(iter(self.vessels)))
+            self.evicted_lru += 1
+
+    def load_static(self, items):
+        """Warm start of the static-only table: (mmsi, record dict, seen) in ascending seen order."""
+        for mmsi, record, seen in items:
+            if mmsi in self.vessels:
+                continue
+            self.static[mmsi] = tuple(record.get(k) for k in STATIC_FIELDS) + (seen,)
+            self.static.move_to_end(mmsi)
+        while len(self.static) > self.max_static:
+            self.static.popitem(last=False)
+            self.static_evicted += 1
+
+    def static_record(self, mmsi):
+        """Static-only record of an MMSI as a dict, or None."""
+        record = self.static.get(mmsi)
+        if record is None:
+            return None
+        return dict(zip(STATIC_FIELDS + ("seen",), record))
+
+    # -- eviction -----------------------------------------------------
+    def _estimate_entry_bytes(self):
+        if not self.vessels:
+            return 0
+        sample = list(islice(reversed(self.vessels.values()), SIZE_SAMPLE))
+        return sum(map(_entry_bytes, sample)) // len(sample) + 100  # + OrderedDict / seen overhead
+
+    def sweep(self, now=None):
+        """Expire vessels and static records older than ttl, then enforce the memory budget."""
+        now = now or time.time()
+        cutoff = now - self.ttl
+        expired = 0
+        while self.vessels:
+            mmsi = next(iter(self.vessels))
+            if self.seen.get(mmsi, 0) >= cutoff:
+                break
+            self._drop(mmsi)
+            expired += 1
+        while self.static:
+            mmsi, record = next(iter(self.static.items()))
+            if record[-1] >= cutoff:
+                break
+            del self.static[mmsi]
+            self.static_expired += 1
+
+        self.entry_bytes = self._estimate_entry_bytes()
+        if self.entry_bytes:
+            allowed = self.max_bytes // self.entry_bytes
+            while len(self.vessels) > allowed:
+                self._drop(next(iter(self.vessels)))
+                self.evicted_memory += 1
+        self.expired += expired
+        self.sweeps += 1
+        return expired
+
+    def stats(self):
+        return {
+            "vessels": len(self.vessels),
+            "static_only": len(self.static),
+            "approx_bytes": self.entry_bytes * len(self.vessels),
+            "ttl_seconds": self.ttl,
+            "max_vessels": self.max_vessels,
+            "max_static": self.max_static,
+            "max_bytes": self.max_bytes,
+            "expired": self.expired,
+            "evicted_lru": self.evicted_lru,
+            "evicted_memory": self.evicted_memory,
+            "static_expired": self.static_expired,
+            "static_evicted": self.static_evicted,
+            "sweeps": self.sweeps,
+        }
+
+
+class Sweeper:
+    """Daemon thread running cache.sweep() under the cache lock every `interval` seconds."""
+
+    def __init__(self, cache, lock, interval=SWEEP_INTERVAL):
+        self.cache = cache
+        self.lock = lock
+        self.interval = interval
+        self._thread = None
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with self.lock:
+                    expired = self.cache.sweep()
+                    if self.cache.index is not None:
+                        self.cache.index.publish()
+                if expired:
+                    print(f"AIS cache: expired {expired} vessels")
+            except Exception as e:
+                print(f"AIS cache sweep error: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ais-sweeper", daemon=True)
+            self._thread.start()
+        return self
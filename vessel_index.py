@@ -0,0 +1,232 @@
+"""
+Spatial grid index over the live AIS vessel cache.
+
+/api/geo/vessels used to copy the whole cache into lists three times under the
+cache lock (all, valid, priority / other) and then truncate to 1500, ignoring
+the viewport. VesselIndex is maintained by the ingest as position reports
+arrive: each vessel with a valid position sits in one CELL_DEG x CELL_DEG grid
+cell, in a priority or an "other" bucket by its MID.
+
+After a batch the touched cells are rebuilt and a new immutable
+VesselSnapshot ({cell: (priority vessels, other vessels)}) is published. The
+route only takes the reference, then reads the cells under the requested
+bounds with no lock held.
+"""
+import time
+import threading
+
+import numpy as np
+
+CELL_DEG = 1.0
+COLS = int(360 / CELL_DEG)
+ROWS = int(180 / CELL_DEG)
+PUBLISH_INTERVAL = 1.0      # seconds, at most one new snapshot per interval
+DEFAULT_LIMIT = 1500
+MAX_LIMIT = 10000
+
+# Prioritize India (419), China (412, 413, 414), Russia (273)
+PRIORITY_MIDS = ('419', '412', '413', '414', '273')
+
+
+def valid_position(lat, lon):
+    """True for a usable fix (0 means not reported yet, 91/181 mean unavailable in AIS)."""
+    return lat != 0 and lon != 0 and -90 <= lat <= 90 and -180 <= lon <= 180
+
+
+def cell_of(lat, lon):
+    row = min(int((lat + 90) / CELL_DEG), ROWS - 1)
+    col = min(int((lon + 180) / CELL_DEG), COLS - 1)
+    return row * COLS + col
+
+
+def parse_bounds(value):
+    """
+    Parse the map's "south,east,north,west" bounds into (west, south, east,
+    north) normalized to [-180, 180] (west > east when crossing the antimeridian).
+    None when the view spans the whole world. Raises ValueError when malformed.
+    """
+    south, east, north, west = [float(p) for p in value.split(',')]
+    if east - west >= 360:
+        return None
+    if not (-180 <= west <= 180):
+        west = ((west + 180) % 360) - 180
+    if not (-180 <= east <= 180):
+        east = ((east + 180) % 360) - 180
+    return west, max(-90.0, south), east, min(90.0, north)
+
+
+class VesselSnapshot:
+    """Immutable view of the indexed vessels at one point in time."""
+
+    __slots__ = ("cells", "count", "created", "_positions")
+
+    def __init__(self, cells, count, created):
+        self.cells = cells
+        self.count = count
+        self.created = created
+        self._positions = None
+
+    def positions(self):
+        """(lat array, lon array, vessel dicts) of every indexed vessel, built once per snapshot."""
+        if self._positions is None:
+            vessels = [v for buckets in self.cells.values() for bucket in buckets for v in bucket]
+            lat = np.fromiter((v['lat'] for v in vessels), dtype=np.float64, count=len(vessels))
+            lon = np.fromiter((v['lon'] for v in vessels), dtype=np.float64, count=len(vessels))
+            self._positions = (lat, lon, vessels)
+        return self._positions
+
+    def _cells_in(self, bounds):
+        if bounds is None:
+            return list(self.cells.values())
+        west, south, east, north = bounds
+        row_lo, row_hi = cell_of(south, 0) // COLS, cell_of(north, 0) // COLS
+        if west <= east:
+            col_ranges = [(cell_of(0, west) % COLS, cell_of(0, east) % COLS)]
+        else:
+            col_ranges = [(cell_of(0, west) % COLS, COLS - 1), (0, cell_of(0, east) % COLS)]
+        span = (row_hi - row_lo + 1) * sum(hi - lo + 1 for lo, hi in col_ranges)
+
+        if span > len(self.cells):
+            # sparse grid: scan the populated cells instead of the empty range
+            return [buckets for cell, buckets in self.cells.items()
+                    if row_lo <= cell // COLS <= row_hi
+                    and any(lo <= cell % COLS <= hi for lo, hi in col_ranges)]
+        found = []
+        for row in range(row_lo, row_hi + 1):
+            base = row * COLS
+            for lo, hi in col_ranges:
+                for col in range(lo, hi + 1):
+                    buckets = self.cells.get(base + col)
+                    if buckets is not None:
+                        found.append(buckets)
+        return found
+
+    def query(self, bounds=None, types=None, limit=DEFAULT_LIMIT):
+        """Vessels inside bounds=(west, south, east, north), priority MIDs first, up to limit."""
+        cells = self._cells_in(bounds)
+        if bounds is not None:
+            west, south, east, north = bounds
+            crosses = west > east
+        result = []
+        for bucket in (0, 1):
+            for buckets in cells:
+                for v in buckets[bucket]:
+                    if types and v.get('type') not in types:
+                        continue
+                    if bounds is not None:
+                        lat, lon = v['lat'], v['lon']
+                        if not (south <= lat <= north):
+                            continue
+                        if (lon < west and lon > east) if crosses else (lon < west or lon > east):
+                            continue
+                    result.append(v)
+                    if len(result) >= limit:
+                        return result
+        return result
+
+
+class VesselIndex:
+    """Grid membership of the vessel cache, updated incrementally by the ingest."""
+
+    def __init__(self, cache, publish_interval=PUBLISH_INTERVAL):
+        self.cache = cache
+        self.publish_interval = publish_interval
+        self._members = {}      # cell -> set of mmsi
+        self._cell = {}         # mmsi -> cell
+        self._dirty = set()
+        self._published_cells = {}
+        self._last_publish = 0.0
+        self._ref_lock = threading.Lock()
+        self._snapshot = VesselSnapshot({}, 0, time.time())
+
+    def update(self, mmsi, vessel):
+        """Record the current position of a vessel (call with the cache lock held)."""
+        lat, lon = vessel.get('lat', 0), vessel.get('lon', 0)
+        old = self._cell.get(mmsi)
+        if not valid_position(lat, lon):
+            if old is not None:
+                self.remove(mmsi)
+            return
+        cell = cell_of(lat, lon)
+        if old is not None and old != cell:
+            self._members[old].discard(mmsi)
+            self._dirty.add(old)
+        if old != cell:
+            self._members.setdefault(cell, set()).add(mmsi)
+            self._cell[mmsi] = cell
+        # the vessel dict was replaced or changed: the cell's tuples must be rebuilt
+        self._dirty.add(cell)
+
+    def add_many(self, mmsis, lats, lons):
+        """
+        Bulk update() from parallel sequences, e.g. a warm start: cells are
+        computed with numpy and grouped in one sort (call with the cache lock held).
+        """
+        if self._cell:
+            for mmsi, lat, lon in zip(mmsis, lats, lons):
+                self.update(mmsi, {'lat': lat, 'lon': lon})
+            return
+        mmsis = np.asarray(mmsis, dtype=object)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        valid = (lats != 0) & (lons != 0) & (np.abs(lats) <= 90) & (np.abs(lons) <= 180)
+        mmsis, lats, lons = mmsis[valid], lats[valid], lons[valid]
+        rows = np.minimum(((lats + 90) / CELL_DEG).astype(np.int64), ROWS - 1)
+        cols = np.minimum(((lons + 180) / CELL_DEG).astype(np.int64), COLS - 1)
+        cells = rows * COLS + cols
+        order = np.argsort(cells, kind='stable')
+        cells, mmsis = cells[order], mmsis[order]
+        bounds = np.flatnonzero(np.diff(cells)) + 1
+        for start, end in zip(np.concatenate(([0], bounds)).tolist(), np.concatenate((bounds, [len(cells)])).tolist()):
+            if start == end:
+                continue
+            cell = int(cells[start])
+            group = mmsis[start:end].tolist()
+            self._members[cell] = set(group)
+            self._cell.update(dict.fromkeys(group, cell))
+            self._dirty.add(cell)
+
+    def remove(self, mmsi):
+        cell = self._cell.pop(mmsi, None)
+        if cell is not None:
+            self._members[cell].discard(mmsi)
+            self._dirty.add(cell)
+
+    def publish_due(self):
+        """True when changed cells wait for a publish whose interval has elapsed (lock-free hint)."""
+        return bool(self._dirty) and time.monotonic() - self._last_publish >= self.publish_interval
+
+    def publish(self, force=False):
+        """Rebuild the dirty cells into a new snapshot (call with the cache lock held)."""
+        now = time.monotonic()
+        if not self._dirty or (not force and now - self._last_publish < self.publish_interval):
+            return False
+        cells = dict(self._published_cells)
+        cache = self.cache
+        for cell in self._dirty:
+            members = self._members.get(cell)
+            if not members:
+                cells.pop(cell, None)
+                self._members.pop(cell, None)
+                continue
+            priority, other = [], []
+            for mmsi in members:
+                v = cache.get(mmsi)
+                if v is not None:
+                    (priority if mmsi.startswith(PRIORITY_MIDS) else other).append(v)
+            cells[cell] = (tuple(priority), tuple(other))
+        self._dirty.clear()
+        self._published_cells = cells
+        self._last_publish = now
+        snapshot = VesselSnapshot(cells, len(self._cell), time.time())
+        with self._ref_lock:
+            self._snapshot = snapshot
+        return True
+
+    @property
+    def snapshot(self):
+        with self._ref_lock:
+            return self._snapshot
+
+    def __len__(self):
+        return len(self._cell)
@@ -0,0 +1,216 @@
+"""
+Bounded per-MMSI position history for /api/geo/vessel/path/<mmsi>.
+
+Every track is a ring buffer of DEFAULT_DEPTH points held in one preallocated
+slab (float32 lat, float32 lon, uint32 epoch seconds: 12 bytes a point), so
+memory is fixed up front by `max_bytes` instead of growing one dict per
+position (the zeroed slab is only backed by RAM as slots get used). When
+every slot is taken, the least recently updated EVICT_FRACTION
+of tracks is recycled at once.
+
+With `path` set, the lat / lon / ts / head / count arrays are memory-mapped
+.npy files (<path>.<generation>.<name>.npy) that other processes can map
+read-only, see shared_snapshot.SharedTracks. Every store creates a new
+generation of files instead of truncating the previous one in place, so a
+restarted writer never zeroes a slab that readers still have mapped.
+
+Paths are simplified server-side with Douglas-Peucker: every point gets the
+deviation at which the recursion would keep it, so one pass serves both a
+distance tolerance and a max_points budget.
+"""
+import os
+import glob
+import time
+import threading
+
+import numpy as np
+
+DEFAULT_DEPTH = 128                 # points kept per vessel
+DEFAULT_MAX_BYTES = 80 * 1024 * 1024  # ~54k vessels at the default depth
+EVICT_FRACTION = 0.01
+POINT_BYTES = 12                    # float32 lat + float32 lon + uint32 ts
+SLAB_ARRAYS = ("lat", "lon", "ts", "head", "count")
+
+
+def chronological(head, count, depth):
+    """Ring buffer positions of `count` points ending before `head`, oldest first."""
+    return np.arange(head - count, head) % depth
+
+
+def slab_file(path, generation, name):
+    """File of one slab array of a store generation."""
+    return f"{path}.{generation}.{name}.npy"
+
+
+def _array(path, generation, name, shape, dtype):
+    if path is None:
+        return np.zeros(shape, dtype=dtype)
+    return np.lib.format.open_memmap(slab_file(path, generation, name), mode='w+', dtype=dtype, shape=shape)
+
+
+def _remove_old_generations(path, generation):
+    """Unlink slabs of earlier generations (readers keep their mappings until they switch)."""
+    current = {slab_file(path, generation, name) for name in SLAB_ARRAYS}
+    for old in glob.glob(f"{glob.escape(path)}.*.npy"):
+        if old not in current:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+class TrackStore:
+    """Fixed-size slab of ring buffers keyed by MMSI (thread-safe)."""
+
+    def __init__(self, depth=DEFAULT_DEPTH, max_bytes=DEFAULT_MAX_BYTES, path=None):
+        self.depth = depth
+        self.path = path
+        self.generation = time.time_ns() // 1000000 if path is not None else None
+        self.capacity = max(1, max_bytes // (depth * POINT_BYTES))
+        self.lat = _array(path, self.generation, "lat", (self.capacity, depth), np.float32)
+        self.lon = _array(path, self.generation, "lon", (self.capacity, depth), np.float32)
+        self.ts = _array(path, self.generation, "ts", (self.capacity, depth), np.uint32)
+        self.head = _array(path, self.generation, "head", (self.capacity,), np.int32)      # next write position
+        self.count = _array(path, self.generation, "count", (self.capacity,), np.int32)
+        if path is not None:
+            _remove_old_generations(path, self.generation)
+        self.updated = np.zeros(self.capacity, dtype=np.uint32)
+        self._slots = {}                                       # mmsi -> slot
+        self._owners = [None] * self.capacity
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls, path=None):
+        """Store sized by VESSEL_TRACK_DEPTH and VESSEL_TRACK_MAX_MB."""
+        depth = int(os.getenv("VESSEL_TRACK_DEPTH", DEFAULT_DEPTH))
+        max_bytes = int(os.getenv("VESSEL_TRACK_MAX_MB", DEFAULT_MAX_BYTES // (1024 * 1024))) * 1024 * 1024
+        return cls(depth, max_bytes, path)
+
+    def _evict(self):
+        n = max(1, int(self.capacity * EVICT_FRACTION))
+        for slot in np.argpartition(self.updated, n - 1)[:n].tolist():
+            owner = self._owners[slot]
+            if owner is not None:
+                del self._slots[owner]
+                self._owners[slot] = None
+                self.count[slot] = 0
+                self.head[slot] = 0
+                self.updated[slot] = 0
+                self._free.append(slot)
+                self.evictions += 1
+
+    def _slot_for(self, mmsi):
+        slot = self._slots.get(mmsi)
+        if slot is None:
+            if not self._free:
+                self._evict()
+            slot = self._free.pop()
+            self._slots[mmsi] = slot
+            self._owners[slot] = mmsi
+        return slot
+
+    def add_many(self, points):
+        """Append (mmsi, lat, lon, epoch seconds) points; repeats of the last position are skipped."""
+        with self._lock:
+            for mmsi, lat, lon, ts in points:
+                slot = self._slot_for(mmsi)
+                head, count = self.head[slot], self.count[slot]
+                if count:
+                    last = head - 1 if head else self.depth - 1
+                    if self.lat[slot, last] == np.float32(lat) and self.lon[slot, last] == np.float32(lon):
+                        self.updated[slot] = ts
+                        continue
+                self.lat[slot, head] = lat
+                self.lon[slot, head] = lon
+                self.ts[slot, head] = ts
+                self.head[slot] = (head + 1) % self.depth
+                self.count[slot] = min(count + 1, self.depth)
+                self.updated[slot] = ts
+
+    def add(self, mmsi, lat, lon, ts=None):
+        self.add_many([(mmsi, lat, lon, int(ts if ts is not None else time.time()))])
+
+    def track(self, mmsi, since=None):
+        """(lat, lon, ts) arrays of a vessel, oldest first, optionally only points at or after `since`."""
+        with self._lock:
+            slot = self._slots.get(mmsi)
+            if slot is None:
+                empty = np.empty(0, dtype=np.float32)
+                return empty, empty, np.empty(0, dtype=np.uint32)
+            order = chronological(int(self.head[slot]), int(self.count[slot]), self.depth)
+            lat, lon, ts = self.lat[slot, order], self.lon[slot, order], self.ts[slot, order]
+        if since is not None:
+            keep = ts >= since
+            lat, lon, ts = lat[keep], lon[keep], ts[keep]
+        return lat, lon, ts
+
+    def slot_map(self):
+        """(mmsis, slots): int64 MMSIs in ascending order and their slots, for shared readers."""
+        with self._lock:
+            items = [(int(mmsi), slot) for mmsi, slot in self._slots.items() if mmsi.isdigit()]
+        items.sort()
+        mmsis = np.fromiter((m for m, _ in items), dtype=np.int64, count=len(items))
+        slots = np.fromiter((s for _, s in items), dtype=np.int32, count=len(items))
+        return mmsis, slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    def stats(self):
+        return {
+            "vessels": len(self._slots),
+            "capacity": self.capacity,
+            "depth": self.depth,
+            "points": int(self.count.sum()),
+            "bytes": self.lat.nbytes + self.lon.nbytes + self.ts.nbytes,
+            "evictions": self.evictions,
+        }
+
+
+# -----------------------------------------------------------------
+# Douglas-Peucker
+# -----------------------------------------------------------------
+def dp_importance(x, y):
+    """
+    Douglas-Peucker significance of every point: the perpendicular distance at
+    which the recursion selects it (endpoints get +inf).
+    """
+    n = len(x)
+    importance = np.zeros(n, dtype=np.float64)
+    if n == 0:
+        return importance
+    importance[0] = importance[-1] = np.inf
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        start, end, parent = stack.pop()
+        if end - start < 2:
+            continue
+        xs, ys = x[start + 1:end], y[start + 1:end]
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        norm = np.hypot(dx, dy)
+        if norm == 0:
+            dist = np.hypot(xs - x[start], ys - y[start])
+        else:
+            dist = np.abs(dy * (xs - x[start]) - dx * (ys - y[start])) / norm
+        i = int(np.argmax(dist))
+        split = start + 1 + i
+        # a child never outranks its parent split, so thresholds stay monotonic
+        importance[split] = min(float(dist[i]), parent)
+        stack.append((start, split, importance[split]))
+        stack.append((split, end, importance[split]))
+    return importance
+
+
+def simplify(lat, lon, tolerance=0.0, max_points=None):
+    """Indexes of the points kept by Douglas-Peucker at `tolerance` degrees, capped to max_points."""
+    n = len(lat)
+    if n <= 2:
+        return np.arange(n)
+    importance = dp_importance(lon.astype(np.float64), lat.astype(np.float64))
+    keep = np.flatnonzero(importance > tolerance)
+    if max_points is not None and len(keep) > max_points:
+        top = np.argsort(-importance[keep], kind='stable')[:max_points]
+        keep = np.sort(keep[top])
+    return keep